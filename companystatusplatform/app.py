@@ -1,26 +1,50 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, send_file
+import startup  # first, so the startup report covers the imports below
+from flask import Flask, render_template, request, redirect, url_for, send_file, session
 import pandas as pd
-import plotly.express as px
-import plotly.io as pio
-import io
-import markdown 
 import os 
+from config import SECRET_KEY, SAMPLE_MAX_AGE
+from dataset_store import store, new_dataset_id
+from ingestion import ingest_upload, is_supported_file
+from chart_cache import ensure_plotly_js, sales_chart_json
+from rollup import get_cube
+from data_scraper import scrape_everything
+from report_export import excel_report, XLSX_MIMETYPE
+from static_assets import ensure_excel
+import chart_cache
+import embeddings
+import http_cache
+import llm_analyzer
+import llm_cache
+import static_assets
+import tracing
+from tracing import span
+
+startup.mark('imports')
 # xlsxwriter is used by pandas for Excel output
 
 app = Flask(__name__)
-
-# Use global variables for this simple example (session management is better for real apps)
-global_df = None
-global_insights = None
-global_simulation_result = None
+app.secret_key = SECRET_KEY
+ensure_plotly_js()
+static_assets.init_app(app)
+tracing.init_app(app)
+tracing.register_cache('chart', chart_cache.get_stats)
+tracing.register_cache('scrape', http_cache.get_stats)
+tracing.register_cache('llm', llm_cache.get_stats)
+startup.init_app(app)
+SAMPLE_PATH = os.path.join(app.static_folder, 'Sample_Data.xlsx')
+
+# Uploaded data lives in `dataset_store`, keyed by a per-upload ID kept in the session
+def _current_dataset():
+    """Returns (dataset_id, DataFrame) for this session, or (None, None) if nothing is uploaded."""
+    dataset_id = session.get('dataset_id')
+    df = store.get(dataset_id)
+    if df is None:
+        return None, None
+    return dataset_id, df
 
 # --- Helper Functions (Placeholders) ---
 # Assuming these modules/functions exist in your project structure
-def scrape_everything(name, cik): 
-    print(f"Scraping data for {name} ({cik})...")
-    return "Scraped data placeholder text."
-
 def generate_insights(df, data): 
     print("Generating insights...")
     return "**Summary of Findings:**\n* Sales look good.\n* South market is competitive."
@@ -40,9 +64,22 @@ def create_sample_excel():
         'Year': [2021, 2021, 2022, 2022, 2023, 2023]
     }
     df_sample = pd.DataFrame(sample_data)
-    file_path = 'static/Sample_Data.xlsx'
-    df_sample.to_excel(file_path, index=False)
-    return file_path
+    # Rewritten only when the sample data changes, never per request
+    return ensure_excel(SAMPLE_PATH, df_sample)
+
+# --- Startup ---
+# Work that would otherwise land on the first requests runs on a background thread (see startup.py)
+
+def _warm_markdown():
+    import markdown
+    markdown.markdown("| a |\n|---|\n| 1 |", extensions=['tables'])
+
+startup.warm_up('sample_workbook', create_sample_excel)
+startup.warm_up('plotly', chart_cache.warm_up)
+startup.warm_up('markdown', _warm_markdown)
+startup.warm_up('chromadb', embeddings.warm_up)
+startup.warm_up('llm_client', llm_analyzer.warm_up)
+
 # --- End Helper Functions ---
 
 
@@ -50,20 +87,17 @@ def create_sample_excel():
 
 @app.route('/')
 def upload_file_page():
-    create_sample_excel() 
     return render_template('upload.html')
 
 @app.route('/download-sample')
 def download_sample():
-    path = 'static/Sample_Data.xlsx'
-    return send_file(path, as_attachment=True, download_name='Sample_Company_Data.xlsx')
+    startup.wait('sample_workbook')
+    # The file only changes with the sample data, so its ETag is stable and revalidation is a 304
+    return send_file(SAMPLE_PATH, as_attachment=True, download_name='Sample_Company_Data.xlsx',
+                     conditional=True, max_age=SAMPLE_MAX_AGE)
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    global global_df
-    global global_insights
-    global_insights = None 
-
     file = request.files.get('file')
     company_name = request.form.get('company_name', 'Default Company')
     company_cik = request.form.get('company_cik', '00000000')
@@ -71,15 +105,25 @@ def upload_file():
     if not file or file.filename == '':
         return redirect(url_for('upload_file_page'))
         
-    if file and (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
+    if file and is_supported_file(file.filename):
         try:
-            global_df = pd.read_excel(file)
+            digest, df, parquet_path = ingest_upload(file)
+            dataset_id = new_dataset_id()
+            with span('store.put'):
+                df = store.put(dataset_id, df, source_path=parquet_path)
+            get_cube(df, digest)  # build the rollup cube once per upload
             
             # --- Integration Step: Scrape data and generate insights ---
-            global_scraped_data_text = scrape_everything(company_name, company_cik)
+            scraped_data_text = scrape_everything(company_name, company_cik)
             # You should uncomment the line below to actually call the insight generation function
-            # global_insights = generate_insights(global_df, global_scraped_data_text)
-            
+            # insights = generate_insights(df, scraped_data_text)
+            store.update_state(dataset_id, content_hash=digest, company_name=company_name, company_cik=company_cik,
+                               scraped_data_text=scraped_data_text, insights=None, simulation_result=None)
+
+            previous_id = session.get('dataset_id')
+            session['dataset_id'] = dataset_id
+            if previous_id:
+                store.drop(previous_id)
             return redirect(url_for('dashboard'))
         except Exception as e:
             return f"<div style='color:red;'>Error processing file or generating insights: {e}</div>"
@@ -88,33 +132,33 @@ def upload_file():
 
 @app.route('/dashboard', methods=['GET', 'POST'])
 def dashboard():
-    global global_df
-    global global_insights
-    global global_simulation_result
-
-    if global_df is None or global_df.empty:
+    dataset_id, df = _current_dataset()
+    if df is None or df.empty:
         return redirect(url_for('upload_file_page'))
+    state = store.get_state(dataset_id)
     
     # Handle simulation request POST request
     if request.method == 'POST' and 'scenario_text' in request.form:
         scenario = request.form['scenario_text']
-        global_simulation_result = run_simulation(global_df, scenario)
+        state = store.update_state(dataset_id, simulation_result=run_simulation(df, scenario))
     
-    # Generate Plotly Chart
-    if all(col in global_df.columns for col in ['Product', 'Sales', 'Market']):
-        agg_data = global_df.groupby(['Product', 'Market'])['Sales'].sum().reset_index()
-        fig = px.bar(agg_data, x="Product", y="Sales", color="Market", barmode="group",
-                     title="Sales Performance by Product and Market")
-        graph_html = pio.to_html(fig, full_html=False)
+    # Generate Plotly Chart (cached per dataset version)
+    graph_json = None
+    graph_html = None
+    if all(col in df.columns for col in ['Product', 'Sales', 'Market']):
+        graph_json = sales_chart_json(df, state.get('content_hash', dataset_id))
     else:
         graph_html = "<p>Required columns ('Product', 'Sales', 'Market') not found for visualization.</p>"
 
     # Render insights markdown to HTML
-    insights_html = markdown.markdown(global_insights if global_insights else "No insights generated yet.")
-    simulation_html = markdown.markdown(global_simulation_result if global_simulation_result else "Run a simulation below.")
+    import markdown
+    with span('markdown.render'):
+        insights_html = markdown.markdown(state.get('insights') or "No insights generated yet.")
+        simulation_html = markdown.markdown(state.get('simulation_result') or "Run a simulation below.")
 
     return render_template('dashboard.html', 
                            graph_html=graph_html, 
+                           graph_json=graph_json,
                            insights_html=insights_html,
                            simulation_html=simulation_html)
 
@@ -122,42 +166,29 @@ def dashboard():
 # --- Download Excel Report Route ---
 @app.route('/download_excel_report')
 def download_excel_report():
-    global global_df, global_insights, global_simulation_result
-
-    if global_df is None or global_df.empty:
+    dataset_id, df = _current_dataset()
+    if df is None or df.empty:
         return redirect(url_for('upload_file_page'))
+    state = store.get_state(dataset_id)
+
+    # Sheet 1 is the raw data; Sheet 2: Summary Insights & Simulation Results
+    insights_data = {
+        'Section': ['AI Insights', 'Simulation Results'],
+        'Content': [
+            state.get('insights') or 'No insights generated yet.',
+            state.get('simulation_result') or 'No simulation results run yet.'
+        ]
+    }
+    # Adjust column widths of the summary in Excel
+    summary = ('Summary', pd.DataFrame(insights_data), {'A:A': 20, 'B:B': 100})
 
-    # Create an in-memory buffer using BytesIO
-    buffer = io.BytesIO()
-    
-    # Use pandas ExcelWriter with xlsxwriter engine
-    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-        # Sheet 1: Raw Data
-        global_df.to_excel(writer, sheet_name='Raw Data', index=False)
-        
-        # Sheet 2: Summary Insights & Simulation Results
-        insights_data = {
-            'Section': ['AI Insights', 'Simulation Results'],
-            'Content': [
-                global_insights if global_insights else 'No insights generated yet.',
-                global_simulation_result if global_simulation_result else 'No simulation results run yet.'
-            ]
-        }
-        insights_df = pd.DataFrame(insights_data)
-        insights_df.to_excel(writer, sheet_name='Summary', index=False)
-        
-        # Optional: Adjust column widths in Excel
-        worksheet = writer.sheets['Summary']
-        worksheet.set_column('A:A', 20)
-        worksheet.set_column('B:B', 100) 
-
-    # After writing is complete, seek to the start of the buffer
-    buffer.seek(0)
+    # The workbook is written in constant memory to a cached file and sent from disk
+    path = excel_report(state.get('content_hash', dataset_id), df, [summary])
     
     # Return the file using send_file
     return send_file(
-        buffer,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        path,
+        mimetype=XLSX_MIMETYPE,
         as_attachment=True,
         download_name='company_status_report.xlsx'
     )
@@ -169,6 +200,9 @@ def download_report():
     return "Functionality available in previous app.py versions if needed."
 
 
+startup.mark('app')
+startup.start()
+
 if __name__ == '__main__':
     # Ensure the static folders exist
     if not os.path.exists('static'): os.makedirs('static')
@@ -1,97 +1,90 @@
 # app.py
-from flask import Flask, render_template, request, redirect, url_for, send_file, flash
+import startup  # first, so the startup report covers the imports below
+from flask import Flask, render_template, request, redirect, url_for, send_file, flash, session, jsonify, Response, stream_with_context
 import pandas as pd
-import plotly.express as px
-import plotly.io as pio
-import io
-import markdown 
+import itertools
+import json
 import os 
-import requests 
-from bs4 import BeautifulSoup 
+import threading
+from config import (SECRET_KEY, JOB_UPLOAD_DIR, SAMPLE_MAX_AGE, PIPELINE_SCRAPE_CONCURRENCY,
+                    PIPELINE_LLM_CONCURRENCY, SIMULATION_MAX_NARRATED)
+from dataset_store import store, new_dataset_id
+from ingestion import ingest_bytes, is_supported_file
+from chart_cache import ensure_plotly_js, sales_chart_json
+from rollup import RollupCube, get_cube
+from simulation_engine import run_scenario_text, format_result
+from batch_simulation import run_batch
+from llm_analyzer import (stream_insights, stream_simulation, run_simulations,
+                          generate_insights as generate_llm_insights)
+from prompt_builder import get_profile
+from report_export import excel_report, workbook_report, parquet_export, csv_chunks, XLSX_MIMETYPE
+from row_index import get_row_index
+from dataset_versions import append_version, diff_versions, version_entry, versions_of
+from portfolio import parse_manifest, portfolio_version, comparison_frame, comparison_chart_json, report_sheets
+from static_assets import ensure_excel
+from data_scraper import scrape_everything
+from web_scraper import scrape_product_info, scrape_products, scrape_competitor_listings
+import chart_cache
+import embeddings
+import http_cache
+import jobs
+import llm_analyzer
+import llm_cache
+import static_assets
+import tracing
+from tracing import span
+
+startup.mark('imports')
 
 app = Flask(__name__)
-app.secret_key = 'supersecretkey' 
-
-# --- Global Variables ---
-global_df = None
-global_insights = None
-global_simulation_result = None
-# Changed to lists to store multiple results
-global_scraped_product_data = [] 
-global_scraped_competitors_data = None 
-
-# --- Helper Functions (Placeholders) ---
-def scrape_everything(name, cik): 
-    print(f"Scraping data for {name} ({cik})...")
-    return "Scraped data placeholder text."
-
-# app.py
-
-# ... (rest of imports)
-
-# ... (global variables)
+app.secret_key = SECRET_KEY
+ensure_plotly_js()
+static_assets.init_app(app)
+tracing.init_app(app)
+tracing.register_cache('chart', chart_cache.get_stats)
+tracing.register_cache('scrape', http_cache.get_stats)
+tracing.register_cache('llm', llm_cache.get_stats)
+startup.init_app(app)
+SAMPLE_PATH = os.path.join(app.static_folder, 'Sample_Data.xlsx')
+
+# --- Per-Session State ---
+# Each upload is stored in `dataset_store` under its own ID, which is kept in the
+# Flask session. The frame plus insights, simulation and scrape results are shared
+# between workers through the store's on-disk spill.
+
+def _current_dataset():
+    """Returns (dataset_id, DataFrame) for this session, or (None, None) if nothing is uploaded."""
+    dataset_id = session.get('dataset_id')
+    df = store.get(dataset_id)
+    if df is None:
+        return None, None
+    return dataset_id, df
 
 # --- Helper Functions ---
 
-# ... (scrape_everything, generate_insights, create_sample_excel functions) ...
-
-
-# app.py
-
-# ... (keep existing imports and global variables) ...
-
-def run_simulation(df, scenario): 
+def run_simulation(df, scenario, cube=None): 
     """
-    Analyzes the scenario text and calculates a new result based on the DataFrame (df).
-    Uses flexible keyword matching for the scenario.
+    Parses the scenario (price change %, elasticity per market, volume shock per product,
+    cost change) and runs it through the vectorized simulation engine on the rollup cube.
     """
+    cube = cube if cube is not None else RollupCube(df)
     print(f"Running simulation for: {scenario}")
-    
-    scenario_lower = scenario.lower()
-
-    # Make the keyword checking more flexible:
-    has_smartphone = 'smartphone' in scenario_lower
-    has_price_increase = 'price increased' in scenario_lower or '10% increased' in scenario_lower or 'price up' in scenario_lower
-    
-    # Check if the required conditions are met
-    if has_smartphone and has_price_increase:
-        # Calculate new potential sales based on this simple scenario
-        current_sales_north = df[(df['Product'] == 'Smartphone') & (df['Market'] == 'North')]['Sales'].sum()
-        current_sales_south = df[(df['Product'] == 'Smartphone') & (df['Market'] == 'South')]['Sales'].sum()
-        
-        # Simple assumption: 10% price increase leads to 5% sales decrease in North, 8% decrease in South
-        new_sales_north = current_sales_north * (1 - 0.05)
-        new_sales_south = current_sales_south * (1 - 0.08)
-        
-        # Calculate percentage changes
-        perc_change_north = ((new_sales_north - current_sales_north) / current_sales_north) * 100
-        perc_change_south = ((new_sales_south - current_sales_south) / current_sales_south) * 100
-        
-        result_text = (
-            f"**Scenario Simulated:** *{scenario}*\n\n"
-            f"**Result:** \n"
-            f"- North Market Smartphone Sales Change: {perc_change_north:.2f}%\n"
-            f"- South Market Smartphone Sales Change: {perc_change_south:.2f}%"
-        )
-        
-        return result_text
-    else:
-        # Default fallback message if the scenario isn't recognized by the simple logic
-        return f"**Scenario Simulated:** *{scenario}*\n\n**Result:** The simulation logic could not fully process this request (lacks specific logic for '{scenario}')."
-
-# ... (rest of the app.py code) ...
 
+    try:
+        result = run_scenario_text(cube, scenario)
+    except ValueError as e:
+        return f"**Scenario Simulated:** *{scenario}*\n\n**Result:** Could not read the scenario: {e}"
 
-# ... (rest of the app.py code) ...
+    if result is None:
+        # Default fallback message if no price, volume or cost change was recognized
+        return (f"**Scenario Simulated:** *{scenario}*\n\n**Result:** The simulation logic could not fully process this request "
+                f"(lacks specific logic for '{scenario}'). Try e.g. 'Smartphone price +10%; elasticity North -0.5 South -0.8; cost up 3%'.")
+    return format_result(result, scenario)
 
 def generate_insights(df, data): 
     print("Generating insights...")
     return "**Summary of Findings:**\n* Sales look good.\n* South market is competitive."
 
-def run_simulation(df, scenario): 
-    print(f"Running simulation for: {scenario}")
-    return f"**Scenario Simulated:** *{scenario}*\n\n**Result:** Simulation predicts 5% increase in North sales."
-
 def create_sample_excel():
     """Generates a sample Excel file dynamically and saves it locally."""
     sample_data = {
@@ -104,81 +97,143 @@ def create_sample_excel():
         'Year': [2021, 2021, 2022, 2022, 2023, 2023]
     }
     df_sample = pd.DataFrame(sample_data)
-    file_path = 'static/Sample_Data.xlsx'
-    df_sample.to_excel(file_path, index=False)
-    return file_path
+    # Rewritten only when the sample data changes, never per request
+    return ensure_excel(SAMPLE_PATH, df_sample)
 
-# --- End Helper Functions ---
+# --- Startup ---
+# Work that would otherwise land on the first requests runs on a background thread (see startup.py)
 
+def _warm_markdown():
+    import markdown
+    markdown.markdown("| a |\n|---|\n| 1 |", extensions=['tables'])
 
-# --- Integrated Scraper Functions (WORKING SAMPLE CODE) ---
+startup.warm_up('sample_workbook', create_sample_excel)
+startup.warm_up('plotly', chart_cache.warm_up)
+startup.warm_up('markdown', _warm_markdown)
+startup.warm_up('chromadb', embeddings.warm_up)
+startup.warm_up('llm_client', llm_analyzer.warm_up)
 
-def scrape_product_info(url):
-    """Scrapes a single product page from http://books.toscrape.com/ for basic info."""
-    try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status() 
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        title_element = soup.find('h1') 
-        price_element = soup.find('p', class_='price_color')
-        
-        title = title_element.text.strip() if title_element else 'N/A'
-        price = price_element.text.strip() if price_element else 'N/A'
-        
-        return {'URL': url, 'Title': title, 'Price': price, 'Status': 'Success'}
-    except requests.exceptions.RequestException as e:
-        return {'URL': url, 'Title': 'Error', 'Price': 'Error', 'Status': f'Failed: {e}'}
-
-
-def scrape_competitors_list(url):
-    """Scrapes a category listing page from http://books.toscrape.com/ for multiple items."""
+# --- End Helper Functions ---
+
+
+# --- Upload Pipeline (runs on the background job pool, see jobs.py) ---
+# /upload only stages the file and enqueues parse -> scrape -> insight; each stage writes
+# its result into the dataset's state, and the dashboard polls /jobs/<id> for progress.
+
+def _parse_stage(payload):
+    dataset_id = payload['dataset_id']
+    with open(payload['upload_path'], 'rb') as f:
+        digest, df, parquet_path = ingest_bytes(f.read(), payload['filename'])
+    df = store.put(dataset_id, df, source_path=parquet_path)
+    get_cube(df, digest)  # build the rollup cube once per upload
+    get_profile(df, digest)  # and the compact profile used in LLM prompts
+    store.update_state(dataset_id, content_hash=digest,
+                       versions=[version_entry(1, dataset_id, digest, len(df), len(df), payload['filename'])])
+
+def _append_stage(payload):
+    # Only the delta file is parsed; cube and profile are extended from the previous version
+    with open(payload['upload_path'], 'rb') as f:
+        digest, delta, _ = ingest_bytes(f.read(), payload['filename'])
+    append_version(payload['parent_id'], payload['dataset_id'], delta, digest, payload['filename'])
+
+# Scrape and LLM stages of concurrent pipelines (e.g. every company of a portfolio) share
+# these slots, so a large manifest cannot flood the sources or the API
+_scrape_slots = threading.BoundedSemaphore(PIPELINE_SCRAPE_CONCURRENCY)
+_llm_slots = threading.BoundedSemaphore(PIPELINE_LLM_CONCURRENCY)
+
+def _scrape_stage(payload):
+    # All sources are fetched in parallel; this waits for the slowest one (or its deadline)
+    with _scrape_slots:
+        scraped_data_text = scrape_everything(payload['company_name'], payload['company_cik'])
+    store.update_state(payload['dataset_id'], scraped_data_text=scraped_data_text)
+
+def _insight_stage(payload):
+    dataset_id = payload['dataset_id']
+    insights = generate_insights(store.get(dataset_id), store.get_state(dataset_id).get('scraped_data_text'))
+    store.update_state(dataset_id, insights=insights)
+
+def _llm_insight_stage(payload):
+    dataset_id = payload['dataset_id']
+    state = store.get_state(dataset_id)
+    with _llm_slots:
+        insights = generate_llm_insights(store.get(dataset_id), state.get('scraped_data_text') or '',
+                                         state.get('content_hash'), company=state.get('company_name'),
+                                         cik=state.get('company_cik'))
+    store.update_state(dataset_id, insights=insights)
+
+def _remove_upload(payload):
+    # The staged file is kept until the job ends, so a parse stage restarted by
+    # jobs.resume_pending() can still read it
     try:
-        headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
-        
-        competitors = []
-        for item in soup.find_all('article', class_='product_pod'):
-            title = item.h3.a['title'] if item.h3 and item.h3.a else 'N/A'
-            price = item.find('p', class_='price_color').text.strip() if item.find('p', class_='price_color') else 'N/A'
-            
-            competitors.append({'Name': title, 'Price': price})
-            
-        return competitors if competitors else [{'Name': 'N/A', 'Price': 'N/A', 'Status': 'No matching elements found'}]
-    except requests.exceptions.RequestException as e:
-        return [{'Name': 'Error', 'Price': f'Failed: {e}', 'Status': 'Request Failed'}]
-
-# --- End Scraper Functions ---
+        os.remove(payload['upload_path'])
+    except FileNotFoundError:
+        pass
+
+jobs.register_pipeline('upload', [('parse', _parse_stage), ('scrape', _scrape_stage), ('insight', _insight_stage)],
+                       on_finish=_remove_upload)
+# Portfolio companies get their insights written up front, for the comparison and the combined report
+jobs.register_pipeline('portfolio_company', [('parse', _parse_stage), ('scrape', _scrape_stage),
+                                             ('insight', _llm_insight_stage)], on_finish=_remove_upload)
+# Appending keeps the company's scrape results and only refreshes the insights
+jobs.register_pipeline('append', [('parse', _append_stage), ('insight', _insight_stage)], on_finish=_remove_upload)
+jobs.resume_pending()
+
+
+# --- Integrated Scraper Functions ---
+# scrape_product_info / scrape_products / scrape_competitor_listings live in web_scraper.py
+# and share one connection-pooled async client (fetcher.py).
 
 
 # --- Flask Routes ---
 @app.route('/')
 def upload_file_page():
-    create_sample_excel() 
     return render_template('upload.html')
 
 @app.route('/download-sample')
 def download_sample():
-    path = 'static/Sample_Data.xlsx'
-    return send_file(path, as_attachment=True, download_name='Sample_Company_Data.xlsx')
+    startup.wait('sample_workbook')
+    # The file only changes with the sample data, so its ETag is stable and revalidation is a 304
+    return send_file(SAMPLE_PATH, as_attachment=True, download_name='Sample_Company_Data.xlsx',
+                     conditional=True, max_age=SAMPLE_MAX_AGE)
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
-    global global_df, global_insights
-    global_insights = None 
     file = request.files.get('file')
     company_name = request.form.get('company_name', 'Default Company')
     company_cik = request.form.get('company_cik', '00000000')
     if not file or file.filename == '':
         flash("No file selected.", "error")
         return redirect(url_for('upload_file_page'))
-    if file and (file.filename.endswith('.xlsx') or file.filename.endswith('.xls')):
+    if file and is_supported_file(file.filename):
         try:
-            global_df = pd.read_excel(file)
-            global_scraped_data_text = "" 
+            dataset_id = new_dataset_id()
+            os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+            upload_path = os.path.join(JOB_UPLOAD_DIR, dataset_id + os.path.splitext(file.filename)[1].lower())
+            file.save(upload_path)
+            # The initial state is written before the job is queued: its stages may finish
+            # before this request does, and must not have their results blanked out
+            store.update_state(dataset_id,
+                               company_name=company_name,
+                               company_cik=company_cik,
+                               scraped_data_text="",
+                               insights=None,
+                               simulation_result=None,
+                               scraped_product_data=[],
+                               scraped_competitors_data=None)
+            job_id = jobs.submit('upload', {'dataset_id': dataset_id, 'upload_path': upload_path,
+                                            'filename': file.filename, 'company_name': company_name,
+                                            'company_cik': company_cik})
+            store.update_state(dataset_id, job_id=job_id)
+            previous_id = session.get('dataset_id')
+            session['dataset_id'] = dataset_id
+            previous_state = store.get_state(previous_id)
+            if previous_id and not previous_state.get('portfolio_id'):  # portfolio datasets stay with their portfolio
+                if previous_state.get('job_id'):
+                    jobs.cancel(previous_state['job_id'])
+                # A new upload replaces the previous dataset and every version of it
+                for entry in previous_state.get('versions') or []:
+                    store.drop(entry['dataset_id'])
+                store.drop(previous_id)
             return redirect(url_for('dashboard'))
         except Exception as e:
             flash(f"Error processing file: {e}", "error")
@@ -187,94 +242,483 @@ def upload_file():
     return redirect(url_for('upload_file_page'))
 
 
+@app.route('/append', methods=['POST'])
+def append_upload():
+    """Appends the rows of a delta file to the current dataset as a new version."""
+    parent_id, df = _current_dataset()
+    if df is None:
+        flash("Please upload a data file first.", "error")
+        return redirect(url_for('upload_file_page'))
+    file = request.files.get('file')
+    if not file or file.filename == '':
+        flash("No file selected.", "error")
+        return redirect(url_for('dashboard'))
+    if not is_supported_file(file.filename):
+        flash("Invalid file format.", "error")
+        return redirect(url_for('dashboard'))
+    if store.get_state(parent_id).get('portfolio_id'):
+        flash("Data of a portfolio company is replaced by uploading a new portfolio manifest.", "error")
+        return redirect(url_for('dashboard'))
+    dataset_id = new_dataset_id()
+    os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+    upload_path = os.path.join(JOB_UPLOAD_DIR, dataset_id + os.path.splitext(file.filename)[1].lower())
+    file.save(upload_path)
+    # The new version starts from the parent's state (company, scrape results); insights are
+    # redone. As in upload_file, that state is in place before the job can write to it
+    parent_state = store.get_state(parent_id)
+    inherited = {k: v for k, v in parent_state.items() if k not in ('job_id', 'content_hash', 'versions')}
+    store.update_state(dataset_id, **{**inherited, 'parent_id': parent_id, 'insights': None,
+                                      'simulation_result': None})
+    job_id = jobs.submit('append', {'dataset_id': dataset_id, 'parent_id': parent_id, 'upload_path': upload_path,
+                                    'filename': file.filename})
+    store.update_state(dataset_id, job_id=job_id)
+    session['dataset_id'] = dataset_id
+    return redirect(url_for('dashboard'))
+
+
+@app.route('/versions')
+def list_versions():
+    """The versions of the current dataset, oldest first."""
+    dataset_id, df = _current_dataset()
+    if df is None:
+        return jsonify({'error': 'Please upload a data file first.'}), 400
+    return jsonify(versions_of(dataset_id))
+
+
+@app.route('/versions/diff')
+def diff_dataset_versions():
+    """
+    Changes between two versions: ?from=1&to=2&by=Product&by=Market. Defaults to the
+    previous and the current version, aggregated by Product and Market.
+    """
+    dataset_id, df = _current_dataset()
+    if df is None:
+        return jsonify({'error': 'Please upload a data file first.'}), 400
+    versions = versions_of(dataset_id)
+    to_number = request.args.get('to', versions[-1]['version'], type=int)
+    from_number = request.args.get('from', max(versions[0]['version'], to_number - 1), type=int)
+    by = request.args.getlist('by') or [d for d in ('Product', 'Market') if d in df.columns]
+    try:
+        diff = diff_versions(versions, from_number, to_number, by)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 400
+    changes = diff['changes']
+    diff['changes'] = json.loads(changes.to_json(orient='records'))
+    return jsonify(diff)
+
+
+@app.context_processor
+def _portfolio_flag():
+    # upload.html is shared with app.py, which has no portfolio routes
+    return {'portfolio_enabled': True}
+
+
+@app.route('/portfolio/upload', methods=['POST'])
+def portfolio_upload():
+    """
+    Starts one background pipeline per company listed in the manifest; the data files are
+    uploaded alongside it in the same request and matched by file name.
+    """
+    manifest = request.files.get('manifest')
+    files = {os.path.basename(f.filename): f for f in request.files.getlist('files') if f and f.filename}
+    if not manifest or manifest.filename == '':
+        flash("Please choose a manifest file.", "error")
+        return redirect(url_for('upload_file_page'))
+    try:
+        companies = parse_manifest(manifest.read(), manifest.filename)
+    except ValueError as e:
+        flash(str(e), "error")
+        return redirect(url_for('upload_file_page'))
+    missing = [c['file'] for c in companies if os.path.basename(c['file']) not in files]
+    unsupported = [c['file'] for c in companies if not is_supported_file(c['file'])]
+    if missing or unsupported:
+        problems = ([f"files not uploaded: {', '.join(missing)}"] if missing else []) + \
+                   ([f"unsupported files: {', '.join(unsupported)}"] if unsupported else [])
+        flash(f"Cannot start the portfolio ({'; '.join(problems)}).", "error")
+        return redirect(url_for('upload_file_page'))
+
+    portfolio_id = new_dataset_id()
+    os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+    for company in companies:
+        dataset_id = new_dataset_id()
+        filename = os.path.basename(company['file'])
+        upload_path = os.path.join(JOB_UPLOAD_DIR, dataset_id + os.path.splitext(filename)[1].lower())
+        # The same file may serve several companies, so save a copy per company
+        files[filename].stream.seek(0)
+        files[filename].save(upload_path)
+        # Initial state first, as in upload_file
+        store.update_state(dataset_id, portfolio_id=portfolio_id,
+                           company_name=company['company_name'], company_cik=company['company_cik'],
+                           scraped_data_text="", insights=None, simulation_result=None,
+                           scraped_product_data=[], scraped_competitors_data=None)
+        job_id = jobs.submit('portfolio_company', {'dataset_id': dataset_id, 'upload_path': upload_path,
+                                                   'filename': filename, 'company_name': company['company_name'],
+                                                   'company_cik': company['company_cik']})
+        store.update_state(dataset_id, job_id=job_id)
+        company.update(dataset_id=dataset_id, job_id=job_id)
+    store.update_state(portfolio_id, companies=companies)
+
+    previous_id = session.get('portfolio_id')
+    session['portfolio_id'] = portfolio_id
+    if previous_id:
+        for company in store.get_state(previous_id).get('companies') or []:
+            jobs.cancel(company['job_id'])
+            store.drop(company['dataset_id'])
+        store.drop(previous_id)
+    return redirect(url_for('portfolio_dashboard'))
+
+
+def _portfolio_companies():
+    return store.get_state(session.get('portfolio_id')).get('companies') or []
+
+
+def _with_jobs(companies):
+    """The companies with the status of their pipeline job."""
+    rows = []
+    for company in companies:
+        job = jobs.get(company['job_id']) or {'status': jobs.FAILED, 'stage': None, 'error': 'Unknown job'}
+        rows.append({**company, 'status': job['status'], 'stage': job['stage'], 'error': job['error']})
+    return rows
+
+
+@app.route('/portfolio')
+def portfolio_dashboard():
+    """Side-by-side comparison of every company in the current portfolio."""
+    companies = _portfolio_companies()
+    if not companies:
+        flash("Upload a portfolio manifest first.", "error")
+        return redirect(url_for('upload_file_page'))
+    statuses = _with_jobs(companies)
+    comparison = comparison_frame(companies)
+    graph_json = comparison_chart_json(comparison, portfolio_version(companies)) if len(comparison) else None
+    pending = any(c['status'] in (jobs.QUEUED, jobs.RUNNING) for c in statuses)
+    return render_template('portfolio.html', companies=statuses, graph_json=graph_json, pending=pending,
+                           comparison=comparison.to_dict('records'), comparison_columns=list(comparison.columns))
+
+
+@app.route('/portfolio/status')
+def portfolio_status():
+    """Pipeline status per company, polled by the portfolio page."""
+    return jsonify([{k: c[k] for k in ('company_name', 'dataset_id', 'status', 'stage', 'error')}
+                    for c in _with_jobs(_portfolio_companies())])
+
+
+@app.route('/portfolio/open/<dataset_id>')
+def portfolio_open(dataset_id):
+    """Opens one portfolio company in the single-company dashboard."""
+    if dataset_id not in {c['dataset_id'] for c in _portfolio_companies()}:
+        return redirect(url_for('portfolio_dashboard'))
+    session['dataset_id'] = dataset_id
+    return redirect(url_for('dashboard'))
+
+
+@app.route('/portfolio/report')
+def portfolio_report():
+    """Combined xlsx report for the portfolio (comparison, insights, segments and trend per company)."""
+    companies = _portfolio_companies()
+    if not companies:
+        return redirect(url_for('upload_file_page'))
+    path = workbook_report(f"portfolio:{portfolio_version(companies)}", report_sheets(companies))
+    return send_file(path, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name='portfolio_report.xlsx')
+
+
 @app.route('/scrape_product', methods=['POST'])
 def scrape_product_route():
-    global global_scraped_product_data
+    dataset_id, df = _current_dataset()
+    if df is None:
+        flash("Please upload a data file first.", "error")
+        return redirect(url_for('upload_file_page'))
     url = request.form.get('product_url')
     if url:
         result = scrape_product_info(url)
-        global_scraped_product_data.append(result)
+        product_data = store.get_state(dataset_id).get('scraped_product_data') or []
+        product_data.append(result)
+        store.update_state(dataset_id, scraped_product_data=product_data)
         flash(f"Scraped product information from {url}", "success")
     else:
         flash("Please provide a valid URL.", "error")
     return redirect(url_for('dashboard'))
 
 
+@app.route('/scrape_products_batch', methods=['POST'])
+def scrape_products_batch_route():
+    dataset_id, df = _current_dataset()
+    if df is None:
+        flash("Please upload a data file first.", "error")
+        return redirect(url_for('upload_file_page'))
+    urls = _split_urls(request.form.get('product_urls', ''))
+    if urls:
+        results = scrape_products(urls)
+        product_data = store.get_state(dataset_id).get('scraped_product_data') or []
+        product_data.extend(results)
+        store.update_state(dataset_id, scraped_product_data=product_data)
+        failed = sum(1 for r in results if r['Status'] != 'Success')
+        flash(f"Scraped {len(results) - failed} of {len(results)} product URLs", "success" if not failed else "error")
+    else:
+        flash("Please provide one or more URLs.", "error")
+    return redirect(url_for('dashboard'))
+
+
 @app.route('/scrape_competitors', methods=['POST'])
 def scrape_competitors_route():
-    global global_scraped_competitors_data
-    url = request.form.get('competitors_url')
-    if url:
-        global_scraped_competitors_data = scrape_competitors_list(url)
-        flash(f"Scraped competitors from {url}", "success")
+    dataset_id, df = _current_dataset()
+    if df is None:
+        flash("Please upload a data file first.", "error")
+        return redirect(url_for('upload_file_page'))
+    urls = _split_urls(request.form.get('competitors_url', ''))
+    max_pages = request.form.get('max_pages', type=int) or 1
+    if urls:
+        competitors = scrape_competitor_listings(urls, max_pages=max_pages)
+        store.update_state(dataset_id, scraped_competitors_data=competitors)
+        flash(f"Scraped {len(competitors)} competitors from {', '.join(urls)}", "success")
     else:
         flash("Please provide a valid URL.", "error")
     return redirect(url_for('dashboard'))
 
 
+@app.route('/scrape_cache/stats')
+def scrape_cache_stats():
+    """Hit/miss counters of the on-disk scrape cache for this worker."""
+    return jsonify(http_cache.get_stats())
+
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """Status of a background job and each of its stages, polled by the dashboard."""
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job)
+
+
+def _split_urls(text):
+    """One URL per line (or whitespace separated), duplicates removed, order kept."""
+    return list(dict.fromkeys(u for u in text.split() if u))
+
+
 @app.route('/dashboard', methods=['GET', 'POST'])
 def dashboard():
-    global global_df, global_insights, global_simulation_result, global_scraped_product_data, global_scraped_competitors_data
-
-    if global_df is None or global_df.empty:
+    dataset_id, df = _current_dataset()
+    state = store.get_state(session.get('dataset_id'))
+    job = jobs.get(state['job_id']) if state.get('job_id') else None
+    if df is None and job and job['status'] in (jobs.QUEUED, jobs.RUNNING):
+        # The upload is still being parsed in the background
+        return render_template('processing.html', job=job)
+    if df is None and job and job['status'] == jobs.FAILED:
+        flash(f"Error processing file: {job['error']}", "error")
+        if state.get('parent_id') and store.get(state['parent_id']) is not None:
+            # A rejected append leaves the previous version current
+            store.drop(session['dataset_id'])
+            session['dataset_id'] = state['parent_id']
+            return redirect(url_for('dashboard'))
+        return redirect(url_for('upload_file_page'))
+    if df is None or df.empty:
         return redirect(url_for('upload_file_page'))
     
     # Handle simulation request POST request
     if request.method == 'POST' and 'scenario_text' in request.form:
         scenario = request.form['scenario_text']
-        global_simulation_result = run_simulation(global_df, scenario)
+        cube = get_cube(df, state.get('content_hash', dataset_id))
+        state = store.update_state(dataset_id, simulation_result=run_simulation(df, scenario, cube))
         flash("Simulation run successfully!", "success")
     
     # --- FIX FOR UnboundLocalError: Initialize graph_html first ---
     graph_html = "<p>Data visualization is not available because required columns are missing.</p>"
+    graph_json = None
 
-    # Generate Plotly Chart if columns exist
-    if all(col in global_df.columns for col in ['Product', 'Sales', 'Market']):
-        agg_data = global_df.groupby(['Product', 'Market'])['Sales'].sum().reset_index()
-        fig = px.bar(agg_data, x="Product", y="Sales", color="Market", barmode="group",
-                     title="Sales Performance by Product and Market")
-        graph_html = pio.to_html(fig, full_html=False)
+    # Generate Plotly Chart if columns exist (cached per dataset version)
+    if all(col in df.columns for col in ['Product', 'Sales', 'Market']):
+        graph_json = sales_chart_json(df, state.get('content_hash', dataset_id))
     # The 'else' case is now handled by the initial assignment above
 
     # Render insights markdown to HTML
-    insights_html = markdown.markdown(global_insights if global_insights else "No insights generated yet.")
-    simulation_html = markdown.markdown(global_simulation_result if global_simulation_result else "Run a simulation below.")
+    pending_job = job if job and job['status'] in (jobs.QUEUED, jobs.RUNNING) else None
+    import markdown
+    with span('markdown.render'):
+        insights_html = markdown.markdown(state.get('insights') or
+                                          ("Generating insights..." if pending_job else "No insights generated yet."))
+        simulation_html = markdown.markdown(state.get('simulation_result') or "Run a simulation below.", extensions=['tables'])
     
-    product_data = global_scraped_product_data
-    competitors_data = global_scraped_competitors_data
+    product_data = state.get('scraped_product_data') or []
+    competitors_data = state.get('scraped_competitors_data')
     
     return render_template('dashboard1.html', 
                            graph_html=graph_html, 
+                           graph_json=graph_json,
                            insights_html=insights_html,
                            simulation_html=simulation_html,
                            product_data=product_data,
-                           competitors_data=competitors_data)
+                           competitors_data=competitors_data,
+                           pending_job=pending_job,
+                           versions=versions_of(dataset_id, state))
+
+
+@app.route('/data_view')
+def data_view():
+    """Virtual-scrolling table over the whole dataset; rows are fetched page by page from /data/rows."""
+    dataset_id, df = _current_dataset()
+    if df is None or df.empty:
+        return redirect(url_for('upload_file_page'))
+    index = get_row_index(df, store.get_state(dataset_id).get('content_hash', dataset_id))
+    return render_template('data_view.html', columns=[str(c) for c in df.columns], facets=index.facets(), total=len(df))
+
+
+@app.route('/data/rows')
+def data_rows():
+    """
+    One page of rows as JSON: ?offset=0&limit=100&sort=Sales&desc=1&Market=North&Market=South.
+    Filter values within a column are OR-ed; filters on different columns are AND-ed.
+    """
+    dataset_id, df = _current_dataset()
+    if df is None:
+        return jsonify({'error': 'Please upload a data file first.'}), 400
+    index = get_row_index(df, store.get_state(dataset_id).get('content_hash', dataset_id))
+    filters = {col: request.args.getlist(col) for col in index.filter_columns if col in request.args}
+    try:
+        page = index.page(df, offset=request.args.get('offset', 0, type=int),
+                          limit=request.args.get('limit', 100, type=int),
+                          filters=filters,
+                          sort=request.args.get('sort') or None,
+                          descending=request.args.get('desc', 0, type=int) == 1)
+    except KeyError as e:
+        return jsonify({'error': e.args[0]}), 400
+    return jsonify(page)
+
+
+@app.route('/simulate/scenarios', methods=['POST'])
+def simulate_scenarios_route():
+    """
+    Runs and narrates several typed scenarios ({"scenarios": ["...", ...]}) in one go; the
+    narratives are requested together (see llm_analyzer.run_simulations).
+    """
+    dataset_id, df = _current_dataset()
+    if df is None:
+        return jsonify({'error': 'Please upload a data file first.'}), 400
+    scenarios = (request.get_json(silent=True) or {}).get('scenarios')
+    if not isinstance(scenarios, list) or not scenarios or not all(isinstance(s, str) and s.strip() for s in scenarios):
+        return jsonify({'error': 'Expected {"scenarios": [...]} with one or more scenario texts.'}), 400
+    if len(scenarios) > SIMULATION_MAX_NARRATED:
+        return jsonify({'error': f"At most {SIMULATION_MAX_NARRATED} scenarios can be run at once."}), 400
+    version = store.get_state(dataset_id).get('content_hash')
+    cube = get_cube(df, version or dataset_id)
+    texts = run_simulations(df, scenarios, cube, dataset_version=version)
+    import markdown
+    with span('markdown.render'):
+        results = [{'scenario': scenario, 'markdown': text, 'html': markdown.markdown(text, extensions=['tables'])}
+                   for scenario, text in zip(scenarios, texts)]
+    return jsonify({'results': results})
+
+
+@app.route('/simulate/batch', methods=['POST'])
+def simulate_batch_route():
+    """Streams a grid or Monte Carlo sweep back as NDJSON (see batch_simulation.run_batch)."""
+    dataset_id, df = _current_dataset()
+    if df is None:
+        return jsonify({'error': 'Please upload a data file first.'}), 400
+    spec = request.get_json(silent=True) or {}
+    cube = get_cube(df, store.get_state(dataset_id).get('content_hash', dataset_id))
+    lines = run_batch(cube, spec)
+    try:
+        # The first line is produced after the spec is validated, so errors can still be a 400
+        first = next(lines)
+    except (ValueError, KeyError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    return Response(stream_with_context(itertools.chain([first], lines)), mimetype='application/x-ndjson')
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _relay_markdown(chunks, dataset_id, field):
+    """
+    Relays text chunks as Server-Sent 'token' events, then stores the full text under
+    `field` in the dataset state and sends it rendered as HTML in a final 'done' event.
+    """
+    parts = []
+    for chunk in chunks:
+        parts.append(chunk)
+        yield _sse('token', chunk)
+    text = ''.join(parts)
+    store.update_state(dataset_id, **{field: text})
+    import markdown
+    with span('markdown.render'):
+        html = markdown.markdown(text, extensions=['tables'])
+    yield _sse('done', html)
+
+
+def _event_stream(events):
+    # X-Accel-Buffering stops a fronting nginx from holding tokens back
+    return Response(stream_with_context(events), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@app.route('/stream/insights')
+def stream_insights_route():
+    """Streams AI insights for the current dataset into the dashboard as they are generated."""
+    dataset_id, df = _current_dataset()
+    if df is None:
+        return jsonify({'error': 'Please upload a data file first.'}), 400
+    state = store.get_state(dataset_id)
+    chunks = stream_insights(df, state.get('scraped_data_text') or '', state.get('content_hash'),
+                             company=state.get('company_name'), cik=state.get('company_cik'))
+    return _event_stream(_relay_markdown(chunks, dataset_id, 'insights'))
+
+
+@app.route('/stream/simulation')
+def stream_simulation_route():
+    """Streams a simulation: the computed results table first, then the LLM narrative."""
+    dataset_id, df = _current_dataset()
+    if df is None:
+        return jsonify({'error': 'Please upload a data file first.'}), 400
+    scenario = request.args.get('scenario', '').strip()
+    if not scenario:
+        return jsonify({'error': 'Please describe a scenario.'}), 400
+    version = store.get_state(dataset_id).get('content_hash')
+    cube = get_cube(df, version or dataset_id)
+    return _event_stream(_relay_markdown(stream_simulation(df, scenario, cube, dataset_version=version),
+                                         dataset_id, 'simulation_result'))
 
 
 @app.route('/download_excel_report')
 def download_excel_report():
-    global global_df, global_insights, global_simulation_result, global_scraped_competitors_data, global_scraped_product_data
-    if global_df is None or global_df.empty: return redirect(url_for('upload_file_page'))
-    buffer = io.BytesIO()
-    with pd.ExcelWriter(buffer, engine='xlsxwriter') as writer:
-        global_df.to_excel(writer, sheet_name='Raw Data', index=False)
-        insights_data = {'Section': ['AI Insights', 'Simulation Results'], 'Content': [global_insights if global_insights else 'N/A', global_simulation_result if global_simulation_result else 'N/A']}
-        insights_df = pd.DataFrame(insights_data)
-        insights_df.to_excel(writer, sheet_name='Summary', index=False)
-        if global_scraped_competitors_data:
-            comp_df = pd.DataFrame(global_scraped_competitors_data)
-            comp_df.to_excel(writer, sheet_name='Competitors', index=False)
-        if global_scraped_product_data:
-            prod_df = pd.DataFrame(global_scraped_product_data)
-            prod_df.to_excel(writer, sheet_name='Scraped Products', index=False)
-
-    buffer.seek(0)
-    return send_file(buffer, mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', as_attachment=True, download_name='company_status_report.xlsx')
+    dataset_id, df = _current_dataset()
+    if df is None or df.empty: return redirect(url_for('upload_file_page'))
+    state = store.get_state(dataset_id)
+    insights_data = {'Section': ['AI Insights', 'Simulation Results'], 'Content': [state.get('insights') or 'N/A', state.get('simulation_result') or 'N/A']}
+    sheets = [('Summary', pd.DataFrame(insights_data), None)]
+    if state.get('scraped_competitors_data'):
+        sheets.append(('Competitors', pd.DataFrame(state['scraped_competitors_data']), None))
+    if state.get('scraped_product_data'):
+        sheets.append(('Scraped Products', pd.DataFrame(state['scraped_product_data']), None))
+    # Written in constant memory to a cached file (reused until the data or summary changes)
+    try:
+        path = excel_report(state.get('content_hash', dataset_id), df, sheets)
+    except ValueError as e:
+        flash(f"Could not build the Excel report: {e}", "error")
+        return redirect(url_for('dashboard'))
+    return send_file(path, mimetype=XLSX_MIMETYPE, as_attachment=True, download_name='company_status_report.xlsx')
+
+@app.route('/export/<fmt>')
+def export_data(fmt):
+    """Raw data as CSV (streamed while it is generated) or Parquet (cached per dataset version)."""
+    dataset_id, df = _current_dataset()
+    if df is None or df.empty: return redirect(url_for('upload_file_page'))
+    if fmt == 'csv':
+        return Response(stream_with_context(csv_chunks(df)), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=company_data.csv'})
+    if fmt == 'parquet':
+        path = parquet_export(store.get_state(dataset_id).get('content_hash', dataset_id), df)
+        return send_file(path, mimetype='application/vnd.apache.parquet', as_attachment=True, download_name='company_data.parquet')
+    return jsonify({'error': f"Unsupported export format '{fmt}' (use csv or parquet)"}), 404
 
 @app.route('/download_report')
 def download_report():
     return "Functionality available in previous app.py versions if needed."
 
+startup.mark('app')
+startup.start()
+
 if __name__ == '__main__':
     if not os.path.exists('static'): os.makedirs('static')
     if not os.path.exists('static/css'): os.makedirs('static/css')
@@ -0,0 +1,309 @@
+# batch_simulation.py
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from config import (BATCH_CHUNK_SIZE, BATCH_MAX_SCENARIOS, BATCH_POOL_THRESHOLD, BATCH_POOL_WORKERS,
+                    SIMULATION_DEFAULT_ELASTICITY)
+from simulation_engine import empty_scenario
+
+# A batch request varies scenario parameters addressed by dotted paths:
+#   'price_change.<product>|*', 'elasticity.<market>|*', 'volume_shock.<product>|*', 'cost_change'
+#
+#   {"base": {...scenario...}, "grid": {"price_change.*": [0, 0.05, 0.1], "elasticity.North": [-0.3, -0.8]}}
+#   {"base": {...}, "monte_carlo": {"draws": 1000, "seed": 7,
+#       "distributions": {"elasticity.North": {"dist": "normal", "mean": -0.5, "sd": 0.1}}}}
+#
+# Every scenario becomes one row of parameter matrices, and all rows are evaluated
+# against the cube's base cells with array broadcasting; large batches are split into
+# chunks that run on a process pool and are streamed back as they finish.
+
+PERCENTILES = [5, 25, 50, 75, 95]
+MAPPED_PARAMETERS = {'price_change': 'Product', 'volume_shock': 'Product', 'elasticity': 'Market'}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # The app process already runs several threads (job pool, event loops, warm-up);
+            # forking it could copy a held lock into a child, so children are started from a
+            # clean server process instead (spawn where forkserver is unavailable, e.g. Windows)
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            context = multiprocessing.get_context(method)
+            if method == 'forkserver':
+                context.set_forkserver_preload(['batch_simulation'])
+            _pool = ProcessPoolExecutor(max_workers=BATCH_POOL_WORKERS, mp_context=context)
+        return _pool
+
+
+# --- Cells and parameter matrices ---
+
+def cells_from_cube(cube):
+    """Flattens the cube's base cells into the arrays the batch evaluator works on."""
+    base = cube.base()
+    products = base['Product'].astype('category')
+    markets = base['Market'].astype('category')
+    segments = (base['Product'].astype(str) + ' / ' + base['Market'].astype(str)).astype('category')
+    sales = base['Sales'].to_numpy(dtype='float64')
+    return {
+        'sales': sales,
+        'cost': sales - base['Profit'].to_numpy(dtype='float64'),
+        'product_codes': products.cat.codes.to_numpy(),
+        'market_codes': markets.cat.codes.to_numpy(),
+        'segment_codes': segments.cat.codes.to_numpy(),
+        'products': [str(p) for p in products.cat.categories],
+        'markets': [str(m) for m in markets.cat.categories],
+        'segments': [str(s) for s in segments.cat.categories],
+    }
+
+
+def _check_path(path, cells):
+    name, _, label = path.partition('.')
+    if name == 'cost_change' and not label:
+        return
+    if name in MAPPED_PARAMETERS and label:
+        labels = cells['products'] if MAPPED_PARAMETERS[name] == 'Product' else cells['markets']
+        if label == '*' or label in labels:
+            return
+    raise ValueError(f"Unknown scenario parameter '{path}'")
+
+
+def parameter_matrices(cells, base, columns, n_scenarios):
+    """
+    Builds per-scenario parameter matrices from a base scenario and varied `columns`
+    ({path: array of n_scenarios values}). '*' paths are applied before specific labels.
+    """
+    def mapped(name, labels, default):
+        row = [base[name].get(label, base[name].get('*', default)) for label in labels]
+        matrix = np.tile(np.asarray(row, dtype='float64'), (n_scenarios, 1))
+        if f'{name}.*' in columns:
+            matrix[:] = np.asarray(columns[f'{name}.*'], dtype='float64')[:, None]
+        for i, label in enumerate(labels):
+            if f'{name}.{label}' in columns:
+                matrix[:, i] = columns[f'{name}.{label}']
+        return matrix
+
+    cost = np.full(n_scenarios, float(base['cost_change']))
+    if 'cost_change' in columns:
+        cost = np.asarray(columns['cost_change'], dtype='float64')
+    return {
+        'price': mapped('price_change', cells['products'], 0.0),
+        'elasticity': mapped('elasticity', cells['markets'], SIMULATION_DEFAULT_ELASTICITY),
+        'shock': mapped('volume_shock', cells['products'], 0.0),
+        'cost': cost,
+    }
+
+
+def evaluate(cells, params):
+    """
+    Evaluates every scenario row in `params` at once. Returns total and per-segment
+    Sales/Profit after the change, shaped (n_scenarios,) and (n_scenarios, n_segments).
+    """
+    price = params['price'][:, cells['product_codes']]
+    elasticity = params['elasticity'][:, cells['market_codes']]
+    shock = params['shock'][:, cells['product_codes']]
+
+    volume = np.clip(1 + elasticity * price, 0, None) * (1 + shock)
+    new_sales = cells['sales'] * (1 + price) * volume
+    new_profit = new_sales - cells['cost'] * volume * (1 + params['cost'][:, None])
+
+    # One-hot segment matrix turns the per-cell results into per-segment sums with one matmul
+    one_hot = np.zeros((len(cells['segment_codes']), len(cells['segments'])))
+    one_hot[np.arange(len(cells['segment_codes'])), cells['segment_codes']] = 1.0
+    return {
+        'sales': new_sales.sum(axis=1),
+        'profit': new_profit.sum(axis=1),
+        'segment_sales': new_sales @ one_hot,
+        'segment_profit': new_profit @ one_hot,
+    }
+
+
+def _evaluate_chunk(cells, base, chunk, start, stop):
+    """Process-pool entry point: evaluates scenarios [start, stop), whose varied values are `chunk`."""
+    result = evaluate(cells, parameter_matrices(cells, base, chunk, stop - start))
+    return start, stop, result
+
+
+def _chunk_bounds(n_scenarios, chunk_size):
+    return [(start, min(start + chunk_size, n_scenarios)) for start in range(0, n_scenarios, chunk_size)]
+
+
+# --- Batch specs ---
+
+def _section(value, what):
+    """`value` if it is a JSON object ({} for None); raises ValueError naming `what` otherwise."""
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise ValueError(f"{what} must be an object, not {json.dumps(value)}")
+    return value
+
+
+def _normalize_base(base):
+    base = _section(base, "'base'")
+    scenario = empty_scenario()
+    for key in ('price_change', 'elasticity', 'volume_shock'):
+        scenario[key] = {str(k): float(v) for k, v in _section(base.get(key), f"'base.{key}'").items()}
+    scenario['cost_change'] = float(base.get('cost_change') or 0.0)
+    return scenario
+
+
+def expand_grid(grid):
+    """Cartesian product of the grid axes as {path: array}; every axis needs at least one value."""
+    if not isinstance(grid, dict):
+        raise ValueError("'grid' must map parameter paths to lists of values.")
+    paths = list(grid)
+    axes = []
+    for path in paths:
+        axis = np.asarray(grid[path], dtype='float64')
+        if axis.ndim != 1 or len(axis) == 0:
+            raise ValueError(f"Grid axis '{path}' must be a non-empty list of numbers.")
+        axes.append(axis)
+    n_scenarios = int(np.prod([len(a) for a in axes])) if axes else 0
+    if n_scenarios > BATCH_MAX_SCENARIOS:
+        raise ValueError(f"Grid has {n_scenarios} scenarios; the limit is {BATCH_MAX_SCENARIOS}.")
+    mesh = np.meshgrid(*axes, indexing='ij') if axes else []
+    return {p: m.ravel() for p, m in zip(paths, mesh)}, n_scenarios
+
+
+def draw_monte_carlo(spec):
+    """Draws {path: array} from the distributions in a Monte Carlo spec."""
+    spec = _section(spec, "'monte_carlo'")
+    draws = int(spec.get('draws', 1000))
+    if not 0 < draws <= BATCH_MAX_SCENARIOS:
+        raise ValueError(f"'draws' must be between 1 and {BATCH_MAX_SCENARIOS}.")
+    rng = np.random.default_rng(spec.get('seed'))
+    columns = {}
+    for path, dist in _section(spec.get('distributions'), "'distributions'").items():
+        kind = _section(dist, f"The distribution of '{path}'").get('dist', 'normal')
+        if kind == 'normal':
+            columns[path] = rng.normal(dist['mean'], dist['sd'], draws)
+        elif kind == 'uniform':
+            columns[path] = rng.uniform(dist['low'], dist['high'], draws)
+        elif kind == 'triangular':
+            columns[path] = rng.triangular(dist['low'], dist['mode'], dist['high'], draws)
+        else:
+            raise ValueError(f"Unsupported distribution '{kind}' for {path}")
+    return columns, draws
+
+
+def parse_batch_spec(spec, cells):
+    """
+    Returns (base scenario, varied columns, number of scenarios) for a batch request. Raises
+    ValueError for a request that is not shaped like the examples above.
+    """
+    spec = _section(spec, "A batch request")
+    base = _normalize_base(spec.get('base'))
+    if spec.get('grid'):
+        columns, n_scenarios = expand_grid(spec['grid'])
+    elif spec.get('monte_carlo'):
+        columns, n_scenarios = draw_monte_carlo(spec['monte_carlo'])
+    else:
+        raise ValueError("Batch request needs a 'grid' or a 'monte_carlo' section.")
+    if n_scenarios <= 0:
+        raise ValueError("The batch request produces no scenarios.")
+    for path in columns:
+        _check_path(path, cells)
+    return base, columns, n_scenarios
+
+
+# --- Summaries ---
+
+def percentile_bands(values, baseline):
+    """Percentiles of `values` (scenarios along axis 0) and of their change from `baseline`."""
+    bands = np.percentile(values, PERCENTILES, axis=0)
+    return {
+        'value': {f'p{p}': np.round(bands[i], 2).tolist() for i, p in enumerate(PERCENTILES)},
+        'change': {f'p{p}': np.round(bands[i] - baseline, 2).tolist() for i, p in enumerate(PERCENTILES)},
+    }
+
+
+def tornado(cells, base, columns):
+    """
+    One-at-a-time sensitivity: each varied parameter is moved to its lowest and highest
+    value while the others stay at their median. Rows are sorted by profit swing.
+    """
+    centre = {p: float(np.median(v)) for p, v in columns.items()}
+    rows = []
+    for path, values in columns.items():
+        low, high = float(np.min(values)), float(np.max(values))
+        probe = {p: np.array([c, c]) for p, c in centre.items()}
+        probe[path] = np.array([low, high])
+        result = evaluate(cells, parameter_matrices(cells, base, probe, 2))
+        rows.append({
+            'parameter': path,
+            'low': low,
+            'high': high,
+            'profit_at_low': round(float(result['profit'][0]), 2),
+            'profit_at_high': round(float(result['profit'][1]), 2),
+            'swing': round(abs(float(result['profit'][1] - result['profit'][0])), 2),
+        })
+    return sorted(rows, key=lambda r: r['swing'], reverse=True)
+
+
+# --- Streaming driver ---
+
+def run_batch(cube, spec):
+    """
+    Runs a batch request and yields NDJSON lines: one 'chunk' line per finished chunk of
+    scenarios (in completion order) and a final 'summary' line with percentile bands and
+    the tornado table.
+    """
+    cells = cells_from_cube(cube)
+    base, columns, n_scenarios = parse_batch_spec(spec, cells)
+    baseline_sales = float(cells['sales'].sum())
+    baseline_profit = float((cells['sales'] - cells['cost']).sum())
+
+    yield json.dumps({'type': 'start', 'scenarios': n_scenarios, 'parameters': list(columns),
+                      'segments': cells['segments']}) + "\n"
+
+    def chunk(start, stop):
+        return {path: values[start:stop] for path, values in columns.items()}
+
+    if n_scenarios >= BATCH_POOL_THRESHOLD and BATCH_POOL_WORKERS > 1:
+        # One chunk per worker: every submit pickles the cells, so fewer, larger chunks pay
+        # for that once per worker, and only each chunk's own slice of the varied values is sent
+        pool = _get_pool()
+        bounds = _chunk_bounds(n_scenarios, max(BATCH_CHUNK_SIZE, -(-n_scenarios // BATCH_POOL_WORKERS)))
+        futures = [pool.submit(_evaluate_chunk, cells, base, chunk(start, stop), start, stop)
+                   for start, stop in bounds]
+        finished = (future.result() for future in as_completed(futures))
+    else:
+        bounds = _chunk_bounds(n_scenarios, BATCH_CHUNK_SIZE)
+        finished = (_evaluate_chunk(cells, base, chunk(start, stop), start, stop) for start, stop in bounds)
+
+    totals = {'sales': np.empty(n_scenarios), 'profit': np.empty(n_scenarios)}
+    segment_profit = np.empty((n_scenarios, len(cells['segments'])))
+    done = 0
+    for start, stop, result in finished:
+        totals['sales'][start:stop] = result['sales']
+        totals['profit'][start:stop] = result['profit']
+        segment_profit[start:stop] = result['segment_profit']
+        done += stop - start
+        scenarios = [
+            {**{p: float(columns[p][i]) for p in columns},
+             'sales': round(float(result['sales'][i - start]), 2),
+             'profit': round(float(result['profit'][i - start]), 2)}
+            for i in range(start, stop)
+        ]
+        yield json.dumps({'type': 'chunk', 'start': start, 'done': done, 'scenarios': scenarios}) + "\n"
+
+    baseline_segment_profit = np.zeros(len(cells['segments']))
+    np.add.at(baseline_segment_profit, cells['segment_codes'], cells['sales'] - cells['cost'])
+    summary = {
+        'type': 'summary',
+        'baseline': {'sales': round(baseline_sales, 2), 'profit': round(baseline_profit, 2)},
+        'sales': percentile_bands(totals['sales'], baseline_sales),
+        'profit': percentile_bands(totals['profit'], baseline_profit),
+        'segment_profit': percentile_bands(segment_profit, baseline_segment_profit),
+        'tornado': tornado(cells, base, columns),
+    }
+    yield json.dumps(summary) + "\n"
+
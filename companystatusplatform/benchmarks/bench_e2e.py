@@ -0,0 +1,345 @@
+# benchmarks/bench_e2e.py
+"""
+End-to-end benchmark of the dashboard app (app1.py) on synthetic data.
+
+For each dataset size, a workbook in the create_sample_excel() schema (Product, Market,
+Zone, Sales, Profit, Year) is generated once and uploaded through the Flask test client;
+then the dashboard, a simulation POST, the streamed simulation and insights and the Excel
+report download are requested repeatedly. Scrapers fetch from a local fixture server and
+LLM calls go to a stub OpenAI-compatible server (see stub_servers.py), so results do not
+depend on the network. The LLM response cache is disabled unless --llm-cache is given.
+
+Per stage it reports latency percentiles, throughput and the peak RSS of the process
+while the stage ran. Run from the companystatusplatform directory:
+
+    python benchmarks/bench_e2e.py [--rows 1000 100000 1000000] [--json results.json]
+                                   [--baseline previous.json --tolerance 0.25]
+
+With --baseline, the exit status is 1 if any stage's median latency grew by more than
+--tolerance compared to the baseline results.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+import numpy as np
+import requests
+import xlsxwriter
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from stub_servers import FixtureServer, StubOpenAIServer  # noqa: E402
+
+PRODUCTS = ['Laptop', 'Smartphone', 'Tablet', 'Monitor', 'Headphones', 'Camera']
+MARKETS = ['North', 'South', 'East', 'West']
+ZONES = ['Zone A', 'Zone B', 'Zone C', 'Zone D']
+YEARS = list(range(2018, 2025))
+COLUMNS = ['Product', 'Market', 'Zone', 'Sales', 'Profit', 'Year']
+
+SCENARIO = 'Smartphone price +10%; elasticity North -0.5 South -0.8; cost up 3%'
+PERCENTILES = (50, 90, 95, 99)
+
+
+# --- Synthetic data ---
+
+def synthetic_columns(rows, seed=0):
+    """Columns of a synthetic dataset with `rows` rows in the sample workbook's schema."""
+    rng = np.random.default_rng(seed)
+    sales = rng.integers(500, 20000, rows)
+    profit = (sales * rng.uniform(0.05, 0.35, rows)).astype('int64')
+    return [np.array(PRODUCTS)[rng.integers(0, len(PRODUCTS), rows)],
+            np.array(MARKETS)[rng.integers(0, len(MARKETS), rows)],
+            np.array(ZONES)[rng.integers(0, len(ZONES), rows)],
+            sales, profit, np.array(YEARS)[rng.integers(0, len(YEARS), rows)]]
+
+
+def synthetic_file(directory, rows, file_format, seed=0):
+    """Path of the synthetic dataset file, generated on first use and reused afterwards."""
+    path = os.path.join(directory, f"synthetic_{rows}_{seed}.{file_format}")
+    if os.path.exists(path):
+        return path
+    os.makedirs(directory, exist_ok=True)
+    columns = synthetic_columns(rows, seed)
+    tmp_path = f"{path}.tmp"
+    if file_format == 'xlsx':
+        workbook = xlsxwriter.Workbook(tmp_path, {'constant_memory': True})
+        worksheet = workbook.add_worksheet('Sheet1')
+        worksheet.write_row(0, 0, COLUMNS)
+        for row_number, values in enumerate(zip(*(c.tolist() for c in columns)), start=1):
+            worksheet.write_row(row_number, 0, values)
+        workbook.close()
+    else:
+        import pandas as pd
+        frame = pd.DataFrame(dict(zip(COLUMNS, columns)))
+        if file_format == 'csv':
+            frame.to_csv(tmp_path, index=False)
+        else:
+            frame.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+# --- Measurement ---
+
+def current_rss():
+    """Resident set size of this process in bytes (peak RSS where /proc is not available)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RssSampler:
+    """Samples RSS on a background thread; `reset()` starts a new window, `peak` is its maximum."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def reset(self):
+        self.peak = current_rss()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def percentile(values, q):
+    """Linearly interpolated q-th percentile of `values`."""
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+class Recorder:
+    """Latencies, peak RSS and processed rows per stage."""
+
+    def __init__(self, sampler):
+        self.sampler = sampler
+        self.stages = {}
+
+    def _stage(self, stage):
+        return self.stages.setdefault(stage, {'latencies': [], 'peak_rss': 0, 'rows': 0})
+
+    def measure(self, stage, fn, rows=0):
+        """Calls fn(), recording its latency and the peak RSS while it ran; returns its result."""
+        self.sampler.reset()
+        started = time.perf_counter()
+        result = fn()
+        self.add(stage, time.perf_counter() - started, self.sampler.peak, rows)
+        return result
+
+    def add(self, stage, seconds, peak_rss=0, rows=0):
+        entry = self._stage(stage)
+        entry['latencies'].append(seconds)
+        entry['peak_rss'] = max(entry['peak_rss'], peak_rss)
+        entry['rows'] += rows
+
+    def summary(self):
+        results = {}
+        for stage, entry in self.stages.items():
+            latencies = entry['latencies']
+            total = sum(latencies)
+            stats = {'n': len(latencies), 'mean_ms': total / len(latencies) * 1000,
+                     'max_ms': max(latencies) * 1000,
+                     'throughput_per_s': len(latencies) / total if total else None,
+                     'peak_rss_mb': entry['peak_rss'] / 2 ** 20 if entry['peak_rss'] else None}
+            for q in PERCENTILES:
+                stats[f"p{q}_ms"] = percentile(latencies, q) * 1000
+            if entry['rows']:
+                stats['rows_per_s'] = entry['rows'] / total if total else None
+            results[stage] = stats
+        return results
+
+
+# --- App under test ---
+
+def configure_environment(workdir, fixture, llm, llm_cache):
+    """Points the app's config at the work directory and the local servers; call before importing it."""
+    data_dir = os.path.join(workdir, 'data')
+    shutil.rmtree(data_dir, ignore_errors=True)
+    os.environ.update({
+        'DATA_DIR': data_dir,
+        'CHROMA_DB_PATH': os.path.join(data_dir, 'chroma_db'),
+        'OPENAI_API_KEY': 'benchmark-key',
+        'OPENAI_BASE_URL': llm.url,
+        'SCRAPE_SOURCE_DEADLINE': os.environ.get('SCRAPE_SOURCE_DEADLINE', '10'),
+    })
+    if not llm_cache:
+        os.environ['LLM_CACHE_TTL'] = '0'  # every lookup misses, so each call reaches the stub server
+
+
+def use_fixture_sources(fixture):
+    """Re-registers the scrape sources so they fetch from the fixture server."""
+    import data_scraper
+
+    def fetch(url):
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+        return response.text
+
+    for source in list(data_scraper.SOURCES):
+        data_scraper.register_source(
+            source['name'], source['title'],
+            lambda name, ticker, source_name=source['name']: (
+                f"{fixture.url}/books_product_page.html?source={source_name}&company={quote(name)}"),
+            fetch=fetch)
+
+
+def wait_for_job(jobs, job_id, poll=0.01):
+    while True:
+        job = jobs.get(job_id)
+        if job['status'] in jobs.FINISHED:
+            return job
+        time.sleep(poll)
+
+
+def run_size(app1, jobs, store, recorder, path, rows, args, fixture):
+    from config import INGEST_CACHE_DIR
+    with open(path, 'rb') as f:
+        data = f.read()
+    filename = f"benchmark.{args.format}"
+    for upload in range(args.uploads):
+        if not args.warm_ingest:
+            shutil.rmtree(INGEST_CACHE_DIR, ignore_errors=True)  # parse the file again on every upload
+        client = app1.app.test_client()
+        company = f"Benchmark Co {rows}-{upload}-{time.time_ns()}"  # new scrape URLs, so the scrape cache misses
+        form = {'file': (io.BytesIO(data), filename), 'company_name': company, 'company_cik': '0000000000'}
+
+        recorder.sampler.reset()
+        started = time.perf_counter()
+        response = client.post('/upload', data=form)
+        recorder.add('upload_request', time.perf_counter() - started, recorder.sampler.peak)
+        assert response.status_code == 302, f"/upload returned {response.status_code}"
+        with client.session_transaction() as session:
+            job_id = store.get_state(session['dataset_id'])['job_id']
+        job = wait_for_job(jobs, job_id)
+        recorder.add('upload_pipeline', time.perf_counter() - started, recorder.sampler.peak, rows)
+        if job['status'] != jobs.DONE:
+            raise RuntimeError(f"Upload pipeline {job['status']}: {job['error']}")
+        for name, stage in job['stages'].items():
+            recorder.add(f"stage_{name}", stage['finished_at'] - stage['started_at'],
+                         rows=rows if name == 'parse' else 0)
+
+        for _ in range(args.iterations):
+            def get(url):
+                response = client.get(url)
+                response.get_data()  # read streamed bodies to the end
+                assert response.status_code == 200, f"{url} returned {response.status_code}"
+                return response
+
+            recorder.measure('dashboard_get', lambda: get('/dashboard'))
+            recorder.measure('simulation_post', lambda: client.post('/dashboard', data={'scenario_text': SCENARIO}))
+            recorder.measure('stream_simulation', lambda: get(f"/stream/simulation?scenario={quote(SCENARIO)}"))
+            recorder.measure('stream_insights', lambda: get('/stream/insights'))
+            # The simulation routes above change the report's summary sheet, so each download rebuilds it
+            recorder.measure('excel_report', lambda: get('/download_excel_report'), rows=rows)
+            recorder.measure('scrape_competitors', lambda: client.post('/scrape_competitors', data={
+                'competitors_url': f"{fixture.url}/books_category_page.html?run={time.time_ns()}", 'max_pages': 1}))
+
+
+def print_results(results):
+    header = f"{'stage':<22}{'n':>4}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}{'ops/s':>9}{'rows/s':>12}{'peak MB':>9}"
+    for rows, stages in results.items():
+        print(f"\n{int(rows):,} rows")
+        print(header)
+        for stage, s in stages.items():
+            rows_per_s = f"{s['rows_per_s']:,.0f}" if s.get('rows_per_s') else ''
+            peak = f"{s['peak_rss_mb']:.0f}" if s.get('peak_rss_mb') else ''
+            print(f"{stage:<22}{s['n']:>4}{s['p50_ms']:>10.1f}{s['p90_ms']:>10.1f}{s['p99_ms']:>10.1f}"
+                  f"{s['max_ms']:>10.1f}{s['throughput_per_s'] or 0:>9.2f}{rows_per_s:>12}{peak:>9}")
+
+
+def compare(results, baseline, tolerance):
+    """Stages whose median latency is more than `tolerance` above the baseline's."""
+    regressions = []
+    for rows, stages in results.items():
+        for stage, stats in stages.items():
+            before = baseline.get('results', {}).get(rows, {}).get(stage)
+            if before and before.get('p50_ms') and stats['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+                regressions.append(f"{int(rows):,} rows / {stage}: p50 {before['p50_ms']:.1f} -> {stats['p50_ms']:.1f} ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000, 1000000], help='dataset sizes')
+    parser.add_argument('--format', choices=['xlsx', 'csv', 'parquet'], default='xlsx', help='upload file format')
+    parser.add_argument('--uploads', type=int, default=2, help='uploads per dataset size')
+    parser.add_argument('--iterations', type=int, default=5, help='requests per route and upload')
+    parser.add_argument('--workdir', default=os.path.join(tempfile.gettempdir(), 'companystatus-bench'),
+                        help='generated datasets are kept here; app data is recreated on every run')
+    parser.add_argument('--warm-ingest', action='store_true', help='keep the ingestion cache between uploads')
+    parser.add_argument('--llm-cache', action='store_true', help='keep the LLM response cache enabled')
+    parser.add_argument('--llm-first-token', type=float, default=0.2, help='stub LLM time to first token (s)')
+    parser.add_argument('--llm-token-delay', type=float, default=0.005, help='stub LLM delay between tokens (s)')
+    parser.add_argument('--fixture-delay', type=float, default=0.05, help='fixture server delay per request (s)')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--baseline', help='results file of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p50 slowdown vs the baseline')
+    args = parser.parse_args()
+
+    datasets = {rows: synthetic_file(os.path.join(args.workdir, 'datasets'), rows, args.format) for rows in args.rows}
+
+    with FixtureServer(delay=args.fixture_delay) as fixture, \
+            StubOpenAIServer(first_token_delay=args.llm_first_token, token_delay=args.llm_token_delay) as llm:
+        configure_environment(args.workdir, fixture, llm, args.llm_cache)
+        import app1
+        import jobs
+        from dataset_store import store
+        use_fixture_sources(fixture)
+
+        sampler = RssSampler()
+        results = {}
+        try:
+            for rows, path in datasets.items():
+                recorder = Recorder(sampler)
+                run_size(app1, jobs, store, recorder, path, rows, args, fixture)
+                results[str(rows)] = recorder.summary()
+        finally:
+            sampler.stop()
+        llm_requests, fixture_requests = llm.requests, fixture.requests
+
+    print_results(results)
+    report = {'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                       'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'), 'args': vars(args),
+                       'llm_requests': llm_requests, 'fixture_requests': fixture_requests},
+              'results': results}
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print(f"\nNo stage is more than {args.tolerance:.0%} slower than the baseline.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark of the LLM dispatcher (llm_dispatcher.py) against the stub OpenAI server.
+
+Three workloads are run on a synthetic dataset, with the LLM response cache disabled so
+every narration reaches the dispatcher:
+
+  * identical:  --users threads narrate the same scenario at once (single flight);
+  * distinct:   --users threads narrate different scenarios at once (concurrency cap);
+  * batched:    one call narrates --scenarios scenarios (llm_analyzer.run_simulations).
+
+Each is also run with --failures rate-limited (429) answers injected up front, to show the
+backoff. For every run, the upstream requests the stub received, the most it had in flight
+at once and the wall time are reported. Run from the companystatusplatform directory:
+
+    python benchmarks/bench_llm_dispatch.py --users 10 --scenarios 8 --failures 2
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from stub_servers import StubOpenAIServer  # noqa: E402
+
+
+def configure_environment(workdir, llm_url):
+    os.environ.update({
+        'DATA_DIR': os.path.join(workdir, 'data'),
+        'CHROMA_DB_PATH': os.path.join(workdir, 'chroma'),
+        'OPENAI_API_KEY': 'benchmark-key',
+        'OPENAI_BASE_URL': llm_url,
+        'LLM_CACHE_TTL': '0',
+    })
+
+
+def synthetic_frame(rows=2000):
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(0)
+    sales = rng.integers(500, 20000, rows)
+    return pd.DataFrame({'Product': rng.choice(['Laptop', 'Smartphone', 'Tablet'], rows),
+                         'Market': rng.choice(['North', 'South', 'East', 'West'], rows),
+                         'Zone': rng.choice(['Zone A', 'Zone B'], rows),
+                         'Sales': sales, 'Profit': (sales * 0.2).astype('int64'),
+                         'Year': rng.choice([2022, 2023, 2024], rows)})
+
+
+def concurrently(calls):
+    threads = [threading.Thread(target=call) for call in calls]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def measure(server, failures, workload):
+    """(upstream requests, max in flight, seconds) of running `workload()`."""
+    if failures:
+        server.fail_next(failures, 429, retry_after=0.2)
+    requests_before = server.requests
+    server.max_in_flight = 0
+    started = time.perf_counter()
+    workload()
+    return server.requests - requests_before, server.max_in_flight, time.perf_counter() - started
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=10, help='concurrent callers (default 10)')
+    parser.add_argument('--scenarios', type=int, default=8, help='scenarios narrated in the batched run (default 8)')
+    parser.add_argument('--failures', type=int, default=2, help='429 answers injected per run (default 2)')
+    parser.add_argument('--llm-first-token', type=float, default=0.3, help='stub time to first token (s)')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='bench_llm_') as workdir, \
+            StubOpenAIServer(first_token_delay=args.llm_first_token, token_delay=0.001) as server:
+        configure_environment(workdir, server.url)
+        import llm_analyzer
+        from config import LLM_MAX_CONCURRENCY, LLM_BATCH_MAX
+        from rollup import RollupCube
+
+        df = synthetic_frame()
+        cube = RollupCube(df)
+        counter = iter(range(1, 10 ** 6))
+
+        def identical():
+            scenario = f"Laptop price +{next(counter)}%"
+            concurrently([lambda: llm_analyzer.run_simulation(df, scenario, cube)] * args.users)
+
+        def distinct():
+            scenarios = [f"Tablet price +{next(counter)}%" for _ in range(args.users)]
+            concurrently([lambda s=s: llm_analyzer.run_simulation(df, s, cube) for s in scenarios])
+
+        def batched():
+            llm_analyzer.run_simulations(df, [f"Smartphone price -{next(counter)}%" for _ in range(args.scenarios)],
+                                         cube)
+
+        print(f"LLM_MAX_CONCURRENCY={LLM_MAX_CONCURRENCY} LLM_BATCH_MAX={LLM_BATCH_MAX} users={args.users} "
+              f"scenarios={args.scenarios}")
+        print(f"{'workload':<12}{'429s':>6}{'upstream':>10}{'max in flight':>15}{'seconds':>10}")
+        for name, workload in (('identical', identical), ('distinct', distinct), ('batched', batched)):
+            for failures in sorted({0, args.failures}):
+                upstream, in_flight, seconds = measure(server, failures, workload)
+                print(f"{name:<12}{failures:>6}{upstream:>10}{in_flight:>15}{seconds:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# benchmarks/bench_parse.py
+"""
+Parse-throughput benchmark for the competitor listing scraper on saved fixture pages.
+
+Compares the original approach (full BeautifulSoup tree, two find() calls per product,
+per-row price handling) with each backend in extractors.py and the vectorized price
+conversion. Run from the companystatusplatform directory:
+
+    python benchmarks/bench_parse.py [--seconds 2] [--json results.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from extractors import EXTRACTORS, prices_to_numbers  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def baseline_listing(content):
+    """The parsing loop scrape_competitors_list used before the extraction layer."""
+    soup = BeautifulSoup(content, 'html.parser')
+    competitors = []
+    for item in soup.find_all('article', class_='product_pod'):
+        title = item.h3.a['title'] if item.h3 and item.h3.a else 'N/A'
+        price = item.find('p', class_='price_color').text.strip() if item.find('p', class_='price_color') else 'N/A'
+        competitors.append({'Name': title, 'Price': price})
+    return competitors
+
+
+def baseline_prices(prices):
+    values = []
+    for price in prices:
+        try:
+            values.append(float(price.replace('£', '').replace('$', '').strip()))
+        except ValueError:
+            values.append(None)
+    return values
+
+
+def throughput(fn, arg, seconds):
+    """Calls fn(arg) repeatedly for about `seconds`; returns calls per second."""
+    fn(arg)  # warm-up
+    calls, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        fn(arg)
+        calls += 1
+    return calls / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=2.0, help='time budget per measurement')
+    parser.add_argument('--json', help='write results to this file')
+    args = parser.parse_args()
+
+    with open(os.path.join(FIXTURES, 'books_category_page.html'), 'rb') as f:
+        listing = f.read()
+    with open(os.path.join(FIXTURES, 'books_product_page.html'), 'rb') as f:
+        product = f.read()
+
+    expected = baseline_listing(listing)
+    results = {'listing_pages_per_s': {}, 'product_pages_per_s': {}, 'price_rows_per_s': {}}
+
+    results['listing_pages_per_s']['baseline'] = throughput(baseline_listing, listing, args.seconds)
+    for name, backend in EXTRACTORS.items():
+        rows, _ = backend['listing'](listing)
+        assert rows == expected, f"{name} extractor disagrees with the baseline parse"
+        results['listing_pages_per_s'][name] = throughput(backend['listing'], listing, args.seconds)
+        results['product_pages_per_s'][name] = throughput(backend['product'], product, args.seconds)
+
+    prices = [row['Price'] for row in expected] * 500
+    results['price_rows_per_s']['baseline'] = throughput(baseline_prices, prices, args.seconds) * len(prices)
+    results['price_rows_per_s']['vectorized'] = throughput(prices_to_numbers, prices, args.seconds) * len(prices)
+
+    base = results['listing_pages_per_s']['baseline']
+    print(f"{'listing parser':<16}{'pages/s':>12}{'speedup':>10}")
+    for name, rate in results['listing_pages_per_s'].items():
+        print(f"{name:<16}{rate:>12.1f}{rate / base:>9.1f}x")
+    print()
+    for name, rate in results['product_pages_per_s'].items():
+        print(f"product page ({name}): {rate:.1f} pages/s")
+    for name, rate in results['price_rows_per_s'].items():
+        print(f"price conversion ({name}): {rate:,.0f} rows/s")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Cold-start benchmark of the dashboard app (app1.py).
+
+Each run starts a fresh interpreter that imports app1, serves GET / and GET /dashboard
+through the Flask test client and waits for the background warm-up (see startup.py). The
+child reports the time to import, to the first response and until the warm-up finished,
+plus the warm-up tasks; this script prints the median and worst of each over all runs.
+With --importtime, the slowest modules of the last run's `python -X importtime` output are
+listed as well.
+
+Run from the companystatusplatform directory:
+
+    python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+
+CHILD = r"""
+import json, sys, time
+started = time.perf_counter()
+import app1
+imported = time.perf_counter()
+client = app1.app.test_client()
+client.get('/')
+first_response = time.perf_counter()
+import startup
+startup._thread.join(120)
+warm = time.perf_counter()
+print(json.dumps({'import': imported - started, 'first_response': first_response - started,
+                  'warm': warm - started, 'report': startup.report()}))
+"""
+
+
+def run_child(workdir, importtime=False):
+    """Runs one cold start; returns (timings dict, stderr text)."""
+    env = dict(os.environ, DATA_DIR=os.path.join(workdir, 'data'), CHROMA_DB_PATH=os.path.join(workdir, 'chroma'),
+               PYTHONPATH=APP_DIR, PYTHONDONTWRITEBYTECODE='1')
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', CHILD]
+    process = subprocess.run(command, cwd=APP_DIR, env=env, capture_output=True, text=True, check=True)
+    return json.loads(process.stdout.strip().splitlines()[-1]), process.stderr
+
+
+def slowest_imports(importtime_output, limit=15):
+    """(cumulative seconds, module) of the slowest top-level imports in -X importtime output."""
+    modules = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Only the app's own imports (two levels of indentation at most)
+        if len(name) - len(name.lstrip()) <= 3:
+            modules.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(modules, reverse=True)[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='cold starts to measure (default 5)')
+    parser.add_argument('--importtime', action='store_true', help='also list the slowest imports')
+    args = parser.parse_args(argv)
+
+    results = []
+    stderr = ''
+    with tempfile.TemporaryDirectory(prefix='bench_startup_') as workdir:
+        run_child(workdir)  # creates the data directories and the sample workbook once
+        for number in range(args.runs):
+            timings, stderr = run_child(workdir, importtime=args.importtime and number == args.runs - 1)
+            results.append(timings)
+
+    print(f"{'phase':<22}{'median s':>10}{'max s':>10}")
+    for phase in ('import', 'first_response', 'warm'):
+        values = [r[phase] for r in results]
+        print(f"{phase:<22}{statistics.median(values):>10.3f}{max(values):>10.3f}")
+    tasks = {}
+    for r in results:
+        for task in r['report']['warm_up']:
+            tasks.setdefault(task['task'], []).append(task['seconds'] or 0.0)
+    for task, values in tasks.items():
+        print(f"{'warm_up.' + task:<22}{statistics.median(values):>10.3f}{max(values):>10.3f}")
+
+    if args.importtime:
+        print("\nslowest imports (last run, cumulative s)")
+        for seconds, module in slowest_imports(stderr):
+            print(f"  {seconds:8.3f}  {module}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+# benchmarks/stub_servers.py
+"""
+Local stand-ins for the network services the app talks to, for benchmarks and manual runs:
+
+  * FixtureServer serves the saved pages in benchmarks/fixtures (any path that does not
+    name a fixture gets `default_page`), optionally after a fixed delay per request;
+  * StubOpenAIServer answers POST .../chat/completions like the OpenAI API, with a
+    configurable time to first token and delay between streamed tokens. Point the app at
+    it with OPENAI_BASE_URL=<server.url>. A prompt listing "Scenario <n>:" lines (a
+    batched narration) is answered with one "### Scenario <n>" section per scenario, and
+    `fail_next(count)` makes the next requests fail with a 429 (or another status), to
+    exercise the dispatcher's backoff. `in_flight` / `max_in_flight` count concurrent calls.
+
+Both run on a daemon thread on 127.0.0.1 and an OS-assigned port:
+
+    with StubOpenAIServer(first_token_delay=0.2) as llm:
+        os.environ['OPENAI_BASE_URL'] = llm.url
+"""
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+BATCH_SCENARIO = re.compile(r'^\s*Scenario (\d+):', re.MULTILINE)
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+STUB_REPLY = ("**Overall Company Health:** 7/10. Sales are concentrated in a few products and markets; "
+              "margins are stable year over year. **Risks:** pricing pressure from competitors. "
+              "**Recommendations:** diversify the product mix and monitor the weakest market closely.")
+
+
+class _Server:
+    """Runs a ThreadingHTTPServer for `handler` on a background thread."""
+
+    def __init__(self, handler):
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._httpd.daemon_threads = True
+        self._httpd.owner = self
+        self._thread = None
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self):
+        with self._lock:
+            self.requests += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def owner(self):
+        return self.server.owner
+
+
+class _FixtureHandler(_QuietHandler):
+    def do_GET(self):
+        owner = self.owner
+        owner.count()
+        if owner.delay:
+            time.sleep(owner.delay)
+        name = os.path.basename(urlsplit(self.path).path) or owner.default_page
+        path = os.path.join(FIXTURES, name)
+        if not os.path.isfile(path):
+            path = os.path.join(FIXTURES, owner.default_page)
+        with open(path, 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FixtureServer(_Server):
+    """Serves benchmarks/fixtures over HTTP; `url` is the server root."""
+
+    def __init__(self, delay=0.0, default_page='books_product_page.html'):
+        super().__init__(_FixtureHandler)
+        self.delay = delay
+        self.default_page = default_page
+
+    @property
+    def url(self):
+        return self.base_url
+
+
+class _OpenAIHandler(_QuietHandler):
+    def do_POST(self):
+        owner = self.owner
+        owner.count()
+        owner.enter()
+        try:
+            self._answer(owner)
+        finally:
+            owner.leave()
+
+    def _answer(self, owner):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}})
+            return
+        failure = owner.take_failure()
+        if failure:
+            status, retry_after = failure
+            kind = 'rate_limit_error' if status == 429 else 'server_error' if status >= 500 else 'invalid_request_error'
+            self._json(status, {'error': {'message': f"Stub failure ({status})", 'type': kind}},
+                       headers={'Retry-After': str(retry_after)} if retry_after is not None else None)
+            return
+        model = body.get('model', 'stub-model')
+        prompt = ' '.join(str(m.get('content', '')) for m in body.get('messages', []))
+        reply = owner.reply
+        scenarios = BATCH_SCENARIO.findall(prompt)
+        if scenarios:
+            reply = '\n\n'.join(f"### Scenario {n}\n{owner.reply}" for n in scenarios)
+        words = reply.split(' ')
+        time.sleep(owner.first_token_delay)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        if body.get('stream'):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            try:
+                for i, word in enumerate(words):
+                    if i and owner.token_delay:
+                        time.sleep(owner.token_delay)
+                    self._event(completion_id, model, {'content': word if i == 0 else ' ' + word}, None)
+                self._event(completion_id, model, {}, 'stop')
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client stopped reading (e.g. a cancelled stream)
+            return
+        time.sleep(owner.token_delay * max(0, len(words) - 1))
+        self._json(200, {
+            'id': completion_id, 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+            'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply},
+                         'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(words),
+                      'total_tokens': len(prompt) // 4 + len(words)},
+        })
+
+    def _event(self, completion_id, model, delta, finish_reason):
+        chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+        self.wfile.flush()
+
+    def _json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubOpenAIServer(_Server):
+    """OpenAI-compatible chat completions endpoint; `url` is the API base (ends in /v1)."""
+
+    def __init__(self, first_token_delay=0.2, token_delay=0.005, reply=STUB_REPLY):
+        super().__init__(_OpenAIHandler)
+        self.first_token_delay = first_token_delay
+        self.token_delay = token_delay
+        self.reply = reply
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._failures = []
+
+    def fail_next(self, count=1, status=429, retry_after=None):
+        """Answers the next `count` requests with `status`, optionally with a Retry-After header."""
+        with self._lock:
+            self._failures.extend([(status, retry_after)] * count)
+
+    def take_failure(self):
+        with self._lock:
+            return self._failures.pop(0) if self._failures else None
+
+    def enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def leave(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    @property
+    def url(self):
+        return f"{self.base_url}/v1"
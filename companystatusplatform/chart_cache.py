@@ -0,0 +1,111 @@
+# chart_cache.py
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from config import CHART_CACHE_SIZE
+from rollup import get_cube
+from tracing import span
+
+# Figures are cached as Plotly JSON keyed by (dataset version, chart spec). The dataset
+# version is the content hash of the uploaded data, so a new upload never hits a stale
+# figure; the page loads Plotly JS once from /static instead of embedding it per view.
+# Plotly is imported on the first render (see warm_up) rather than when the app boots.
+
+PLOTLY_JS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'js', 'plotly.min.js')
+
+SALES_CHART_SPEC = {
+    'kind': 'bar',
+    'x': 'Product',
+    'y': 'Sales',
+    'color': 'Market',
+    'barmode': 'group',
+    'title': 'Sales Performance by Product and Market',
+}
+
+_figures = OrderedDict()
+_lock = threading.Lock()
+stats = {'hits': 0, 'misses': 0}
+
+
+def get_stats():
+    """Copy of the hit/miss counters plus the hit ratio for this worker."""
+    with _lock:
+        snapshot = dict(stats)
+    lookups = snapshot['hits'] + snapshot['misses']
+    snapshot['hit_ratio'] = round(snapshot['hits'] / lookups, 4) if lookups else 0.0
+    return snapshot
+
+
+def ensure_plotly_js():
+    """Writes the bundled plotly.js into static/js once, so templates can load it by URL."""
+    if os.path.exists(PLOTLY_JS_PATH):
+        return PLOTLY_JS_PATH
+    from plotly.offline import get_plotlyjs
+    os.makedirs(os.path.dirname(PLOTLY_JS_PATH), exist_ok=True)
+    tmp_path = f"{PLOTLY_JS_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(get_plotlyjs())
+    os.replace(tmp_path, PLOTLY_JS_PATH)
+    return PLOTLY_JS_PATH
+
+
+def _spec_key(spec):
+    return json.dumps(spec, sort_keys=True)
+
+
+def cached_figure_json(dataset_version, spec, build):
+    """
+    Returns the figure JSON for `spec` on `dataset_version`, calling `build()` (which must
+    return a Plotly figure) only on a cache miss.
+    """
+    key = (dataset_version, _spec_key(spec))
+    with _lock:
+        if key in _figures:
+            _figures.move_to_end(key)
+            stats['hits'] += 1
+            return _figures[key]
+        stats['misses'] += 1
+    import plotly.io as pio
+    # Escape '</' so the JSON can be embedded safely inside a <script> tag
+    with span('chart.render'):
+        figure_json = pio.to_json(build(), validate=False).replace('</', '<\\/')
+    with _lock:
+        _figures[key] = figure_json
+        _figures.move_to_end(key)
+        while len(_figures) > CHART_CACHE_SIZE:
+            _figures.popitem(last=False)
+    return figure_json
+
+
+def invalidate(dataset_version):
+    """Drops every cached figure for `dataset_version`."""
+    with _lock:
+        for key in [k for k in _figures if k[0] == dataset_version]:
+            del _figures[key]
+
+
+def sales_chart_json(df, dataset_version):
+    """Figure JSON for the dashboard's Sales by Product and Market bar chart."""
+    spec = SALES_CHART_SPEC
+
+    def build():
+        import plotly.express as px
+        agg_data = get_cube(df, dataset_version).frame([spec['x'], spec['color']])
+        return px.bar(agg_data, x=spec['x'], y=spec['y'], color=spec['color'], barmode=spec['barmode'],
+                      title=spec['title'])
+
+    return cached_figure_json(dataset_version, spec, build)
+
+
+def warm_up():
+    """
+    Imports plotly and renders a throwaway figure, which loads the default template and the
+    figure validators, so the first dashboard view does not pay for them.
+    """
+    import pandas as pd
+    import plotly.express as px
+    import plotly.io as pio
+    sample = pd.DataFrame({'Product': ['A', 'B'], 'Market': ['North', 'South'], 'Sales': [1.0, 2.0]})
+    pio.to_json(px.bar(sample, x='Product', y='Sales', color='Market', barmode='group'), validate=False)
@@ -6,4 +6,135 @@ from dotenv import load_dotenv
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "YOUR_API_KEY_HERE")
 
+# Flask session signing key (sessions carry the per-user dataset ID)
+SECRET_KEY = os.getenv("SECRET_KEY", "supersecretkey")
 
+# Local working directory shared by all workers on this host
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data"))
+
+# Per-session dataset store: in-memory LRU budget, on-disk spill location, and how long
+# (days) a spilled dataset nobody has opened is kept before it is deleted
+DATASET_SPILL_DIR = os.getenv("DATASET_SPILL_DIR", os.path.join(DATA_DIR, "datasets"))
+DATASET_MEMORY_BUDGET_MB = int(os.getenv("DATASET_MEMORY_BUDGET_MB", "512"))
+DATASET_MAX_AGE_DAYS = float(os.getenv("DATASET_MAX_AGE_DAYS", "7"))
+
+# Parsed uploads cached as Parquet, keyed by a hash of the uploaded bytes, and the size
+# budget of that cache (least recently used files are deleted beyond it)
+INGEST_CACHE_DIR = os.getenv("INGEST_CACHE_DIR", os.path.join(DATA_DIR, "ingest"))
+INGEST_CACHE_MAX_MB = int(os.getenv("INGEST_CACHE_MAX_MB", "1024"))
+
+# Number of rendered dashboard figures kept per worker
+CHART_CACHE_SIZE = int(os.getenv("CHART_CACHE_SIZE", "128"))
+
+# Number of per-dataset rollup cubes kept per worker
+ROLLUP_CACHE_SIZE = int(os.getenv("ROLLUP_CACHE_SIZE", "32"))
+
+# Price elasticity used by the what-if engine for markets without an explicit value
+SIMULATION_DEFAULT_ELASTICITY = float(os.getenv("SIMULATION_DEFAULT_ELASTICITY", "-0.5"))
+
+# Batch / Monte Carlo sweeps: scenarios per chunk, pool threshold and size, hard cap
+BATCH_CHUNK_SIZE = int(os.getenv("BATCH_CHUNK_SIZE", "128"))
+BATCH_POOL_THRESHOLD = int(os.getenv("BATCH_POOL_THRESHOLD", "2000"))
+BATCH_POOL_WORKERS = int(os.getenv("BATCH_POOL_WORKERS", str(os.cpu_count() or 2)))
+BATCH_MAX_SCENARIOS = int(os.getenv("BATCH_MAX_SCENARIOS", "100000"))
+
+# Scraping: shared connection pool size, per-host concurrency, timeout (s), listing page cap
+SCRAPE_MAX_CONNECTIONS = int(os.getenv("SCRAPE_MAX_CONNECTIONS", "100"))
+SCRAPE_PER_HOST_LIMIT = int(os.getenv("SCRAPE_PER_HOST_LIMIT", "8"))
+SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", "10"))
+SCRAPE_MAX_PAGES = int(os.getenv("SCRAPE_MAX_PAGES", "50"))
+
+# On-disk scrape response cache and how long (s) entries are used without revalidation
+SCRAPE_CACHE_DIR = os.getenv("SCRAPE_CACHE_DIR", os.path.join(DATA_DIR, "scrape_cache"))
+SCRAPE_CACHE_TTL = int(os.getenv("SCRAPE_CACHE_TTL", "3600"))
+
+# HTML extraction backend for scrapers: 'auto' (lxml if installed), 'lxml' or 'bs4'
+HTML_PARSER = os.getenv("HTML_PARSER", "auto")
+
+# scrape_everything: default per-source deadline (s) and number of sources fetched at once
+SCRAPE_SOURCE_DEADLINE = float(os.getenv("SCRAPE_SOURCE_DEADLINE", "5"))
+SCRAPE_SOURCE_WORKERS = int(os.getenv("SCRAPE_SOURCE_WORKERS", "8"))
+
+# Background jobs: SQLite job table, worker threads per process, staged uploads, how long
+# (s) a 'running' job may go without progress before another worker restarts it, and how
+# long (days) finished jobs stay in the table
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(DATA_DIR, "jobs.sqlite3"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", os.path.join(DATA_DIR, "uploads"))
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "600"))
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+
+# LLM response cache: SQLite file, entry lifetime (s) and size budget for stored responses
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(DATA_DIR, "llm_cache.sqlite3"))
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+LLM_CACHE_MAX_MB = int(os.getenv("LLM_CACHE_MAX_MB", "64"))
+
+# Chroma store (written at run time, so it lives under DATA_DIR rather than the checked-in
+# chroma_db/), hashed embedding size, and the cosine similarity above which a differently
+# worded scenario counts as a near duplicate. A Chroma PersistentClient is not safe to share
+# between processes: with several gunicorn workers, give each its own CHROMA_DB_PATH or run
+# a single worker
+CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", os.path.join(DATA_DIR, "chroma_db"))
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "512"))
+LLM_SEMANTIC_THRESHOLD = float(os.getenv("LLM_SEMANTIC_THRESHOLD", "0.9"))
+
+# Chat model for insights and simulation narratives, and an optional OpenAI-compatible API
+# base URL (e.g. a proxy, or benchmarks/stub_servers.py)
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "")
+
+# Prompt size control: token budget for the data context of a prompt, the share of it the
+# dataset profile may use, scraped-text chunk size (tokens) and cached profiles per worker
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+PROMPT_PROFILE_SHARE = float(os.getenv("PROMPT_PROFILE_SHARE", "0.4"))
+PROMPT_CHUNK_TOKENS = int(os.getenv("PROMPT_CHUNK_TOKENS", "200"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "32"))
+
+# Retrieval over indexed scrapes: chunks fetched per insight question
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+
+# Report exports: cache directory, rows converted per chunk, and cached files kept
+REPORT_CACHE_DIR = os.getenv("REPORT_CACHE_DIR", os.path.join(DATA_DIR, "reports"))
+REPORT_CHUNK_ROWS = int(os.getenv("REPORT_CHUNK_ROWS", "10000"))
+REPORT_CACHE_MAX_FILES = int(os.getenv("REPORT_CACHE_MAX_FILES", "32"))
+
+# Data view paging: row indexes kept per worker and cached (filter, sort) selections per index
+ROW_INDEX_CACHE_SIZE = int(os.getenv("ROW_INDEX_CACHE_SIZE", "8"))
+ROW_SELECTION_CACHE_SIZE = int(os.getenv("ROW_SELECTION_CACHE_SIZE", "64"))
+
+# Browser caching: max-age (seconds) for fingerprinted static URLs and for the sample workbook
+ASSET_MAX_AGE = int(os.getenv("ASSET_MAX_AGE", str(365 * 24 * 3600)))
+SAMPLE_MAX_AGE = int(os.getenv("SAMPLE_MAX_AGE", "3600"))
+
+# Append uploads: dataset versions kept per upload chain (older ones are deleted)
+DATASET_MAX_VERSIONS = int(os.getenv("DATASET_MAX_VERSIONS", "5"))
+
+# Portfolio mode: companies per manifest, and how many scrape / LLM stages of concurrent
+# pipelines may run at once in a worker
+PORTFOLIO_MAX_COMPANIES = int(os.getenv("PORTFOLIO_MAX_COMPANIES", "100"))
+PIPELINE_SCRAPE_CONCURRENCY = int(os.getenv("PIPELINE_SCRAPE_CONCURRENCY", "2"))
+PIPELINE_LLM_CONCURRENCY = int(os.getenv("PIPELINE_LLM_CONCURRENCY", "2"))
+
+# Tracing: request breakdowns kept for /debug/traces, and ?profile=1 per-request cProfile
+# output (off by default; enable only where the profile may be shown to the caller)
+TRACE_HISTORY = int(os.getenv("TRACE_HISTORY", "100"))
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0").lower() in ("1", "true", "yes")
+
+# Startup: warm plotly, the sample workbook and the LLM client on a background thread after
+# boot (off: run them inline at import), and the LLM client's connection pool and timeout
+STARTUP_WARM_UP = os.getenv("STARTUP_WARM_UP", "1").lower() in ("1", "true", "yes")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "60"))
+
+# LLM dispatcher: concurrent API calls per worker, request and token budgets per minute
+# (0 = unlimited) with the completion size assumed before the usage is reported, retries
+# with exponential backoff (seconds) and scenario narrations combined into one call
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", "500"))
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", "200000"))
+LLM_COMPLETION_TOKENS = int(os.getenv("LLM_COMPLETION_TOKENS", "512"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "20"))
+LLM_BATCH_MAX = int(os.getenv("LLM_BATCH_MAX", "5"))
+SIMULATION_MAX_NARRATED = int(os.getenv("SIMULATION_MAX_NARRATED", "20"))
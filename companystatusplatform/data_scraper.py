@@ -1,47 +1,120 @@
-import requests
-from bs4 import BeautifulSoup
 import time
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from http_cache import cached_call
+from document_index import index_documents
+from config import SCRAPE_SOURCE_DEADLINE, SCRAPE_SOURCE_WORKERS
+from tracing import span
 
 # In a real scenario, this module would contain robust logic 
 # for accessing SEC APIs (like sec-api.io) or using Selenium/BeautifulSoup 
 # to parse public websites for market data and customer reviews.
 
+# Sources are registered in SOURCES and run concurrently on a shared thread pool, so the
+# scrape takes about as long as the slowest source rather than the sum of all of them.
+# A source that misses its deadline is reported as unavailable and the rest are kept;
+# its call keeps running in the pool and still fills the cache for the next upload.
+# Everything fetched is also added to the retrieval index (document_index.py).
+
+SOURCES = []
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def register_source(name, title, url_for, fetch=None, deadline=None):
+    """
+    Adds a data source to scrape_everything. `url_for(company_name, company_ticker)` builds
+    the source URL, `fetch(url)` returns its text (defaults to the simulated request) and
+    `deadline` overrides SCRAPE_SOURCE_DEADLINE (seconds) for this source.
+    """
+    SOURCES[:] = [s for s in SOURCES if s['name'] != name]
+    SOURCES.append({'name': name, 'title': title, 'url_for': url_for,
+                    'fetch': fetch or _simulate_web_request,
+                    'deadline': SCRAPE_SOURCE_DEADLINE if deadline is None else deadline})
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=SCRAPE_SOURCE_WORKERS, thread_name_prefix='scrape-source')
+        return _executor
+
+
 def _simulate_web_request(url):
     """Simulates fetching data from a URL."""
     print(f"Simulating request to: {url}")
     time.sleep(random.uniform(0.5, 2.0)) # Simulate network delay
     return "Sample data block from simulated scrape."
 
+
+# Simulated URLs for data acquisition
+register_source('sec_filings', 'Financial Filings (SEC EDGAR)',
+                lambda name, ticker: f"https://www.sec.gov/cgi-bin/browse-edgar?CIK={ticker}&action=getcompany")
+register_source('market_news', 'Market News & Trends',
+                lambda name, ticker: f"https://www.google.com/search?q={name}+market+news")
+register_source('customer_reviews', 'Customer Reviews & Sentiment',
+                lambda name, ticker: f"https://www.yelp.com/search?find_desc={name}")
+
+
+def _run_source(source, url):
+    # Results are cached per URL, see http_cache.cached_call
+    def fetch():
+        with span('scrape.source', source=source['name']):
+            return source['fetch'](url)
+    return cached_call(url, 'text', fetch)
+
+
+def gather_sources(company_name, company_ticker, sources=None):
+    """
+    Runs all sources concurrently. Returns {name: (title, url, text, status)} in registration
+    order, where status is 'ok', 'timeout' or 'error'.
+    """
+    sources = SOURCES if sources is None else sources
+    executor = _get_executor()
+    started = time.monotonic()
+    urls = [source['url_for'](company_name, company_ticker) for source in sources]
+    futures = [executor.submit(_run_source, source, url) for source, url in zip(sources, urls)]
+
+    results = {}
+    for source, url, future in zip(sources, urls, futures):
+        remaining = source['deadline'] - (time.monotonic() - started)
+        try:
+            results[source['name']] = (source['title'], url, future.result(timeout=max(0.0, remaining)), 'ok')
+        except FutureTimeout:
+            results[source['name']] = (source['title'], url, f"(unavailable: no response within {source['deadline']:g}s)", 'timeout')
+        except Exception as e:
+            results[source['name']] = (source['title'], url, f"(unavailable: {e})", 'error')
+    return results
+
+
 def scrape_everything(company_name, company_ticker):
     """
     Coordinates all data acquisition efforts. This is the function `app.py` imports.
     Returns a single string containing all gathered information.
     """
     print(f"Starting data scrape for {company_name} ({company_ticker})...")
+    with span('scrape.gather'):
+        results = gather_sources(company_name, company_ticker).values()
 
-    # Simulated URLs for data acquisition
-    sec_url = f"https://www.sec.gov/cgi-bin/browse-edgar?CIK={company_ticker}&action=getcompany"
-    market_news_url = f"https://www.google.com/search?q={company_name}+market+news"
-    customer_review_url = f"https://www.yelp.com/search?find_desc={company_name}"
+    try:
+        with span('scrape.index'):
+            index_documents(company_name, company_ticker,
+                            [{'source': title, 'url': url, 'text': text}
+                             for title, url, text, status in results if status == 'ok'])
+    except Exception as e:
+        print(f"Indexing scraped documents failed: {e}")
 
-    # Simulated data fetching
-    filings = _simulate_web_request(sec_url)
-    news = _simulate_web_request(market_news_url)
-    reviews = _simulate_web_request(customer_review_url)
+    sections = "".join(f"""
+    **{title}:** 
+    {text}
+""" for title, _, text, _ in results)
 
     combined_summary = f"""
     --- Scraped Data Summary for {company_name} ---
-
-    **Financial Filings (SEC EDGAR):** 
-    {filings}
-
-    **Market News & Trends:**
-    {news}
-
-    **Customer Reviews & Sentiment:**
-    {reviews}
-    
+{sections}    
     --- End of Scraped Data ---
     """
     
@@ -0,0 +1,269 @@
+# dataset_store.py
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from config import DATASET_SPILL_DIR, DATASET_MEMORY_BUDGET_MB, DATASET_MAX_AGE_DAYS
+
+# Datasets are keyed by an upload ID that lives in the Flask session. Each upload gets
+# a fresh ID, so a stored frame never changes after it is written; that is what lets
+# several gunicorn workers share the on-disk spill without coordinating. The JSON state
+# next to a frame does change; its read-merge-write is serialized across workers with a
+# lock on a sidecar file, so updates from two workers to different fields both land.
+#
+# Spilled datasets that nobody has opened for DATASET_MAX_AGE_DAYS are deleted when a new
+# one is stored; opening a dataset refreshes its modification time (at most hourly).
+
+_TOUCH_INTERVAL = 3600
+
+
+def new_dataset_id():
+    """Returns a fresh, URL-safe dataset ID for a new upload."""
+    return uuid.uuid4().hex
+
+
+def compact_frame(df: pd.DataFrame):
+    """Converts text columns with repeated values to categoricals and downcasts integers."""
+    columns = {}
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            pass
+        elif pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series):
+            n_unique = series.nunique(dropna=True)
+            if 0 < n_unique <= max(1, len(series) // 2):
+                series = series.astype('category')
+        elif pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            series = pd.to_numeric(series, downcast='integer')
+        columns[col] = series
+    return pd.DataFrame(columns)
+
+
+def concat_frames(frames):
+    """
+    Concatenates frames with the same columns. A column that is categorical in any frame
+    stays categorical, with the union of the categories, instead of decaying to object.
+    """
+    frames = [f.copy() for f in frames]
+    for col in frames[0].columns:
+        if not any(isinstance(f[col].dtype, pd.CategoricalDtype) for f in frames):
+            continue
+        parts = [f[col].astype('category') for f in frames]
+        categories = parts[0].cat.categories
+        for part in parts[1:]:
+            categories = categories.union(part.cat.categories)
+        for f, part in zip(frames, parts):
+            f[col] = part.cat.set_categories(categories)
+    return pd.concat(frames, ignore_index=True)
+
+
+def _frame_nbytes(df: pd.DataFrame):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def atomic_write(path, write):
+    """Writes through a temp file and renames it, so readers in other workers never see half a file."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def file_lock(path):
+    """Holds an exclusive lock on `path` (created if missing) against other threads and processes."""
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+            yield
+            return
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _try_link(source_path, path):
+    """Hard-links `source_path` to `path`; returns False when linking is not possible."""
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.link(source_path, tmp_path)
+        os.replace(tmp_path, path)
+        return True
+    except OSError:
+        return False
+
+
+class DatasetStore:
+    """
+    Holds uploaded DataFrames per dataset ID.
+
+    Frames are kept in memory in an LRU bounded by `memory_budget_bytes` and are always
+    spilled to `spill_dir`, so an evicted frame (or one uploaded through another worker)
+    is reloaded from disk on demand. Small per-session state (insights, simulation text,
+    scrape results) is stored as JSON next to the frame and read through on every access.
+    Datasets not opened for `max_age_seconds` are removed from the spill by `prune`.
+    """
+
+    def __init__(self, spill_dir=DATASET_SPILL_DIR, memory_budget_bytes=DATASET_MEMORY_BUDGET_MB * 1024 * 1024,
+                 max_age_seconds=DATASET_MAX_AGE_DAYS * 24 * 3600):
+        self.spill_dir = spill_dir
+        self.memory_budget_bytes = memory_budget_bytes
+        self.max_age_seconds = max_age_seconds
+        self._frames = OrderedDict()
+        self._sizes = {}
+        self._touched = {}  # dataset ID -> when its spill file was last marked as used
+        self._lock = threading.RLock()
+        os.makedirs(self.spill_dir, exist_ok=True)
+
+    # --- Paths ---
+
+    def _frame_path(self, dataset_id):
+        return os.path.join(self.spill_dir, f"{dataset_id}.parquet")
+
+    def _state_path(self, dataset_id):
+        return os.path.join(self.spill_dir, f"{dataset_id}.json")
+
+    def _lock_path(self, dataset_id):
+        return os.path.join(self.spill_dir, f"{dataset_id}.lock")
+
+    # --- Frames ---
+
+    def put(self, dataset_id, df: pd.DataFrame, source_path=None):
+        """
+        Stores a compacted copy of `df` under `dataset_id` and returns it.
+
+        If `source_path` is a Parquet file already holding exactly this frame (e.g. the
+        ingestion cache), it is hard-linked into the spill instead of being rewritten.
+        """
+        df = compact_frame(df)
+        path = self._frame_path(dataset_id)
+        if not (source_path and _try_link(source_path, path)):
+            atomic_write(path, lambda tmp_path: df.to_parquet(tmp_path, index=False))
+        else:
+            os.utime(path)  # the link carries the cached file's age
+        self._remember(dataset_id, df)
+        self.prune()
+        return df
+
+    def get(self, dataset_id):
+        """Returns the frame for `dataset_id`, loading it from the spill if needed, or None."""
+        if not dataset_id:
+            return None
+        with self._lock:
+            if dataset_id in self._frames:
+                self._frames.move_to_end(dataset_id)
+                self._touch(dataset_id)
+                return self._frames[dataset_id]
+        path = self._frame_path(dataset_id)
+        if not os.path.exists(path):
+            return None
+        df = pd.read_parquet(path, memory_map=True)
+        self._remember(dataset_id, df)
+        self._touch(dataset_id)
+        return df
+
+    def _touch(self, dataset_id):
+        """Marks the spilled frame as used, so `prune` keeps it."""
+        now = time.time()
+        with self._lock:
+            if now - self._touched.get(dataset_id, 0) < _TOUCH_INTERVAL:
+                return
+            self._touched[dataset_id] = now
+        try:
+            os.utime(self._frame_path(dataset_id))
+        except FileNotFoundError:
+            pass
+
+    def prune(self):
+        """Drops datasets whose frame and state were last used more than `max_age_seconds` ago."""
+        if not self.max_age_seconds or self.max_age_seconds <= 0:
+            return 0
+        cutoff = time.time() - self.max_age_seconds
+        last_used = {}
+        for entry in os.scandir(self.spill_dir):
+            dataset_id, extension = os.path.splitext(entry.name)
+            if extension not in ('.parquet', '.json', '.lock'):
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+            except FileNotFoundError:
+                continue
+            last_used[dataset_id] = max(last_used.get(dataset_id, 0), mtime)
+        stale = [dataset_id for dataset_id, mtime in last_used.items() if mtime < cutoff]
+        for dataset_id in stale:
+            self.drop(dataset_id)
+        return len(stale)
+
+    def _remember(self, dataset_id, df):
+        with self._lock:
+            self._frames[dataset_id] = df
+            self._frames.move_to_end(dataset_id)
+            self._sizes[dataset_id] = _frame_nbytes(df)
+            # Always keep the most recent frame, even if it alone exceeds the budget
+            while len(self._frames) > 1 and sum(self._sizes.values()) > self.memory_budget_bytes:
+                evicted_id, _ = self._frames.popitem(last=False)
+                self._sizes.pop(evicted_id, None)
+
+    def drop(self, dataset_id):
+        """Removes a dataset and its state from memory and disk."""
+        with self._lock:
+            self._frames.pop(dataset_id, None)
+            self._sizes.pop(dataset_id, None)
+            self._touched.pop(dataset_id, None)
+        for path in (self._frame_path(dataset_id), self._state_path(dataset_id), self._lock_path(dataset_id)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    # --- Per-session state ---
+
+    def get_state(self, dataset_id):
+        """Returns the JSON state dict stored for `dataset_id` (empty if none)."""
+        if not dataset_id:
+            return {}
+        try:
+            with open(self._state_path(dataset_id), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def update_state(self, dataset_id, **fields):
+        """
+        Merges `fields` into the stored state for `dataset_id` and returns the new state. The
+        merge holds the dataset's lock file, so concurrent updates from other workers are not lost.
+        """
+        with self._lock, file_lock(self._lock_path(dataset_id)):
+            state = self.get_state(dataset_id)
+            state.update(fields)
+
+            def write(tmp_path):
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(state, f, default=str)
+
+            atomic_write(self._state_path(dataset_id), write)
+        return state
+
+    def memory_usage(self):
+        """Returns (number of frames in memory, bytes used by them)."""
+        with self._lock:
+            return len(self._frames), sum(self._sizes.values())
+
+
+# Shared store for this worker process
+store = DatasetStore()
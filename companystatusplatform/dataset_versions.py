@@ -0,0 +1,106 @@
+# dataset_versions.py
+import hashlib
+import time
+
+import pandas as pd
+
+from config import DATASET_MAX_VERSIONS
+from dataset_store import store, concat_frames
+from prompt_builder import get_profile, extend_profile
+from rollup import get_cube, put_cube, cube_diff
+
+# Append uploads. A delta file is validated against the stored dataset's schema and the
+# combined rows are stored under a new dataset ID, so stored frames stay immutable (see
+# dataset_store). The new version's rollup cube and prompt profile are derived from the
+# previous version's plus the delta rows only; charts are drawn from that cube.
+#
+# Each version's state carries the lineage as `versions`: a list of
+# {'version', 'dataset_id', 'content_hash', 'rows', 'added_rows', 'filename', 'created_at'}
+# entries, oldest first, with at most DATASET_MAX_VERSIONS kept on disk.
+
+
+def version_entry(number, dataset_id, content_hash, rows, added_rows, filename):
+    return {'version': number, 'dataset_id': dataset_id, 'content_hash': content_hash, 'rows': rows,
+            'added_rows': added_rows, 'filename': filename, 'created_at': time.time()}
+
+
+def versions_of(dataset_id, state=None):
+    """The version list of `dataset_id`; datasets uploaded before versioning count as version 1."""
+    state = store.get_state(dataset_id) if state is None else state
+    if state.get('versions'):
+        return state['versions']
+    df = store.get(dataset_id)
+    rows = 0 if df is None else len(df)
+    return [version_entry(1, dataset_id, state.get('content_hash', dataset_id), rows, rows, None)]
+
+
+def validate_delta(base: pd.DataFrame, delta: pd.DataFrame):
+    """
+    Returns `delta` with its columns in the stored order, or raises ValueError if its
+    columns differ from `base` or a numeric column of `base` holds non-numeric values.
+    """
+    missing = [str(c) for c in base.columns if c not in delta.columns]
+    extra = [str(c) for c in delta.columns if c not in base.columns]
+    if missing or extra:
+        problems = []
+        if missing:
+            problems.append(f"missing columns: {', '.join(missing)}")
+        if extra:
+            problems.append(f"unexpected columns: {', '.join(extra)}")
+        raise ValueError(f"The appended file does not match the stored data ({'; '.join(problems)}).")
+    delta = delta[list(base.columns)]
+    mismatched = [str(c) for c in base.columns
+                  if pd.api.types.is_numeric_dtype(base[c]) and len(delta) and delta[c].notna().any()
+                  and not pd.api.types.is_numeric_dtype(delta[c])]
+    if mismatched:
+        raise ValueError(f"Expected numeric values in: {', '.join(mismatched)}.")
+    return delta
+
+
+def version_hash(parent_version, delta_digest):
+    """Dataset version of `parent_version` with the delta file `delta_digest` appended."""
+    return hashlib.blake2b(f"{parent_version}+{delta_digest}".encode('utf-8'), digest_size=16).hexdigest()
+
+
+def append_version(parent_id, dataset_id, delta: pd.DataFrame, delta_digest, filename):
+    """
+    Stores the parent's rows plus `delta` as `dataset_id`, seeds its cube and profile from
+    the parent's, and records the new version. Versions beyond DATASET_MAX_VERSIONS are
+    dropped. Returns the combined frame.
+    """
+    parent = store.get(parent_id)
+    if parent is None:
+        raise ValueError("The dataset to append to is no longer available; please upload it again.")
+    parent_state = store.get_state(parent_id)
+    parent_version = parent_state.get('content_hash', parent_id)
+    delta = validate_delta(parent, delta)
+
+    combined = store.put(dataset_id, concat_frames([parent, delta]))
+    added = combined.iloc[len(parent):]
+    version = version_hash(parent_version, delta_digest)
+    cube = put_cube(version, get_cube(parent, parent_version).appended(added))
+    extend_profile(get_profile(parent, parent_version), added, cube, version)
+
+    versions = list(versions_of(parent_id, parent_state))
+    versions.append(version_entry(versions[-1]['version'] + 1, dataset_id, version, len(combined), len(added),
+                                  filename))
+    store.update_state(dataset_id, content_hash=version, versions=versions[-DATASET_MAX_VERSIONS:])
+    for old in versions[:-DATASET_MAX_VERSIONS]:
+        store.drop(old['dataset_id'])
+    return combined
+
+
+def diff_versions(versions, from_number, to_number, by=()):
+    """
+    Compares two versions from a version list: row counts plus per-segment changes of the
+    measures aggregated by `by` (see rollup.cube_diff). Raises KeyError for unknown versions.
+    """
+    entries = {entry['version']: entry for entry in versions}
+    for number in (from_number, to_number):
+        if number not in entries or store.get(entries[number]['dataset_id']) is None:
+            raise KeyError(f"Version {number} is not available")
+    old, new = entries[from_number], entries[to_number]
+    old_cube = get_cube(store.get(old['dataset_id']), old['content_hash'])
+    new_cube = get_cube(store.get(new['dataset_id']), new['content_hash'])
+    return {'from': old, 'to': new, 'rows_added': new['rows'] - old['rows'],
+            'changes': cube_diff(old_cube, new_cube, by)}
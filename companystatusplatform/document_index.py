@@ -0,0 +1,89 @@
+# document_index.py
+import hashlib
+import threading
+import time
+
+from config import RETRIEVAL_TOP_K
+from embeddings import embed, chroma_collection
+from prompt_builder import chunk_text
+
+# Retrieval index over scraped documents in the CHROMA_DB_PATH store. Each document is
+# split into chunks (prompt_builder.chunk_text); a chunk's ID is a hash of the company, its
+# CIK and its text, so re-scraping the same pages only embeds chunks that are actually new.
+# Insight prompts then pull the top-k chunks per question for the company instead of the
+# whole scrape, which keeps prompt size flat as the corpus grows. A company is its name
+# and CIK together (the sources are looked up by both), so two uploads under the same
+# name, e.g. the form's "Default Company", only share passages if their CIKs match too.
+#
+# Writes go through one lock per worker and use upsert, so two scrapes of the same company
+# indexing the same chunks at once do not collide. The store itself is a PersistentClient
+# and must not be shared between worker processes (see CHROMA_DB_PATH in config.py).
+#
+# Every function is a no-op (or returns nothing) when chromadb is not installed; callers
+# fall back to ranking the raw scraped text.
+
+COLLECTION = 'scraped_documents'
+
+_write_lock = threading.Lock()
+
+
+def _chunk_id(company, cik, text):
+    return hashlib.sha256(f"{company}\n{cik}\n{text}".encode('utf-8')).hexdigest()
+
+
+def _company_filter(company, cik):
+    return {'$and': [{'company': company}, {'cik': cik}]}
+
+
+def available():
+    return chroma_collection(COLLECTION) is not None
+
+
+def index_documents(company, cik, documents):
+    """
+    Adds the chunks of `documents` ({'source', 'url', 'text'} dicts) for `company` with
+    `cik` that are not indexed yet. Returns (new chunks, chunks already indexed).
+    """
+    collection = chroma_collection(COLLECTION)
+    if collection is None:
+        return 0, 0
+    cik = str(cik or '')
+    chunks = {}
+    for document in documents:
+        for text in chunk_text(document.get('text', '')):
+            chunks.setdefault(_chunk_id(company, cik, text), (text, document))
+    if not chunks:
+        return 0, 0
+    with _write_lock:
+        existing = set(collection.get(ids=list(chunks), include=[])['ids'])
+        new_ids = [chunk_id for chunk_id in chunks if chunk_id not in existing]
+        if new_ids:
+            texts = [chunks[chunk_id][0] for chunk_id in new_ids]
+            now = time.time()
+            collection.upsert(ids=new_ids, embeddings=embed(texts), documents=texts,
+                              metadatas=[{'company': company, 'cik': cik,
+                                          'source': chunks[chunk_id][1].get('source', ''),
+                                          'url': chunks[chunk_id][1].get('url', ''), 'indexed_at': now}
+                                         for chunk_id in new_ids])
+    return len(new_ids), len(existing)
+
+
+def retrieve(company, cik, questions, k=RETRIEVAL_TOP_K):
+    """
+    Returns [{'text', 'source', 'url', 'distance'}] with up to `k` chunks per question for
+    `company` with `cik`, de-duplicated and ordered by their best distance to any question.
+    """
+    collection = chroma_collection(COLLECTION)
+    if collection is None or not questions:
+        return []
+    found = collection.query(query_embeddings=embed(questions), n_results=k,
+                             where=_company_filter(company, str(cik or '')),
+                             include=['documents', 'metadatas', 'distances'])
+    best = {}
+    for ids, texts, metadatas, distances in zip(found['ids'], found['documents'], found['metadatas'],
+                                                found['distances']):
+        for chunk_id, text, metadata, distance in zip(ids, texts, metadatas, distances):
+            if chunk_id not in best or distance < best[chunk_id]['distance']:
+                best[chunk_id] = {'text': text, 'source': metadata.get('source', ''),
+                                  'url': metadata.get('url', ''), 'distance': distance}
+    return sorted(best.values(), key=lambda passage: passage['distance'])
@@ -0,0 +1,75 @@
+# embeddings.py
+import hashlib
+import importlib.util
+import re
+import threading
+
+import numpy as np
+
+from config import EMBEDDING_DIM, CHROMA_DB_PATH
+
+# chromadb is optional (features built on it switch themselves off) and slow to import, so
+# it is only looked up here and imported when the first collection is opened
+HAS_CHROMA = importlib.util.find_spec('chromadb') is not None
+
+# Deterministic, dependency-free text embeddings for lookups and retrieval in chroma_db.
+# Word unigrams/bigrams and character trigrams are hashed into EMBEDDING_DIM buckets with
+# a signed hash (feature hashing) and the vector is L2-normalized, so cosine similarity
+# tracks shared wording and numbers. No model download or API call is involved, and the
+# same text always maps to the same vector on every worker.
+
+_TOKEN = re.compile(r"[a-z]+|[-+]?\d+(?:\.\d+)?%?")
+
+_client = None
+_collections = {}
+_lock = threading.Lock()
+
+
+def _features(text):
+    text = (text or '').lower()
+    words = _TOKEN.findall(text)
+    yield from words
+    yield from (f"{a} {b}" for a, b in zip(words, words[1:]))
+    squashed = f" {' '.join(words)} "
+    yield from (squashed[i:i + 3] for i in range(len(squashed) - 2))
+
+
+def embed_text(text, dim=EMBEDDING_DIM):
+    """Returns the normalized hashed embedding of `text` as a float32 array of length `dim`."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in _features(text):
+        digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+        bucket = int.from_bytes(digest[:4], 'little') % dim
+        vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def embed(texts, dim=EMBEDDING_DIM):
+    """Embeds each text in `texts`; returns a list of plain float lists (the form chroma expects)."""
+    return [embed_text(text, dim).tolist() for text in texts]
+
+
+def warm_up():
+    """Imports chromadb ahead of the first cache lookup or retrieval."""
+    if HAS_CHROMA:
+        import chromadb  # noqa: F401
+
+
+def chroma_collection(name):
+    """
+    Returns the named collection in the CHROMA_DB_PATH store (cosine distance), or None
+    when chromadb is not installed. Embeddings are always passed in from this module, so
+    Chroma never loads an embedding model of its own.
+    """
+    global _client
+    if not HAS_CHROMA:
+        return None
+    with _lock:
+        if name not in _collections:
+            if _client is None:
+                import chromadb
+                _client = chromadb.PersistentClient(path=CHROMA_DB_PATH)
+            _collections[name] = _client.get_or_create_collection(name, embedding_function=None,
+                                                                  metadata={'hnsw:space': 'cosine'})
+        return _collections[name]
@@ -0,0 +1,125 @@
+# extractors.py
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from config import HTML_PARSER
+
+try:
+    import lxml.html
+    HAS_LXML = True
+except ImportError:  # lxml is optional; BeautifulSoup's html.parser is the fallback
+    HAS_LXML = False
+
+# Extraction backends for the scrapers. Each backend exposes the same two functions:
+#   listing(content) -> (rows [{'Name', 'Price'}], (next href or None, (page, pages) or None))
+#   product(content) -> (title, price)
+# 'lxml' parses with libxml2 and walks only the article.product_pod subtrees via XPath;
+# 'bs4' builds a BeautifulSoup tree restricted by a SoupStrainer to those subtrees; bs4 is
+# imported on its first use, so workers on the lxml backend never load it.
+
+_PAGE_OF = re.compile(r'Page\s+(\d+)\s+of\s+(\d+)', re.IGNORECASE)
+_HAS_CLASS = "contains(concat(' ', normalize-space(@class), ' '), ' {} ')"
+_PRODUCT_POD = f"//article[{_HAS_CLASS.format('product_pod')}]"
+_PRICE_COLOR = f"p[{_HAS_CLASS.format('price_color')}]"
+_NEXT_HREF = f"//li[{_HAS_CLASS.format('next')}]/a/@href"
+_CURRENT_PAGE = f"//li[{_HAS_CLASS.format('current')}]"
+
+
+def _position(text):
+    match = _PAGE_OF.search(text or '')
+    return tuple(int(g) for g in match.groups()) if match else None
+
+
+# --- lxml backend ---
+
+def _lxml_document(content):
+    if isinstance(content, bytes):
+        try:
+            content = content.decode('utf-8')
+        except UnicodeDecodeError:
+            content = content.decode('cp1252', errors='replace')
+    return lxml.html.document_fromstring(content)
+
+
+def _lxml_listing(content):
+    doc = _lxml_document(content)
+    rows = []
+    for pod in doc.xpath(_PRODUCT_POD):
+        titles = pod.xpath('./h3/a/@title')
+        prices = pod.xpath('.//' + _PRICE_COLOR)
+        rows.append({'Name': titles[0] if titles else 'N/A',
+                     'Price': prices[0].text_content().strip() if prices else 'N/A'})
+    next_href = doc.xpath(_NEXT_HREF)
+    current = doc.xpath(_CURRENT_PAGE)
+    return rows, (next_href[0] if next_href else None, _position(current[0].text_content() if current else ''))
+
+
+def _lxml_product(content):
+    doc = _lxml_document(content)
+    titles = doc.xpath('//h1')
+    prices = doc.xpath('//' + _PRICE_COLOR)
+    return (titles[0].text_content().strip() if titles else 'N/A',
+            prices[0].text_content().strip() if prices else 'N/A')
+
+
+# --- BeautifulSoup backend ---
+
+def _card_or_pager(classes):
+    # The strainer sees the raw class attribute, e.g. 'product_pod featured'
+    return classes is not None and not {'product_pod', 'pager'}.isdisjoint(classes.split())
+
+
+def _bs4_listing(content):
+    from bs4 import BeautifulSoup, SoupStrainer
+    # Only the product cards and the pager are turned into tree nodes
+    soup = BeautifulSoup(content, 'html.parser', parse_only=SoupStrainer(attrs={'class': _card_or_pager}))
+    rows = []
+    for item in soup.find_all('article', class_='product_pod'):
+        link = item.h3.a if item.h3 else None
+        price_element = item.find('p', class_='price_color')
+        rows.append({'Name': link['title'] if link and link.has_attr('title') else 'N/A',
+                     'Price': price_element.text.strip() if price_element else 'N/A'})
+    next_link = soup.select_one('li.next a[href]')
+    current = soup.select_one('li.current')
+    return rows, (next_link['href'] if next_link else None, _position(current.get_text(' ') if current else ''))
+
+
+def _bs4_product(content):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(content, 'html.parser')
+    title_element = soup.find('h1')
+    price_element = soup.find('p', class_='price_color')
+    return (title_element.text.strip() if title_element else 'N/A',
+            price_element.text.strip() if price_element else 'N/A')
+
+
+EXTRACTORS = {
+    'bs4': {'listing': _bs4_listing, 'product': _bs4_product},
+}
+if HAS_LXML:
+    EXTRACTORS['lxml'] = {'listing': _lxml_listing, 'product': _lxml_product}
+
+
+def get_extractor(name=None):
+    """Returns the backend named by `name` (or HTML_PARSER); 'auto' prefers lxml when installed."""
+    name = name or HTML_PARSER
+    if name == 'auto':
+        name = 'lxml' if HAS_LXML else 'bs4'
+    if name not in EXTRACTORS:
+        raise ValueError(f"HTML parser '{name}' is not available (choose from {', '.join(EXTRACTORS)})")
+    return EXTRACTORS[name]
+
+
+def prices_to_numbers(prices):
+    """Converts price strings such as '£51.77' to floats in one vectorized pass (None if unparseable)."""
+    digits = pc.replace_substring_regex(pa.array(prices, type=pa.string()), r'[^0-9.\-]', '')
+    digits = pc.if_else(pc.equal(digits, ''), pa.scalar(None, pa.string()), digits)
+    try:
+        return pc.cast(digits, pa.float64()).to_pylist()
+    except pa.ArrowInvalid:
+        # Something like '1.2.3' survived the cleanup; fall back to per-value coercion
+        values = pd.to_numeric(pd.Series(digits.to_pylist(), dtype='object'), errors='coerce')
+        return values.astype(object).where(values.notna(), None).tolist()
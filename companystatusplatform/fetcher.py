@@ -0,0 +1,88 @@
+# fetcher.py
+import asyncio
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+
+from config import SCRAPE_MAX_CONNECTIONS, SCRAPE_PER_HOST_LIMIT, SCRAPE_TIMEOUT
+from tracing import span
+
+# One connection-pooled httpx.AsyncClient per worker process, living on a background
+# event loop thread. Flask request threads hand coroutines to that loop and wait for the
+# result, so every scrape reuses the same keep-alive connections and per-host limits.
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+_loop = None
+_client = None
+_host_limits = {}
+_lock = threading.Lock()
+
+
+def _start_loop():
+    global _loop, _client
+    with _lock:
+        if _loop is not None:
+            return _loop
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name='fetcher-loop', daemon=True).start()
+
+        async def make_client():
+            return httpx.AsyncClient(
+                headers=HEADERS,
+                timeout=httpx.Timeout(SCRAPE_TIMEOUT),
+                limits=httpx.Limits(max_connections=SCRAPE_MAX_CONNECTIONS,
+                                    max_keepalive_connections=SCRAPE_MAX_CONNECTIONS),
+                follow_redirects=True,
+            )
+
+        _client = asyncio.run_coroutine_threadsafe(make_client(), loop).result()
+        _loop = loop
+        return _loop
+
+
+def run(coro):
+    """Runs `coro` on the shared fetcher loop and blocks the calling thread until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, _start_loop()).result()
+
+
+def get_client():
+    """The shared AsyncClient; only use it from coroutines passed to `run()`."""
+    _start_loop()
+    return _client
+
+
+def _host_limit(url):
+    host = urlsplit(url).netloc
+    if host not in _host_limits:
+        _host_limits[host] = asyncio.Semaphore(SCRAPE_PER_HOST_LIMIT)
+    return _host_limits[host]
+
+
+async def fetch(url, headers=None):
+    """
+    GETs `url` under its host's concurrency limit. Returns (response, None) on success
+    or (None, error message) on any transport or HTTP error status.
+    """
+    async with _host_limit(url):
+        try:
+            with span('scrape.fetch'):
+                response = await get_client().get(url, headers=headers)
+            if response.status_code == 304:
+                # Not Modified answers a conditional GET from http_cache
+                return response, None
+            response.raise_for_status()
+            return response, None
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            return None, str(e) or e.__class__.__name__
+
+
+async def fetch_many(urls):
+    """Fetches all `urls` concurrently; results are in the same order as `urls`."""
+    return await asyncio.gather(*(fetch(url) for url in urls))
+
+
+def fetch_all(urls):
+    """Blocking wrapper around `fetch_many` for request threads."""
+    return run(fetch_many(list(urls)))
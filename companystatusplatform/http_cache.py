@@ -0,0 +1,174 @@
+# http_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+
+from config import SCRAPE_CACHE_DIR, SCRAPE_CACHE_TTL
+from dataset_store import atomic_write
+
+# Persistent scrape cache, one entry per URL:
+#   <key>.body  raw response body
+#   <key>.json  {url, final_url, etag, last_modified, fetched_at, parsed: {kind: result}}
+# Fresh entries (younger than SCRAPE_CACHE_TTL) skip the network and the HTML parser.
+# Stale entries are revalidated with If-None-Match / If-Modified-Since; a 304 keeps the
+# stored body and parsed result. If revalidation fails, the stale result is served. A 304
+# for an entry whose body is gone (and that has no result for the requested kind) drops the
+# entry and fetches the page again in full.
+
+stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stale_served': 0}
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    with _stats_lock:
+        stats[name] += 1
+
+
+def get_stats():
+    """Copy of the hit/miss counters plus the hit ratio for this worker."""
+    with _stats_lock:
+        snapshot = dict(stats)
+    lookups = snapshot['hits'] + snapshot['misses'] + snapshot['revalidated']
+    snapshot['hit_ratio'] = round((snapshot['hits'] + snapshot['revalidated']) / lookups, 4) if lookups else 0.0
+    return snapshot
+
+
+def _key(url):
+    return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+
+def _meta_path(url):
+    return os.path.join(SCRAPE_CACHE_DIR, f"{_key(url)}.json")
+
+
+def _body_path(url):
+    return os.path.join(SCRAPE_CACHE_DIR, f"{_key(url)}.body")
+
+
+def load(url):
+    """Returns the cache entry for `url` or None."""
+    try:
+        with open(_meta_path(url), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _save_meta(url, entry):
+    os.makedirs(SCRAPE_CACHE_DIR, exist_ok=True)
+
+    def write(tmp_path):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f)
+
+    atomic_write(_meta_path(url), write)
+
+
+def _save_body(url, content):
+    os.makedirs(SCRAPE_CACHE_DIR, exist_ok=True)
+
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+
+    atomic_write(_body_path(url), write)
+
+
+def read_body(url):
+    with open(_body_path(url), 'rb') as f:
+        return f.read()
+
+
+def discard(url):
+    """Removes the cache entry for `url`."""
+    for path in (_meta_path(url), _body_path(url)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def is_fresh(entry, ttl=SCRAPE_CACHE_TTL):
+    return entry is not None and time.time() - entry.get('fetched_at', 0) < ttl
+
+
+def conditional_headers(entry):
+    """If-None-Match / If-Modified-Since headers for revalidating `entry`."""
+    headers = {}
+    if entry and entry.get('etag'):
+        headers['If-None-Match'] = entry['etag']
+    if entry and entry.get('last_modified'):
+        headers['If-Modified-Since'] = entry['last_modified']
+    return headers
+
+
+async def cached_get(url, kind, parse, fetch):
+    """
+    Returns (parsed result, final URL, error) for `url`, where `parse(content, final_url)`
+    produces a JSON-serializable result stored under `kind` and `fetch(url, headers)` is
+    the coroutine used for network access (see fetcher.fetch).
+    """
+    entry = load(url)
+    if is_fresh(entry) and kind in entry.get('parsed', {}):
+        _count('hits')
+        return entry['parsed'][kind], entry.get('final_url', url), None
+
+    response, error = await fetch(url, headers=conditional_headers(entry))
+    if error:
+        if entry and kind in entry.get('parsed', {}):
+            _count('stale_served')
+            return entry['parsed'][kind], entry.get('final_url', url), None
+        _count('misses')
+        return None, url, error
+
+    if response.status_code == 304 and entry:
+        body = None
+        if kind not in entry.get('parsed', {}):
+            try:
+                body = read_body(url)
+            except FileNotFoundError:
+                # The metadata alone cannot produce this kind: start over without validators
+                discard(url)
+                response, error = await fetch(url, headers={})
+                if error:
+                    _count('misses')
+                    return None, url, error
+        if response.status_code == 304 and (body is not None or kind in entry.get('parsed', {})):
+            _count('revalidated')
+            entry['fetched_at'] = time.time()
+            if body is not None:
+                entry.setdefault('parsed', {})[kind] = parse(body, entry.get('final_url', url))
+            _save_meta(url, entry)
+            return entry['parsed'][kind], entry.get('final_url', url), None
+
+    _count('misses')
+    final_url = str(response.url)
+    parsed = parse(response.content, final_url)
+    _save_body(url, response.content)
+    _save_meta(url, {
+        'url': url,
+        'final_url': final_url,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'fetched_at': time.time(),
+        'parsed': {kind: parsed},
+    })
+    return parsed, final_url, None
+
+
+def cached_call(url, kind, produce, ttl=SCRAPE_CACHE_TTL):
+    """
+    TTL-only caching for sources without HTTP validators (e.g. data_scrapper's simulated
+    requests): returns the stored result for (url, kind) or stores `produce()`.
+    """
+    entry = load(url)
+    if is_fresh(entry, ttl) and kind in entry.get('parsed', {}):
+        _count('hits')
+        return entry['parsed'][kind]
+    _count('misses')
+    result = produce()
+    _save_meta(url, {'url': url, 'final_url': url, 'etag': None, 'last_modified': None,
+                     'fetched_at': time.time(), 'parsed': {kind: result}})
+    return result
@@ -0,0 +1,106 @@
+# ingestion.py
+import hashlib
+import io
+import os
+
+import pandas as pd
+
+from config import INGEST_CACHE_DIR, INGEST_CACHE_MAX_MB
+from dataset_store import compact_frame, atomic_write
+from tracing import span
+
+# Columns of the company data schema (see create_sample_excel) and their compact dtypes
+CATEGORICAL_COLUMNS = ['Product', 'Market', 'Zone']
+INTEGER_COLUMNS = ['Year', 'Sales', 'Profit']
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.xls', '.csv', '.parquet')
+
+
+def is_supported_file(filename):
+    """True if `filename` has an extension the ingestion stage can parse."""
+    return bool(filename) and filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def content_hash(data: bytes):
+    """Returns a short hex digest identifying the uploaded bytes."""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def cached_path(digest):
+    return os.path.join(INGEST_CACHE_DIR, f"{digest}.parquet")
+
+
+def infer_compact_dtypes(df: pd.DataFrame):
+    """Applies the schema's compact dtypes, then compacts any remaining columns generically."""
+    df = df.copy()
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col in INTEGER_COLUMNS:
+        if col in df.columns and pd.api.types.is_numeric_dtype(df[col]):
+            values = df[col]
+            # Excel hands back floats for whole-number cells next to blanks; only downcast exact integers
+            if values.notna().all() and (values % 1 == 0).all():
+                df[col] = pd.to_numeric(values.astype('int64'), downcast='integer')
+    return compact_frame(df)
+
+
+def _parse(data: bytes, filename):
+    buffer = io.BytesIO(data)
+    name = filename.lower()
+    if name.endswith('.csv'):
+        return pd.read_csv(buffer)
+    if name.endswith('.parquet'):
+        return pd.read_parquet(buffer)
+    return pd.read_excel(buffer)
+
+
+def load_cached(digest):
+    """Memory-maps a previously ingested file from the Parquet cache, or returns None."""
+    path = cached_path(digest)
+    if not os.path.exists(path):
+        return None
+    os.utime(path)  # mark as recently used
+    return pd.read_parquet(path, memory_map=True)
+
+
+def _prune():
+    """Deletes the least recently used cached files beyond INGEST_CACHE_MAX_MB."""
+    try:
+        entries = [e for e in os.scandir(INGEST_CACHE_DIR) if e.is_file() and not e.name.endswith('.tmp')]
+    except FileNotFoundError:
+        return
+    stats = sorted(((e.path, e.stat()) for e in entries), key=lambda e: e[1].st_mtime, reverse=True)
+    budget, used = INGEST_CACHE_MAX_MB * 1024 * 1024, 0
+    for path, stat in stats:
+        used += stat.st_size
+        if used > budget:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def ingest_bytes(data: bytes, filename):
+    """
+    Parses an uploaded file once and caches the compact result as Parquet.
+
+    Returns (digest, DataFrame, parquet_path). Identical uploads (same bytes) are served
+    from the cache without re-parsing the workbook.
+    """
+    digest = content_hash(data)
+    df = load_cached(digest)
+    if df is None:
+        with span('ingest.parse'):
+            df = _parse(data, filename)
+        with span('ingest.compact'):
+            df = infer_compact_dtypes(df)
+        os.makedirs(INGEST_CACHE_DIR, exist_ok=True)
+        atomic_write(cached_path(digest), lambda tmp_path: df.to_parquet(tmp_path, index=False))
+        _prune()
+    return digest, df, cached_path(digest)
+
+
+def ingest_upload(file):
+    """Reads a Werkzeug `FileStorage` and passes it through `ingest_bytes`."""
+    return ingest_bytes(file.read(), file.filename)
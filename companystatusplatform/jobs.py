@@ -0,0 +1,233 @@
+# jobs.py
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from config import JOBS_DB_PATH, JOB_WORKERS, JOB_STALE_SECONDS, JOB_RETENTION_DAYS
+from tracing import span
+
+# Background pipelines (e.g. upload: parse -> scrape -> insight) run on a thread pool in
+# this worker process. Jobs and the status of each stage are kept in a SQLite table, so a
+# request served by any worker can report progress, and jobs left queued by a worker that
+# exited are picked up again by resume_pending().
+#
+# A pipeline is a list of (stage name, fn) pairs registered under a name. Each fn gets the
+# job's JSON payload and may return a dict of fields to merge into it for later stages.
+# A stage may be run again if its worker exits before the stage is marked done, so inputs
+# a stage needs (e.g. a staged upload) are released by the pipeline's `on_finish(payload)`,
+# which runs once the job is done, failed or cancelled.
+#
+# Finished jobs older than JOB_RETENTION_DAYS are deleted when jobs are submitted or resumed.
+
+PIPELINES = {}
+_ON_FINISH = {}
+
+# Job and stage statuses
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, SKIPPED = 'queued', 'running', 'done', 'failed', 'cancelled', 'skipped'
+FINISHED = (DONE, FAILED, CANCELLED)
+
+_executor = None
+_init_lock = threading.Lock()
+_initialized = False
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    pipeline TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    stages TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+def register_pipeline(name, stages, on_finish=None):
+    """
+    Registers `stages`, a list of (stage name, fn(payload) -> dict or None), under `name`;
+    `on_finish(payload)` is called once a job of the pipeline has ended, however it ended.
+    """
+    PIPELINES[name] = list(stages)
+    _ON_FINISH[name] = on_finish
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:  # commits on success, rolls back on error
+            yield conn
+    finally:
+        conn.close()
+
+
+def _init():
+    global _executor, _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        os.makedirs(os.path.dirname(JOBS_DB_PATH), exist_ok=True)
+        with _connect() as conn:
+            # WAL lets request threads read job status while a stage is writing
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+        _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job')
+        _initialized = True
+
+
+def _update(job_id, **fields):
+    fields['updated_at'] = time.time()
+    for key in ('stages', 'payload'):
+        if key in fields:
+            fields[key] = json.dumps(fields[key], default=str)
+    assignments = ', '.join(f"{key} = ?" for key in fields)
+    with _connect() as conn:
+        conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+
+def _load(job_id):
+    with _connect() as conn:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if row is None:
+        return None
+    job = dict(row)
+    job['stages'] = json.loads(job['stages'])
+    job['payload'] = json.loads(job['payload'])
+    return job
+
+
+def _finish(pipeline, payload):
+    on_finish = _ON_FINISH.get(pipeline)
+    if on_finish is None:
+        return
+    try:
+        on_finish(payload)
+    except Exception as e:
+        print(f"Cleanup of a finished '{pipeline}' job failed: {e}")
+
+
+def _prune(conn):
+    """Deletes finished jobs last updated more than JOB_RETENTION_DAYS ago."""
+    if JOB_RETENTION_DAYS > 0:
+        conn.execute(f"DELETE FROM jobs WHERE status IN ({', '.join('?' * len(FINISHED))}) AND updated_at < ?",
+                     (*FINISHED, time.time() - JOB_RETENTION_DAYS * 24 * 3600))
+
+
+def submit(pipeline, payload):
+    """Persists a new job for `pipeline` with a JSON-serializable `payload`, queues it and returns its ID."""
+    _init()
+    if pipeline not in PIPELINES:
+        raise KeyError(f"Unknown pipeline '{pipeline}'")
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    stages = {name: {'status': QUEUED} for name, _ in PIPELINES[pipeline]}
+    with _connect() as conn:
+        _prune(conn)
+        conn.execute("INSERT INTO jobs (id, pipeline, status, stage, stages, payload, error, created_at, updated_at) "
+                     "VALUES (?, ?, ?, NULL, ?, ?, NULL, ?, ?)",
+                     (job_id, pipeline, QUEUED, json.dumps(stages), json.dumps(payload, default=str), now, now))
+    _executor.submit(_run, job_id)
+    return job_id
+
+
+def get(job_id):
+    """Returns the job's status, current stage and per-stage status (without its payload), or None."""
+    _init()
+    job = _load(job_id)
+    if job is None:
+        return None
+    job.pop('payload')
+    return job
+
+
+def cancel(job_id):
+    """Marks a job as cancelled; the stage in progress finishes, later stages are skipped."""
+    _init()
+    with _connect() as conn:
+        never_started = conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                                     (CANCELLED, time.time(), job_id, QUEUED)).rowcount == 1
+        conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                     (CANCELLED, time.time(), job_id, RUNNING))
+    if never_started:
+        # No worker will pick it up, so its inputs are released here
+        job = _load(job_id)
+        _finish(job['pipeline'], job['payload'])
+
+
+def _claim(job_id):
+    # Only one worker thread (in any process) moves a job out of 'queued'
+    with _connect() as conn:
+        cursor = conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE id = ? AND status = ?",
+                              (RUNNING, time.time(), job_id, QUEUED))
+        return cursor.rowcount == 1
+
+
+def _skip_remaining(stages):
+    for stage in stages.values():
+        if stage['status'] == QUEUED:
+            stage['status'] = SKIPPED
+    return stages
+
+
+def _run(job_id):
+    if not _claim(job_id):
+        return
+    job = _load(job_id)
+    try:
+        _run_stages(job_id, job)
+    finally:
+        if _load(job_id)['status'] in FINISHED:
+            _finish(job['pipeline'], job['payload'])
+
+
+def _run_stages(job_id, job):
+    stages, payload = job['stages'], job['payload']
+    for name, fn in PIPELINES.get(job['pipeline'], []):
+        if stages[name]['status'] == DONE:
+            continue
+        if _load(job_id)['status'] == CANCELLED:
+            _update(job_id, stages=_skip_remaining(stages))
+            return
+        stages[name] = {'status': RUNNING, 'started_at': time.time()}
+        _update(job_id, stage=name, stages=stages)
+        try:
+            with span('job.stage', pipeline=job['pipeline'], stage=name):
+                payload.update(fn(payload) or {})
+        except Exception as e:
+            stages[name].update(status=FAILED, finished_at=time.time(), error=str(e))
+            _update(job_id, status=FAILED, stages=_skip_remaining(stages), error=f"{name}: {e}")
+            return
+        stages[name].update(status=DONE, finished_at=time.time())
+        _update(job_id, stages=stages, payload=payload)
+    if _load(job_id)['status'] == RUNNING:
+        _update(job_id, status=DONE, stage=None, stages=stages)
+
+
+def resume_pending():
+    """
+    Queues jobs left behind by a worker that exited: 'queued' jobs, and 'running' jobs not
+    updated for JOB_STALE_SECONDS (they restart at their first unfinished stage).
+    """
+    if multiprocessing.parent_process() is not None:
+        # A process-pool child (see batch_simulation) re-imports the app module; only the
+        # serving process runs jobs
+        return 0
+    _init()
+    with _connect() as conn:
+        _prune(conn)
+        conn.execute("UPDATE jobs SET status = ?, updated_at = ? WHERE status = ? AND updated_at < ?",
+                     (QUEUED, time.time(), RUNNING, time.time() - JOB_STALE_SECONDS))
+        pending = [row['id'] for row in conn.execute("SELECT id FROM jobs WHERE status = ?", (QUEUED,))]
+    for job_id in pending:
+        _executor.submit(_run, job_id)
+    return len(pending)
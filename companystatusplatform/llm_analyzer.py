@@ -1,19 +1,54 @@
 # llm_analyzer.py
-from openai import OpenAI
-from config import OPENAI_API_KEY
+import json
+import hashlib
+import re
+from config import OPENAI_API_KEY, OPENAI_MODEL, PROMPT_TOKEN_BUDGET, LLM_BATCH_MAX
 import pandas as pd
+import llm_cache
+import llm_dispatcher
+from rollup import RollupCube
+from simulation_engine import run_scenario_text, format_result
+from llm_cache import cached_completion, cached_stream, dataset_fingerprint
+from prompt_builder import count_tokens, insights_context, simulation_table
+from document_index import retrieve
+from tracing import span, increment
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+MODEL = OPENAI_MODEL
 
-def generate_insights(financial_df: pd.DataFrame, scraped_text: str):
-    """Generates comprehensive business insights using an LLM."""
-    if OPENAI_API_KEY == 'YOUR_API_KEY_HERE' or not OPENAI_API_KEY:
-        return "Insight generation requires a valid OpenAI API key in config.py or environment variables."
+NO_KEY_MESSAGE = "Insight generation requires a valid OpenAI API key in config.py or environment variables."
+NO_SCENARIO_MESSAGE = ("The scenario did not contain a recognizable price, volume or cost change. "
+                       "Try e.g. 'Smartphone price +10%; elasticity North -0.5 South -0.8; cost up 3%'.")
 
-    # Use a descriptive summary to stay within token limits
-    financial_summary = financial_df.describe().to_string() 
-    prompt = f"""
+
+def _has_api_key():
+    return bool(OPENAI_API_KEY) and OPENAI_API_KEY != 'YOUR_API_KEY_HERE'
+
+
+def warm_up():
+    """Starts the LLM dispatcher ahead of the first insight or narrative (only with an API key)."""
+    if _has_api_key():
+        llm_dispatcher.warm_up()
+
+
+# API calls go through llm_dispatcher, which coalesces identical in-flight prompts and
+# keeps the worker within its rate budgets
+def _complete(prompt, fingerprint, **cache_options):
+    """Chat completion for `prompt`, served from llm_cache when the same request was answered before."""
+    def create():
+        with span('llm.completion', model=MODEL):
+            return llm_dispatcher.complete(MODEL, prompt)
+    return cached_completion(MODEL, prompt, create, fingerprint=fingerprint, **cache_options)
+
+
+def _stream(prompt, fingerprint, **cache_options):
+    """Like `_complete`, but yields the completion's text chunks as they arrive."""
+    def create_stream():
+        with span('llm.stream', model=MODEL):
+            yield from llm_dispatcher.stream(MODEL, prompt)
+    return cached_stream(MODEL, prompt, create_stream, fingerprint=fingerprint, **cache_options)
+
+
+INSIGHTS_TEMPLATE = """
     Analyze the following company data and provide a comprehensive business status report.
 
     Financial Data Summary (from Excel file):
@@ -31,38 +66,228 @@ def generate_insights(financial_df: pd.DataFrame, scraped_text: str):
 
     Format the response using markdown.
     """
-    
+
+# Retrieval queries for the report sections above, run against the company's indexed scrapes
+INSIGHT_QUESTIONS = [
+    "overall company health, financial performance, revenue and profit",
+    "financial strengths and weaknesses, margins, debt and cash",
+    "competitive landscape, competitors, market share and pricing",
+    "risks and opportunities, regulation, lawsuits, demand and growth",
+    "customer reviews and sentiment, complaints and satisfaction",
+]
+
+SIMULATION_TEMPLATE = """
+    The following what-if simulation results were computed from the company's sales data:
+    {result_table}
+
+    Explain these results for a business audience: which segments gain or lose, why, and
+    what to watch out for. Do not recompute or change the numbers.
+    """
+
+# Several scenarios narrated in one call; the answer is split at the section headings
+BATCH_SIMULATION_TEMPLATE = """
+    The following what-if simulations were computed from the company's sales data:
+    {result_tables}
+
+    For each scenario, explain the results for a business audience: which segments gain or
+    lose, why, and what to watch out for. Do not recompute or change the numbers. Start the
+    explanation of each scenario with a line "### Scenario <number>" and keep them in order.
+    """
+
+_BATCH_SECTION = re.compile(r'^#+\s*Scenario\s+(\d+)\s*$', re.MULTILINE | re.IGNORECASE)
+
+
+def _retrieve_passages(company, cik):
+    if not company:
+        return []
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content
+        with span('retrieval.query'):
+            return retrieve(company, cik, INSIGHT_QUESTIONS)
+    except Exception as e:
+        print(f"Retrieval over scraped documents failed: {e}")
+        return []
+
+
+def _insights_prompt(financial_df, scraped_text, fingerprint, company, cik):
+    # A cached dataset profile and the most relevant scraped passages, sized to the token budget
+    budget = PROMPT_TOKEN_BUDGET - count_tokens(INSIGHTS_TEMPLATE)
+    passages = _retrieve_passages(company, cik)
+    with span('prompt.build'):
+        financial_summary, scraped_excerpt = insights_context(financial_df, fingerprint, scraped_text, budget,
+                                                              passages=passages)
+    return INSIGHTS_TEMPLATE.format(financial_summary=financial_summary, scraped_text=scraped_excerpt)
+
+
+def generate_insights(financial_df: pd.DataFrame, scraped_text: str, dataset_version=None, company=None,
+                      cik=None):
+    """
+    Generates comprehensive business insights using an LLM. `dataset_version` (e.g. the
+    upload's content hash) keys the cached profile; by default the frame is fingerprinted.
+    With `company` (and its `cik`), the scraped context is retrieved from that company's
+    indexed documents.
+    """
+    if not _has_api_key():
+        return NO_KEY_MESSAGE
+
+    try:
+        fingerprint = dataset_version or dataset_fingerprint(financial_df)
+        return _complete(_insights_prompt(financial_df, scraped_text, fingerprint, company, cik), fingerprint)
     except Exception as e:
         return f"Error with LLM insight generation: {e}"
 
 
-def run_simulation(financial_df: pd.DataFrame, scenario: str):
-    """Runs a 'what if' simulation using the LLM."""
-    if OPENAI_API_KEY == 'YOUR_API_KEY_HERE' or not OPENAI_API_KEY:
-        return "Simulation requires a valid OpenAI API key."
-        
-    financial_summary = financial_df.describe().to_string()
-    prompt = f"""
-    Based on the following financial data summary:
-    {financial_summary}
+def stream_insights(financial_df: pd.DataFrame, scraped_text: str, dataset_version=None, company=None, cik=None):
+    """Streaming form of `generate_insights`: yields markdown text chunks as the model produces them."""
+    if not _has_api_key():
+        yield NO_KEY_MESSAGE
+        return
+    try:
+        fingerprint = dataset_version or dataset_fingerprint(financial_df)
+        yield from _stream(_insights_prompt(financial_df, scraped_text, fingerprint, company, cik), fingerprint)
+    except Exception as e:
+        yield f"\n\nError with LLM insight generation: {e}"
 
-    Analyze the potential impact of this scenario: "{scenario}".
 
-    Provide a simulated report detailing the potential outcomes, changes in key metrics (e.g., sales, profit), and recommendations.
+def _simulate(financial_df, scenario, cube):
+    """Returns (result, error message); result is None when there is nothing to narrate."""
+    try:
+        result = run_scenario_text(cube if cube is not None else RollupCube(financial_df), scenario)
+    except ValueError as e:
+        return None, f"Could not read the scenario: {e}"
+    if result is None:
+        return None, NO_SCENARIO_MESSAGE
+    return result, None
+
+
+def _simulation_request(financial_df, scenario, result, fingerprint=None):
+    """
+    (prompt, fingerprint, cache options) for narrating a simulation result. `fingerprint`
+    is the dataset version; the frame is only hashed when the caller has none.
+    """
+    budget = PROMPT_TOKEN_BUDGET - count_tokens(SIMULATION_TEMPLATE)
+    prompt = SIMULATION_TEMPLATE.format(result_table=simulation_table(result, scenario, budget))
+    # Rewordings of a scenario that parse to the same changes can share one narrative
+    parsed = hashlib.sha256(json.dumps(result['scenario'], sort_keys=True).encode('utf-8')).hexdigest()
+    return prompt, fingerprint or dataset_fingerprint(financial_df), {'semantic_text': scenario, 'guard': parsed}
+
+
+def run_simulation(financial_df: pd.DataFrame, scenario: str, cube=None, dataset_version=None):
+    """
+    Runs a 'what if' simulation with the local vectorized engine; the LLM only narrates
+    the computed per-segment deltas. `dataset_version` keys the cached narrative, as in
+    `generate_insights`.
+    """
+    result, error = _simulate(financial_df, scenario, cube)
+    if error:
+        return error
+    result_markdown = format_result(result, scenario)
+
+    if not _has_api_key():
+        return result_markdown
+
+    prompt, fingerprint, cache_options = _simulation_request(financial_df, scenario, result, dataset_version)
+    try:
+        narrative = _complete(prompt, fingerprint, **cache_options)
+        return f"{result_markdown}\n\n{narrative}"
+    except Exception as e:
+        return f"{result_markdown}\n\nError with LLM simulation narrative: {e}"
+
+
+def stream_simulation(financial_df: pd.DataFrame, scenario: str, cube=None, dataset_version=None):
     """
-    
+    Streaming form of `run_simulation`: the locally computed results table is yielded
+    first, then the narrative chunks as the model produces them.
+    """
+    result, error = _simulate(financial_df, scenario, cube)
+    if error:
+        yield error
+        return
+    yield format_result(result, scenario)
+
+    if not _has_api_key():
+        return
+
+    prompt, fingerprint, cache_options = _simulation_request(financial_df, scenario, result, dataset_version)
+    yield "\n\n"
     try:
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": prompt}]
-        )
-        return response.choices[0].message.content
+        yield from _stream(prompt, fingerprint, **cache_options)
     except Exception as e:
-        return f"Error with LLM simulation: {e}"
+        yield f"Error with LLM simulation narrative: {e}"
+
+
+def _batch_prompt(requests):
+    budget = (PROMPT_TOKEN_BUDGET - count_tokens(BATCH_SIMULATION_TEMPLATE)) // len(requests)
+    tables = "\n\n".join(f"Scenario {number}: {r['scenario']}\n{simulation_table(r['result'], r['scenario'], budget)}"
+                         for number, r in enumerate(requests, start=1))
+    return BATCH_SIMULATION_TEMPLATE.format(result_tables=tables)
+
+
+def _split_batch(text, count):
+    """The per-scenario narratives of a batched answer, or None unless it has sections 1..`count`."""
+    marks = list(_BATCH_SECTION.finditer(text))
+    if [int(m.group(1)) for m in marks] != list(range(1, count + 1)):
+        return None
+    ends = [m.start() for m in marks[1:]] + [len(text)]
+    return [text[m.end():end].strip() for m, end in zip(marks, ends)]
+
+
+def _narrate(requests):
+    """
+    Narratives for simulation requests that missed the cache: up to LLM_BATCH_MAX of them
+    share one completion, and the groups run concurrently. A group whose answer cannot be
+    split back into its scenarios is narrated one scenario per call instead. Failed
+    narratives are returned as exceptions.
+    """
+    if not requests:
+        return []
+    groups = [requests[i:i + LLM_BATCH_MAX] for i in range(0, len(requests), LLM_BATCH_MAX)]
+    prompts = [group[0]['prompt'] if len(group) == 1 else _batch_prompt(group) for group in groups]
+    with span('llm.completion', model=MODEL):
+        answers = llm_dispatcher.complete_many(MODEL, prompts)
+    narrated, single = [], []
+    for group, answer in zip(groups, answers):
+        parts = None if isinstance(answer, Exception) or len(group) == 1 else _split_batch(answer, len(group))
+        if parts is None and len(group) > 1 and not isinstance(answer, Exception):
+            increment('llm_batch_fallbacks_total', model=MODEL)
+            single.extend(group)
+            continue
+        narrated.extend(zip(group, parts or [answer] * len(group)))
+    if single:
+        with span('llm.completion', model=MODEL):
+            narrated.extend(zip(single, llm_dispatcher.complete_many(MODEL, [r['prompt'] for r in single])))
+    return narrated
+
+
+def run_simulations(financial_df: pd.DataFrame, scenarios, cube=None, dataset_version=None):
+    """
+    Runs several 'what if' scenarios on the same data, like `run_simulation` for each.
+    Narratives that are not cached are requested together (see `_narrate`) and cached one
+    per scenario, so narrating a scenario on its own later is a cache hit. Returns one
+    markdown text per scenario, in order.
+    """
+    cube = cube if cube is not None else RollupCube(financial_df)
+    outputs, pending = [], {}
+    fingerprint = (dataset_version or dataset_fingerprint(financial_df)) if _has_api_key() else None
+    for scenario in scenarios:
+        result, error = _simulate(financial_df, scenario, cube)
+        outputs.append(error or format_result(result, scenario))
+        if error or not _has_api_key():
+            continue
+        prompt, _, cache_options = _simulation_request(financial_df, scenario, result, fingerprint)
+        key, narrative = llm_cache.lookup(MODEL, prompt, fingerprint, **cache_options)
+        if narrative is not None:
+            outputs[-1] += f"\n\n{narrative}"
+            continue
+        # Scenarios that differ only in wording share one request
+        request = pending.setdefault(key, {'key': key, 'prompt': prompt, 'scenario': scenario, 'result': result,
+                                           'cache_options': cache_options, 'positions': []})
+        request['positions'].append(len(outputs) - 1)
 
+    for request, narrative in _narrate(list(pending.values())):
+        if isinstance(narrative, Exception):
+            narrative = f"Error with LLM simulation narrative: {narrative}"
+        else:
+            llm_cache.store(request['key'], MODEL, narrative, fingerprint, **request['cache_options'])
+        for position in request['positions']:
+            outputs[position] += f"\n\n{narrative}"
+    return outputs
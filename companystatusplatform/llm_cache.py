@@ -0,0 +1,219 @@
+# llm_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+from config import LLM_CACHE_PATH, LLM_CACHE_TTL, LLM_CACHE_MAX_MB, LLM_SEMANTIC_THRESHOLD
+from embeddings import embed, chroma_collection
+
+# Persistent cache of LLM responses, content-addressed by a hash of (model, prompt,
+# dataset fingerprint). Entries live in a SQLite table shared by all workers, expire after
+# LLM_CACHE_TTL seconds and are evicted least-recently-used once the stored responses
+# exceed LLM_CACHE_MAX_MB. Only successful responses are stored.
+#
+# Callers can also pass a `semantic_text` (e.g. the scenario as typed) and a `guard`: on
+# an exact miss, the nearest stored text with the same model, fingerprint and guard is
+# looked up in chroma_db by embedding similarity, so rephrasings of a scenario that yields
+# the same numbers reuse the stored narrative. Without chromadb only exact matches are served.
+
+stats = {'hits': 0, 'semantic_hits': 0, 'misses': 0, 'evictions': 0}
+_stats_lock = threading.Lock()
+_init_lock = threading.Lock()
+_initialized = False
+
+SEMANTIC_COLLECTION = 'llm_semantic_cache'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    fingerprint TEXT,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+def _count(name, n=1):
+    with _stats_lock:
+        stats[name] += n
+
+
+def get_stats():
+    """Copy of the hit/miss counters plus the hit ratio for this worker."""
+    with _stats_lock:
+        snapshot = dict(stats)
+    lookups = snapshot['hits'] + snapshot['semantic_hits'] + snapshot['misses']
+    snapshot['hit_ratio'] = round((snapshot['hits'] + snapshot['semantic_hits']) / lookups, 4) if lookups else 0.0
+    return snapshot
+
+
+@contextmanager
+def _connect():
+    conn = sqlite3.connect(LLM_CACHE_PATH, timeout=30)
+    try:
+        with conn:  # commits on success, rolls back on error
+            yield conn
+    finally:
+        conn.close()
+
+
+def _init():
+    global _initialized
+    with _init_lock:
+        if _initialized:
+            return
+        os.makedirs(os.path.dirname(LLM_CACHE_PATH), exist_ok=True)
+        with _connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        _initialized = True
+
+
+def dataset_fingerprint(df: pd.DataFrame):
+    """Hash of a frame's columns, dtypes and values; identical data gives the same fingerprint."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(json.dumps([[str(c), str(t)] for c, t in df.dtypes.items()]).encode('utf-8'))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def cache_key(model, prompt, fingerprint=None):
+    return hashlib.sha256(json.dumps([model, prompt, fingerprint]).encode('utf-8')).hexdigest()
+
+
+def get(key, ttl=LLM_CACHE_TTL):
+    """Returns the stored response for `key` if it is younger than `ttl` seconds, else None."""
+    _init()
+    now = time.time()
+    with _connect() as conn:
+        row = conn.execute("SELECT response FROM responses WHERE key = ? AND created_at > ?",
+                           (key, now - ttl)).fetchone()
+        if row is not None:
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+    return row[0] if row else None
+
+
+def put(key, model, response, fingerprint=None):
+    """Stores `response` under `key`, then drops expired entries and evicts down to LLM_CACHE_MAX_MB."""
+    _init()
+    now = time.time()
+    with _connect() as conn:
+        conn.execute("INSERT OR REPLACE INTO responses (key, model, fingerprint, response, size, created_at, last_used) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                     (key, model, fingerprint, response, len(response.encode('utf-8')), now, now))
+        evicted = conn.execute("DELETE FROM responses WHERE created_at <= ?", (now - LLM_CACHE_TTL,)).rowcount
+        budget = LLM_CACHE_MAX_MB * 1024 * 1024
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total > budget:
+            stale = []
+            for old_key, size in conn.execute("SELECT key, size FROM responses WHERE key != ? ORDER BY last_used", (key,)):
+                if total <= budget:
+                    break
+                stale.append((old_key,))
+                total -= size
+            conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+            evicted += len(stale)
+    if evicted:
+        _count('evictions', evicted)
+
+
+def clear():
+    """Removes every stored response (the semantic index entries then simply miss)."""
+    _init()
+    with _connect() as conn:
+        conn.execute("DELETE FROM responses")
+
+
+# --- Semantic near-duplicate index (chroma_db) ---
+
+def _semantic_lookup(text, model, fingerprint, guard):
+    try:
+        collection = chroma_collection(SEMANTIC_COLLECTION)
+        if collection is None or collection.count() == 0:
+            return None
+        found = collection.query(query_embeddings=embed([text]), n_results=1,
+                                 where={'$and': [{'model': model}, {'fingerprint': fingerprint or ''},
+                                                 {'guard': guard or ''}]})
+    except Exception as e:
+        print(f"Semantic cache lookup failed: {e}")
+        return None
+    if not found['ids'][0] or 1.0 - found['distances'][0][0] < LLM_SEMANTIC_THRESHOLD:
+        return None
+    return get(found['metadatas'][0][0]['key'])
+
+
+def _semantic_add(key, text, model, fingerprint, guard):
+    try:
+        collection = chroma_collection(SEMANTIC_COLLECTION)
+        if collection is not None:
+            collection.upsert(ids=[key], embeddings=embed([text]), documents=[text],
+                              metadatas=[{'key': key, 'model': model, 'fingerprint': fingerprint or '',
+                                          'guard': guard or ''}])
+    except Exception as e:
+        print(f"Semantic cache update failed: {e}")
+
+
+def lookup(model, prompt, fingerprint=None, semantic_text=None, guard=None):
+    """
+    Returns (key, response) where response is the cached answer for (model, prompt,
+    fingerprint) or a semantic near duplicate of `semantic_text`, or None on a miss.
+    """
+    key = cache_key(model, prompt, fingerprint)
+    response = get(key)
+    if response is not None:
+        _count('hits')
+        return key, response
+    if semantic_text:
+        response = _semantic_lookup(semantic_text, model, fingerprint, guard)
+        if response is not None:
+            _count('semantic_hits')
+            return key, response
+    _count('misses')
+    return key, None
+
+
+def store(key, model, response, fingerprint=None, semantic_text=None, guard=None):
+    """Stores a completed response returned for a `lookup` miss."""
+    put(key, model, response, fingerprint)
+    if semantic_text:
+        _semantic_add(key, semantic_text, model, fingerprint, guard)
+
+
+def cached_completion(model, prompt, create, fingerprint=None, semantic_text=None, guard=None):
+    """
+    Returns the cached response for (model, prompt, fingerprint), or a semantic near
+    duplicate of `semantic_text`, or calls `create()` and stores its result. Exceptions
+    from `create()` propagate and nothing is stored.
+    """
+    key, response = lookup(model, prompt, fingerprint, semantic_text, guard)
+    if response is None:
+        response = create()
+        store(key, model, response, fingerprint, semantic_text, guard)
+    return response
+
+
+def cached_stream(model, prompt, create_stream, fingerprint=None, semantic_text=None, guard=None):
+    """
+    Streaming variant of `cached_completion`: a cached response is yielded in one piece,
+    otherwise the text chunks of `create_stream()` are passed through as they arrive. The
+    response is stored only once the stream has been read to the end.
+    """
+    key, response = lookup(model, prompt, fingerprint, semantic_text, guard)
+    if response is not None:
+        yield response
+        return
+    parts = []
+    for chunk in create_stream():
+        parts.append(chunk)
+        yield chunk
+    store(key, model, ''.join(parts), fingerprint, semantic_text, guard)
@@ -0,0 +1,304 @@
+# llm_dispatcher.py
+import asyncio
+import hashlib
+import json
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from config import (OPENAI_API_KEY, OPENAI_BASE_URL, LLM_MAX_CONNECTIONS, LLM_TIMEOUT, LLM_MAX_CONCURRENCY,
+                    LLM_RPM_LIMIT, LLM_TPM_LIMIT, LLM_COMPLETION_TOKENS, LLM_MAX_RETRIES, LLM_BACKOFF_BASE,
+                    LLM_BACKOFF_MAX)
+from prompt_builder import count_tokens
+from tracing import increment, observe
+
+# Every chat completion of a worker goes through one dispatcher: a pooled AsyncOpenAI
+# client on a background event loop thread (like fetcher.py), which request threads and
+# jobs hand their calls to.
+#
+#   * Single flight: a prompt that is already being answered for the same model is not
+#     sent again; the caller waits for the running call (completions) or joins its stream,
+#     receiving the chunks produced so far and then the rest as they arrive.
+#   * Budgets: at most LLM_MAX_CONCURRENCY calls run at once, and a sliding one-minute
+#     window keeps requests under LLM_RPM_LIMIT and estimated tokens (prompt plus
+#     LLM_COMPLETION_TOKENS, corrected to the reported usage) under LLM_TPM_LIMIT.
+#   * Backoff: rate-limited (429), timed-out, connection and 5xx failures are retried up
+#     to LLM_MAX_RETRIES times with exponential backoff and jitter, honouring Retry-After;
+#     a 429 also holds back every other call for that long. A stream is only retried
+#     before its first chunk.
+#   * Stream readers never wait forever: a reader that gets nothing for longer than the
+#     first chunk can take (every attempt timing out, plus backoff and a full budget
+#     window) or, after that, for LLM_TIMEOUT between chunks, raises TimeoutError.
+
+_END = object()
+
+_FIRST_CHUNK_TIMEOUT = (LLM_MAX_RETRIES + 1) * LLM_TIMEOUT + LLM_MAX_RETRIES * LLM_BACKOFF_MAX + 60
+
+_loop = None
+_client = None
+_lock = threading.Lock()
+_slots = None
+_budget = None
+_completions = {}  # flight key -> asyncio.Task (only touched on the loop thread)
+_streams = {}      # flight key -> _StreamFlight
+
+
+class _Budget:
+    """Requests and tokens used in the last minute, against the RPM / TPM limits (0 = none)."""
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._window = deque()  # [started, tokens], oldest first
+        self._resume_at = 0.0
+
+    def _delay(self, tokens, now):
+        while self._window and self._window[0][0] <= now - 60:
+            self._window.popleft()
+        delay = self._resume_at - now
+        if self.rpm and len(self._window) >= self.rpm:
+            delay = max(delay, self._window[len(self._window) - self.rpm][0] + 60 - now)
+        if self.tpm:
+            excess = sum(t for _, t in self._window) + min(tokens, self.tpm) - self.tpm
+            for started, used in self._window:
+                if excess <= 0:
+                    break
+                excess -= used
+                delay = max(delay, started + 60 - now)
+        return delay
+
+    async def acquire(self, tokens):
+        """Waits until a call of `tokens` estimated tokens fits; returns its window entry."""
+        waited = 0.0
+        while True:
+            now = time.monotonic()
+            delay = self._delay(tokens, now)
+            if delay <= 0:
+                break
+            waited += delay
+            await asyncio.sleep(delay)
+        if waited:
+            observe('llm_budget_wait_seconds', waited)
+        entry = [time.monotonic(), tokens]
+        self._window.append(entry)
+        return entry
+
+    def pause(self, seconds):
+        """Holds back every call for `seconds` (after the provider reported a rate limit)."""
+        self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+
+class _StreamFlight:
+    """One streamed completion and the queues of the callers reading it."""
+
+    def __init__(self, key):
+        self.key = key
+        self.chunks = []
+        self.readers = []
+        self.task = None
+
+
+def _start_loop():
+    global _loop, _client, _slots, _budget
+    with _lock:
+        if _loop is not None:
+            return _loop
+        loop = asyncio.new_event_loop()
+        threading.Thread(target=loop.run_forever, name='llm-dispatcher-loop', daemon=True).start()
+
+        async def setup():
+            import httpx
+            from openai import AsyncOpenAI
+            http_client = httpx.AsyncClient(timeout=LLM_TIMEOUT,
+                                            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS,
+                                                                max_keepalive_connections=LLM_MAX_CONNECTIONS))
+            # Retries are done here, under the budgets, rather than inside the client
+            client = AsyncOpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL or None, timeout=LLM_TIMEOUT,
+                                 max_retries=0, http_client=http_client)
+            return client, asyncio.Semaphore(LLM_MAX_CONCURRENCY), _Budget(LLM_RPM_LIMIT, LLM_TPM_LIMIT)
+
+        _client, _slots, _budget = asyncio.run_coroutine_threadsafe(setup(), loop).result()
+        _loop = loop
+        return _loop
+
+
+def warm_up():
+    """Starts the loop and builds the client ahead of the first call."""
+    _start_loop()
+
+
+def _flight_key(model, prompt):
+    return hashlib.sha256(json.dumps([model, prompt]).encode('utf-8')).hexdigest()
+
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before retrying after `error`, or None if it should not be retried."""
+    import openai
+    status = getattr(error, 'status_code', None)
+    if not (isinstance(error, openai.APIConnectionError) or status in (408, 409, 429) or (status or 0) >= 500):
+        return None
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        return min(float(retry_after), LLM_BACKOFF_MAX)
+    except (TypeError, ValueError):
+        backoff = min(LLM_BACKOFF_BASE * 2 ** attempt, LLM_BACKOFF_MAX)
+        return backoff / 2 + random.uniform(0, backoff / 2)
+
+
+def _record_usage(model, prompt_tokens, completion_tokens):
+    increment('llm_requests_total', model=model)
+    increment('llm_tokens_total', prompt_tokens, model=model, kind='prompt')
+    increment('llm_tokens_total', completion_tokens, model=model, kind='completion')
+
+
+async def _call(model, prompt, request, can_retry=lambda: True):
+    """
+    Runs `request(entry)` under the concurrency and rate budgets, retrying what can be
+    retried while `can_retry()`; `entry` is the budget window entry, to be corrected to
+    the reported usage.
+    """
+    estimate = count_tokens(prompt) + LLM_COMPLETION_TOKENS
+    attempt = 0
+    while True:
+        queued = time.perf_counter()
+        async with _slots:
+            entry = await _budget.acquire(estimate)
+            observe('llm_queue_seconds', time.perf_counter() - queued, model=model)
+            try:
+                return await request(entry)
+            except Exception as e:
+                delay = _retry_delay(e, attempt) if attempt < LLM_MAX_RETRIES and can_retry() else None
+                if delay is None:
+                    increment('llm_errors_total', model=model, error=type(e).__name__)
+                    raise
+                status = getattr(e, 'status_code', None)
+                increment('llm_retries_total', model=model, reason=str(status or type(e).__name__))
+                if status == 429:
+                    _budget.pause(delay)
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+async def _complete(model, prompt):
+    async def request(entry):
+        response = await _client.chat.completions.create(model=model, messages=[{"role": "user", "content": prompt}])
+        content = response.choices[0].message.content
+        usage = getattr(response, 'usage', None)
+        prompt_tokens = usage.prompt_tokens if usage else count_tokens(prompt)
+        completion_tokens = usage.completion_tokens if usage else count_tokens(content)
+        entry[1] = prompt_tokens + completion_tokens
+        _record_usage(model, prompt_tokens, completion_tokens)
+        return content
+    return await _call(model, prompt, request)
+
+
+async def _shared_completion(model, prompt):
+    key = _flight_key(model, prompt)
+    task = _completions.get(key)
+    if task is None:
+        task = _completions[key] = asyncio.ensure_future(_complete(model, prompt))
+        task.add_done_callback(lambda _: _completions.pop(key, None))
+    else:
+        increment('llm_coalesced_total', model=model, kind='completion')
+    # A caller that gives up must not cancel the call the others are waiting for
+    return await asyncio.shield(task)
+
+
+def complete(model, prompt):
+    """Chat completion of `prompt`; blocks the calling thread until the answer is in."""
+    return asyncio.run_coroutine_threadsafe(_shared_completion(model, prompt), _start_loop()).result()
+
+
+def complete_many(model, prompts):
+    """Completions of `prompts`, run concurrently; a failed prompt's entry is its exception."""
+    async def gather():
+        return await asyncio.gather(*(_shared_completion(model, p) for p in prompts), return_exceptions=True)
+    return asyncio.run_coroutine_threadsafe(gather(), _start_loop()).result()
+
+
+async def _run_stream(flight, model, prompt):
+    def publish(item):
+        for reader in flight.readers:
+            reader.put(item)
+
+    async def request(entry):
+        started = time.perf_counter()
+        stream = await _client.chat.completions.create(model=model, messages=[{"role": "user", "content": prompt}],
+                                                       stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if not flight.chunks:
+                    observe('llm_first_token_seconds', time.perf_counter() - started, model=model)
+                flight.chunks.append(chunk.choices[0].delta.content)
+                publish(chunk.choices[0].delta.content)
+        completion_tokens = count_tokens(''.join(flight.chunks))
+        entry[1] = count_tokens(prompt) + completion_tokens
+        _record_usage(model, count_tokens(prompt), completion_tokens)
+
+    try:
+        # Once part of the answer is out, the stream cannot be restarted
+        await _call(model, prompt, request, can_retry=lambda: not flight.chunks)
+        publish(_END)
+    except asyncio.CancelledError:
+        publish(RuntimeError("The model's answer was cancelled"))
+        raise
+    except Exception as e:
+        publish(e)
+    finally:
+        _forget_stream(flight)
+
+
+def _forget_stream(flight):
+    if _streams.get(flight.key) is flight:
+        del _streams[flight.key]
+
+
+async def _join_stream(model, prompt, reader):
+    key = _flight_key(model, prompt)
+    flight = _streams.get(key)
+    if flight is None:
+        flight = _streams[key] = _StreamFlight(key)
+        flight.task = asyncio.ensure_future(_run_stream(flight, model, prompt))
+    else:
+        increment('llm_coalesced_total', model=model, kind='stream')
+        for chunk in flight.chunks:
+            reader.put(chunk)
+    flight.readers.append(reader)
+    return flight
+
+
+def _leave_stream(flight, reader):
+    if reader in flight.readers:
+        flight.readers.remove(reader)
+    # Nobody is reading any more: stop paying for the rest of the answer. The flight is
+    # forgotten first, so a caller that asks for the same prompt meanwhile starts a new
+    # stream instead of joining the one being cancelled.
+    if not flight.readers and not flight.task.done():
+        _forget_stream(flight)
+        flight.task.cancel()
+
+
+def stream(model, prompt):
+    """Yields the text chunks of a streamed completion of `prompt` as they arrive."""
+    loop = _start_loop()
+    reader = queue.Queue()
+    flight = asyncio.run_coroutine_threadsafe(_join_stream(model, prompt, reader), loop).result()
+    timeout = _FIRST_CHUNK_TIMEOUT
+    try:
+        while True:
+            try:
+                item = reader.get(timeout=timeout)
+            except queue.Empty:
+                increment('llm_errors_total', model=model, error='StreamTimeout')
+                raise TimeoutError(f"No response from the model for {timeout:g}s") from None
+            timeout = LLM_TIMEOUT
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        loop.call_soon_threadsafe(_leave_stream, flight, reader)
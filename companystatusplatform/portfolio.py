@@ -0,0 +1,134 @@
+# portfolio.py
+import csv
+import hashlib
+import io
+import json
+
+import pandas as pd
+
+from config import PORTFOLIO_MAX_COMPANIES
+from chart_cache import cached_figure_json
+from dataset_store import store
+from prompt_builder import get_profile
+from rollup import get_cube
+
+# Portfolio mode: one manifest lists many companies and their data files. Every company
+# goes through the regular upload stages as its own background job (see app1.py), and the
+# comparison below is assembled from each company's cached profile and rollup cube, so
+# neither the dashboard nor the combined report re-reads any raw rows.
+
+COMPARISON_CHART_SPEC = {
+    'kind': 'bar',
+    'x': 'Company',
+    'y': ['Sales', 'Profit'],
+    'barmode': 'group',
+    'title': 'Sales and Profit by Company',
+}
+
+
+def parse_manifest(data: bytes, filename):
+    """
+    Reads a manifest listing `company_name`, `company_cik` (optional) and `file` per company,
+    either as CSV with a header row or as a JSON list (or {"companies": [...]}).
+    Raises ValueError for anything that cannot be run.
+    """
+    name = (filename or '').lower()
+    try:
+        if name.endswith('.json'):
+            entries = json.loads(data.decode('utf-8-sig'))
+            if isinstance(entries, dict):
+                entries = entries.get('companies', [])
+        elif name.endswith('.csv'):
+            entries = list(csv.DictReader(io.StringIO(data.decode('utf-8-sig'))))
+        else:
+            raise ValueError("The manifest must be a .csv or .json file.")
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Could not read the manifest: {e}")
+    if not isinstance(entries, list):
+        raise ValueError("The manifest must list companies.")
+
+    companies = []
+    for number, entry in enumerate(entries, start=1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Manifest entry {number} is not a company record.")
+        entry = {str(k).strip().lower(): str(v).strip() for k, v in entry.items() if k is not None and v is not None}
+        if not entry.get('company_name') or not entry.get('file'):
+            raise ValueError(f"Manifest entry {number} needs a company_name and a file.")
+        companies.append({'company_name': entry['company_name'],
+                          'company_cik': entry.get('company_cik') or '00000000',
+                          'file': entry['file']})
+    if not companies:
+        raise ValueError("The manifest lists no companies.")
+    if len(companies) > PORTFOLIO_MAX_COMPANIES:
+        raise ValueError(f"The manifest lists {len(companies)} companies; at most {PORTFOLIO_MAX_COMPANIES} are allowed.")
+    return companies
+
+
+def _ready(companies):
+    """(company entry, DataFrame, dataset version) for the companies whose data has been parsed."""
+    ready = []
+    for company in companies:
+        state = store.get_state(company['dataset_id'])
+        df = store.get(company['dataset_id'])
+        if df is not None and state.get('content_hash'):
+            ready.append((company, df, state['content_hash']))
+    return ready
+
+
+def portfolio_version(companies):
+    """Identifies the data behind a comparison: changes whenever a company's dataset does."""
+    digest = hashlib.sha256()
+    for company, _, version in _ready(companies):
+        digest.update(f"{company['company_name']}\n{version}\n".encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def comparison_frame(companies):
+    """One row of headline metrics per parsed company, from its cached profile."""
+    rows = []
+    for company, df, version in _ready(companies):
+        profile = get_profile(df, version)
+        totals = profile.get('totals') or {}
+        latest = profile['trend'][-1] if profile['trend'] else {}
+        top = {dim: (profile['segments'].get(dim) or [{}])[0].get(dim) for dim in ('Product', 'Market')}
+        rows.append({'Company': company['company_name'], 'CIK': company['company_cik'], 'Rows': profile['rows'],
+                     'Sales': totals.get('Sales'), 'Profit': totals.get('Profit'), 'Margin %': totals.get('Margin %'),
+                     'Latest Year': latest.get('Year'), 'Latest Sales': latest.get('Sales'),
+                     'Sales YoY %': latest.get('Sales YoY %'), 'Top Product': top['Product'],
+                     'Top Market': top['Market']})
+    return pd.DataFrame(rows, columns=['Company', 'CIK', 'Rows', 'Sales', 'Profit', 'Margin %', 'Latest Year',
+                                       'Latest Sales', 'Sales YoY %', 'Top Product', 'Top Market'])
+
+
+def segment_frame(companies, by):
+    """The companies' rollups by `by` stacked into one table with a Company column."""
+    tables = []
+    for company, df, version in _ready(companies):
+        cube = get_cube(df, version)
+        if all(d in cube.dimensions for d in by):
+            table = cube.frame(by).astype({d: object for d in by})
+            table.insert(0, 'Company', company['company_name'])
+            tables.append(table)
+    return pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=['Company', *by])
+
+
+def comparison_chart_json(comparison, version):
+    """Figure JSON for the Sales / Profit by company chart, cached per portfolio version."""
+    spec = COMPARISON_CHART_SPEC
+
+    def build():
+        import plotly.express as px
+        return px.bar(comparison, x=spec['x'], y=spec['y'], barmode=spec['barmode'], title=spec['title'])
+
+    return cached_figure_json(f"portfolio:{version}", spec, build)
+
+
+def report_sheets(companies):
+    """Sheets of the combined portfolio report: comparison, insights, segments and trend."""
+    insights = pd.DataFrame([{'Company': c['company_name'],
+                              'Insights': store.get_state(c['dataset_id']).get('insights') or 'N/A'}
+                             for c in companies])
+    return [('Comparison', comparison_frame(companies), {'A:A': 30, 'J:K': 20}),
+            ('Insights', insights, {'A:A': 30, 'B:B': 100}),
+            ('Segments', segment_frame(companies, ['Product', 'Market']), {'A:A': 30}),
+            ('Trend', segment_frame(companies, ['Year']), {'A:A': 30})]
@@ -0,0 +1,322 @@
+# prompt_builder.py
+import hashlib
+import math
+import re
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from config import OPENAI_MODEL, PROMPT_PROFILE_SHARE, PROMPT_CHUNK_TOKENS, PROFILE_CACHE_SIZE
+from rollup import get_cube
+from simulation_engine import format_result
+from tracing import span
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; token counts are then estimated as len(text) / 4
+    tiktoken = None
+
+# Builds LLM prompt context that fits a token budget regardless of dataset or scrape size:
+#  * a compact statistical profile of each dataset (totals, per-segment totals, trend by
+#    Year, top movers), computed from the rollup cube once per dataset version and cached;
+#  * scraped text split into chunks, de-duplicated and ranked by overlap with the
+#    dataset's products and markets and with business terms, keeping the best chunks
+#    that fit (in their original order).
+
+TOP_N = 5
+
+# Words that mark scraped passages worth keeping when the budget is tight
+BUSINESS_TERMS = {'revenue', 'sales', 'profit', 'margin', 'growth', 'decline', 'loss', 'earnings', 'guidance',
+                  'market', 'share', 'competitor', 'competition', 'price', 'pricing', 'demand', 'customer',
+                  'customers', 'review', 'reviews', 'risk', 'debt', 'cash', 'forecast', 'outlook', 'lawsuit'}
+
+_WORD = re.compile(r"[a-z0-9]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+_encoding = None
+_profiles = OrderedDict()
+_lock = threading.Lock()
+
+
+# --- Token counting ---
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        _encoding = False
+        if tiktoken is not None:
+            try:
+                _encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+            except Exception:  # unknown model, or the BPE file cannot be downloaded
+                _encoding = False
+    return _encoding
+
+
+def count_tokens(text):
+    """Tokens in `text` for OPENAI_MODEL (tiktoken when installed, otherwise ~4 characters per token)."""
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def _take_lines(lines, budget):
+    """Leading lines of `lines` whose joined text fits in `budget` tokens."""
+    kept, used = [], 0
+    for line in lines:
+        cost = count_tokens(line + "\n")
+        if used + cost > budget:
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+# --- Dataset profile ---
+
+def _pct(part, whole):
+    return round(float(part) / float(whole) * 100, 1) if whole else 0.0
+
+
+def build_profile(df: pd.DataFrame, dataset_version):
+    """Computes the dataset profile (a dict of plain values) from the rollup cube."""
+    cube = get_cube(df, dataset_version)
+    profile = _cube_profile(cube, len(df), [str(c) for c in df.columns])
+    profile['other_numeric'] = _numeric_stats(df, cube)
+    return profile
+
+
+def _cube_profile(cube, rows, columns):
+    """The profile sections derived from the rollup cube alone (everything but other_numeric)."""
+    profile = {'rows': rows, 'columns': columns, 'segments': {}, 'trend': [], 'top_movers': [],
+               'other_numeric': {}}
+    if 'Sales' in cube.measures:
+        totals = cube.query()
+        profile['totals'] = {'Sales': totals['Sales'], 'Profit': totals.get('Profit'),
+                             'Margin %': _pct(totals.get('Profit', 0), totals['Sales'])}
+        for dim in (d for d in cube.dimensions if d != 'Year'):
+            table = cube.frame([dim]).sort_values('Sales', ascending=False).head(TOP_N)
+            profile['segments'][dim] = [
+                {dim: str(row[dim]), 'Sales': row['Sales'], 'Profit': row.get('Profit'),
+                 'Share %': _pct(row['Sales'], totals['Sales'])}
+                for row in table.to_dict('records')]
+        if 'Year' in cube.dimensions:
+            trend = cube.frame(['Year']).sort_values('Year')
+            previous = None
+            for row in trend.to_dict('records'):
+                entry = {'Year': int(row['Year']), 'Sales': row['Sales'], 'Profit': row.get('Profit')}
+                if previous:
+                    entry['Sales YoY %'] = _pct(row['Sales'] - previous['Sales'], previous['Sales'])
+                profile['trend'].append(entry)
+                previous = row
+            profile['top_movers'] = _top_movers(cube)
+    return profile
+
+
+def _numeric_stats(df, cube, columns=None):
+    """{column: {'count', 'min', 'mean', 'max'}} for numeric columns that are not cube measures."""
+    numeric = df.select_dtypes('number').drop(columns=cube.measures + ['Year'], errors='ignore')
+    stats = {}
+    for col in (numeric.columns[:TOP_N] if columns is None else [c for c in numeric.columns if str(c) in columns]):
+        series = numeric[col].astype('float64')
+        stats[str(col)] = {'count': int(series.count()), 'min': series.min(), 'mean': round(series.mean(), 2),
+                           'max': series.max()}
+    return stats
+
+
+def _merge_stats(old, new):
+    if not new['count']:
+        return old
+    if not old['count']:
+        return new
+    count = old['count'] + new['count']
+    return {'count': count, 'min': min(old['min'], new['min']), 'max': max(old['max'], new['max']),
+            'mean': round((old['mean'] * old['count'] + new['mean'] * new['count']) / count, 2)}
+
+
+def extend_profile(profile, delta: pd.DataFrame, cube, dataset_version):
+    """
+    Profile of a dataset version made by appending `delta` to the data `profile` describes,
+    where `cube` is the new version's (incrementally updated) cube. Only the delta rows are
+    scanned; the result is cached for `dataset_version`.
+    """
+    extended = _cube_profile(cube, profile['rows'] + len(delta), profile['columns'])
+    delta_stats = _numeric_stats(delta, cube, columns=profile['other_numeric'])
+    for col, stats in profile['other_numeric'].items():
+        extended['other_numeric'][col] = _merge_stats(stats, delta_stats[col]) if col in delta_stats else stats
+    return _remember_profile(dataset_version, extended)
+
+
+def _top_movers(cube):
+    """Product / Market segments with the largest Sales change between the last two years."""
+    segment_dims = [d for d in ('Product', 'Market') if d in cube.dimensions]
+    years = sorted(cube.frame(['Year'])['Year'].tolist())
+    if not segment_dims or len(years) < 2:
+        return []
+    table = cube.frame(segment_dims + ['Year'])
+    last, prior = years[-1], years[-2]
+    pivot = table[table['Year'].isin([prior, last])].pivot_table(
+        index=segment_dims, columns='Year', values='Sales', aggfunc='sum', observed=True).fillna(0)
+    pivot['change'] = pivot.get(last, 0) - pivot.get(prior, 0)
+    movers = pivot.reindex(pivot['change'].abs().sort_values(ascending=False).index).head(TOP_N)
+    return [{'Segment': ' / '.join(str(k) for k in (key if isinstance(key, tuple) else (key,))),
+             'From': int(prior), 'To': int(last), 'Sales Change': row['change'],
+             'Change %': _pct(row['change'], row.get(prior, 0))}
+            for key, row in movers.iterrows()]
+
+
+def get_profile(df: pd.DataFrame, dataset_version):
+    """Returns the cached profile for `dataset_version`, computing it on first use in this worker."""
+    with _lock:
+        if dataset_version in _profiles:
+            _profiles.move_to_end(dataset_version)
+            return _profiles[dataset_version]
+    with span('profile.build'):
+        profile = build_profile(df, dataset_version)
+    return _remember_profile(dataset_version, profile)
+
+
+def _remember_profile(dataset_version, profile):
+    with _lock:
+        _profiles[dataset_version] = profile
+        _profiles.move_to_end(dataset_version)
+        while len(_profiles) > PROFILE_CACHE_SIZE:
+            _profiles.popitem(last=False)
+    return profile
+
+
+def _number(value):
+    if value is None:
+        return 'n/a'
+    return f"{value:,.0f}" if abs(value) >= 100 else f"{value:,.2f}"
+
+
+def render_profile(profile, budget):
+    """Renders the profile as compact text, most important lines first, within `budget` tokens."""
+    columns = profile['columns']
+    more = f" (+{len(columns) - 20} more)" if len(columns) > 20 else ''
+    lines = [f"Rows: {profile['rows']:,}; columns: {', '.join(columns[:20])}{more}"]
+    totals = profile.get('totals')
+    if totals:
+        lines.append(f"Total Sales {_number(totals['Sales'])}, Profit {_number(totals['Profit'])}, "
+                     f"margin {totals['Margin %']}%")
+    for entry in profile['trend']:
+        change = f" ({entry['Sales YoY %']:+}% YoY)" if 'Sales YoY %' in entry else ''
+        lines.append(f"Year {entry['Year']}: Sales {_number(entry['Sales'])}{change}, Profit {_number(entry['Profit'])}")
+    for mover in profile['top_movers']:
+        lines.append(f"Mover {mover['Segment']} {mover['From']}->{mover['To']}: Sales "
+                     f"{mover['Sales Change']:+,.0f} ({mover['Change %']:+}%)")
+    for dim, rows in profile['segments'].items():
+        lines.append(f"Top {dim}: " + '; '.join(
+            f"{row[dim]} Sales {_number(row['Sales'])} ({row['Share %']}%), Profit {_number(row['Profit'])}"
+            for row in rows))
+    for col, stats in profile['other_numeric'].items():
+        lines.append(f"{col}: min {_number(stats['min'])}, mean {_number(stats['mean'])}, max {_number(stats['max'])}")
+    return "\n".join(_take_lines(lines, budget))
+
+
+def profile_terms(profile):
+    """Lower-cased words naming the dataset's top segments, used to rank scraped text."""
+    terms = set()
+    for rows in profile['segments'].values():
+        for row in rows:
+            terms.update(_WORD.findall(next(iter(row.values())).lower()))
+    return terms
+
+
+# --- Scraped text ---
+
+def chunk_text(text, chunk_tokens=PROMPT_CHUNK_TOKENS):
+    """Splits text into paragraph-aligned chunks of about `chunk_tokens` tokens; exact repeats are dropped."""
+    chunks, seen = [], set()
+    for paragraph in re.split(r"\n\s*\n", text or ''):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        pieces = [paragraph] if count_tokens(paragraph) <= chunk_tokens else _SENTENCE_END.split(paragraph)
+        current = ''
+        for piece in pieces:
+            if current and count_tokens(current + ' ' + piece) > chunk_tokens:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}".strip()
+        if current:
+            chunks.append(current)
+    unique = []
+    for chunk in chunks:
+        digest = hashlib.blake2b(' '.join(_WORD.findall(chunk.lower())).encode('utf-8'), digest_size=8).digest()
+        if digest not in seen:
+            seen.add(digest)
+            unique.append(chunk)
+    return unique
+
+
+def _score(chunk, terms, position, count):
+    words = _WORD.findall(chunk.lower())
+    if not words:
+        return 0.0
+    hits = sum(1 for w in words if w in terms or w in BUSINESS_TERMS)
+    # Density of relevant words, with a small preference for earlier passages
+    return hits / math.sqrt(len(words)) + 0.1 * (1 - position / max(count, 1))
+
+
+def fit_text(text, budget, terms=()):
+    """Keeps the highest-ranked chunks of `text` that fit in `budget` tokens, in their original order."""
+    if count_tokens(text or '') <= budget:
+        return (text or '').strip()
+    chunks = chunk_text(text)
+    terms = set(terms)
+    ranked = sorted(range(len(chunks)), key=lambda i: _score(chunks[i], terms, i, len(chunks)), reverse=True)
+    chosen, used = [], 0
+    for i in ranked:
+        cost = count_tokens(chunks[i] + "\n\n")
+        if used + cost <= budget:
+            chosen.append(i)
+            used += cost
+    return "\n\n".join(chunks[i] for i in sorted(chosen))
+
+
+def fit_passages(passages, budget):
+    """Formats retrieved passages (best first) as '[source] text' paragraphs within `budget` tokens."""
+    kept, used = [], 0
+    for passage in passages:
+        text = f"[{passage['source']}] {passage['text']}" if passage.get('source') else passage['text']
+        cost = count_tokens(text + "\n\n")
+        if used + cost <= budget:
+            kept.append(text)
+            used += cost
+    return "\n\n".join(kept)
+
+
+# --- Prompt sections ---
+
+def insights_context(df: pd.DataFrame, dataset_version, scraped_text, budget, passages=None):
+    """
+    Returns (financial summary, scraped excerpt) that together fit in `budget` tokens. The
+    profile may use up to PROMPT_PROFILE_SHARE of the budget; the rest goes to the retrieved
+    `passages` (see document_index.retrieve) or, without them, to the best of `scraped_text`.
+    """
+    profile = get_profile(df, dataset_version)
+    summary = render_profile(profile, int(budget * PROMPT_PROFILE_SHARE))
+    remaining = max(0, budget - count_tokens(summary))
+    if passages:
+        return summary, fit_passages(passages, remaining)
+    return summary, fit_text(scraped_text, remaining, profile_terms(profile))
+
+
+def simulation_table(result, scenario_text, budget):
+    """
+    Markdown table of a simulation result for the prompt. If every segment does not fit in
+    `budget` tokens, the segments with the largest profit change are kept.
+    """
+    lines = format_result(result, scenario_text, timing=False).split("\n")
+    header, rows, total = lines[:6], lines[6:-1], lines[-1]
+    if count_tokens("\n".join(lines)) <= budget:
+        return "\n".join(lines)
+    order = result['segments']['Profit Change'].abs().sort_values(ascending=False).index
+    room = budget - count_tokens("\n".join(header + [total])) - 20
+    kept = sorted(order[i] for i in range(len(_take_lines([rows[i] for i in order], room))))
+    omitted = f"| ({len(rows) - len(kept)} smaller segments omitted) | | | | |"
+    return "\n".join(header + [rows[i] for i in kept] + [omitted, total])
@@ -0,0 +1,144 @@
+# report_export.py
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+import xlsxwriter
+
+from config import REPORT_CACHE_DIR, REPORT_CHUNK_ROWS, REPORT_CACHE_MAX_FILES
+from dataset_store import atomic_write
+from tracing import span
+
+# Report exports that never hold a whole workbook in memory:
+#  * xlsx is written with xlsxwriter's constant_memory mode, REPORT_CHUNK_ROWS rows at a
+#    time, straight to a file in REPORT_CACHE_DIR, and sent from disk in blocks;
+#  * csv is generated chunk by chunk while the response is being sent;
+#  * parquet is written once per dataset version.
+# Files are cached under a key made of the dataset version and a hash of the small extra
+# sheets (insights, simulation, scrape results), so a repeat download is just a file send.
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXCEL_MAX_ROWS = 1048576
+
+# Same header style pandas uses for to_excel
+_HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+
+
+def _report_path(key, extension):
+    return os.path.join(REPORT_CACHE_DIR, f"{key}.{extension}")
+
+
+def _report_key(dataset_version, extra_sheets=()):
+    digest = hashlib.sha256(str(dataset_version).encode('utf-8'))
+    for name, frame, widths in extra_sheets:
+        digest.update(json.dumps([name, widths]).encode('utf-8'))
+        digest.update(frame.to_json(orient='split', date_format='iso').encode('utf-8'))
+    return digest.hexdigest()[:32]
+
+
+def _prune():
+    """Keeps the REPORT_CACHE_MAX_FILES most recently used reports."""
+    try:
+        entries = [e for e in os.scandir(REPORT_CACHE_DIR) if e.is_file() and not e.name.endswith('.tmp')]
+    except FileNotFoundError:
+        return
+    entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+    for entry in entries[REPORT_CACHE_MAX_FILES:]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def _cached(path, build):
+    """Returns `path`, building it through `build(tmp_path)` first unless it is already cached."""
+    if os.path.exists(path):
+        os.utime(path)  # mark as recently used
+        return path
+    os.makedirs(REPORT_CACHE_DIR, exist_ok=True)
+    try:
+        with span('report.build'):
+            atomic_write(path, build)
+    except Exception:
+        # Don't leave a half-written temp file behind (see dataset_store.atomic_write)
+        prefix = f"{path}.{os.getpid()}."
+        for entry in os.scandir(REPORT_CACHE_DIR):
+            if entry.path.startswith(prefix):
+                os.remove(entry.path)
+        raise
+    _prune()
+    return path
+
+
+def _chunk_rows(frame, chunk_rows=REPORT_CHUNK_ROWS):
+    """Yields the frame's rows as lists of plain Python values, converting one chunk at a time."""
+    for start in range(0, len(frame), chunk_rows):
+        chunk = frame.iloc[start:start + chunk_rows].astype(object)
+        yield from chunk.where(chunk.notna(), None).values.tolist()
+
+
+def _write_sheet(workbook, name, frame, header_format, widths=None):
+    if len(frame) + 1 > EXCEL_MAX_ROWS:
+        raise ValueError(f"Sheet '{name}' has {len(frame)} rows; Excel allows at most {EXCEL_MAX_ROWS - 1}.")
+    worksheet = workbook.add_worksheet(name)
+    for column, width in (widths or {}).items():
+        worksheet.set_column(column, width)
+    # constant_memory flushes each row once the next one starts, so rows go strictly in order
+    worksheet.write_row(0, 0, [str(c) for c in frame.columns], header_format)
+    for row_number, values in enumerate(_chunk_rows(frame), start=1):
+        worksheet.write_row(row_number, 0, values)
+
+
+def _workbook_builder(sheets):
+    def build(tmp_path):
+        # xlsxwriter only deletes a sheet's row-data temp file once the sheet has rows, so a
+        # build that fails early would leave it behind; give it a directory of its own
+        with tempfile.TemporaryDirectory(dir=REPORT_CACHE_DIR) as scratch_dir:
+            workbook = xlsxwriter.Workbook(tmp_path, {'constant_memory': True, 'tmpdir': scratch_dir,
+                                                      'strings_to_formulas': False, 'strings_to_urls': False,
+                                                      'remove_timezone': True,
+                                                      'default_date_format': 'yyyy-mm-dd hh:mm:ss'})
+            header_format = workbook.add_format(_HEADER_FORMAT)
+            try:
+                for name, frame, widths in sheets:
+                    _write_sheet(workbook, name, frame, header_format, widths)
+            finally:
+                workbook.close()
+
+    return build
+
+
+def excel_report(dataset_version, df, extra_sheets=()):
+    """
+    Returns the path of the cached xlsx report for `dataset_version`: `df` as 'Raw Data'
+    followed by `extra_sheets`, a list of (sheet name, DataFrame, {column range: width}).
+    """
+    extra_sheets = list(extra_sheets)
+    return _cached(_report_path(_report_key(dataset_version, extra_sheets), 'xlsx'),
+                   _workbook_builder([('Raw Data', df, None)] + extra_sheets))
+
+
+def workbook_report(report_id, sheets):
+    """
+    Returns the path of a cached xlsx made of `sheets` only (same form as `extra_sheets`),
+    reused while `report_id` and the sheets' contents stay the same.
+    """
+    sheets = list(sheets)
+    return _cached(_report_path(_report_key(f"workbook:{report_id}", sheets), 'xlsx'), _workbook_builder(sheets))
+
+
+def parquet_export(dataset_version, df):
+    """Returns the path of the cached Parquet export of `df` for `dataset_version`."""
+    return _cached(_report_path(_report_key(dataset_version), 'parquet'),
+                   lambda tmp_path: df.to_parquet(tmp_path, index=False))
+
+
+def csv_chunks(df, chunk_rows=REPORT_CHUNK_ROWS):
+    """Yields `df` as CSV text (header first), REPORT_CHUNK_ROWS rows per chunk."""
+    yield df.head(0).to_csv(index=False)
+    for start in range(0, len(df), chunk_rows):
+        buffer = io.StringIO()
+        df.iloc[start:start + chunk_rows].to_csv(buffer, header=False, index=False)
+        yield buffer.getvalue()
@@ -0,0 +1,178 @@
+# rollup.py
+import itertools
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from config import ROLLUP_CACHE_SIZE
+from dataset_store import concat_frames
+from tracing import span
+
+# Dimensions and measures of the company data schema (see create_sample_excel)
+DIMENSIONS = ['Product', 'Market', 'Zone', 'Year']
+MEASURES = ['Sales', 'Profit']
+
+
+def _widen(series):
+    if pd.api.types.is_integer_dtype(series):
+        return series.astype('int64')
+    return series.astype('float64')
+
+
+class RollupCube:
+    """
+    Pre-aggregated sums and row counts for every combination of the dataset's dimensions.
+
+    The cube is built once from the finest grain (one cell per observed Product x Market x
+    Zone x Year) and rolled up into all 2^k dimension subsets. `query()` answers a slice
+    with a single dict lookup and `frame()` returns an aggregated table without touching
+    the raw rows again.
+    """
+
+    def __init__(self, df: pd.DataFrame, dimensions=DIMENSIONS, measures=MEASURES):
+        self.dimensions = [d for d in dimensions if d in df.columns]
+        self.measures = [m for m in measures if m in df.columns and pd.api.types.is_numeric_dtype(df[m])]
+        self.row_count = len(df)
+        self._frames = {}
+        self._lookup = {}
+        self._build(df)
+
+    def _build(self, df):
+        self._set_base(self._aggregate(df))
+
+    def _aggregate(self, df):
+        """Finest-grain sums and row counts of `df`."""
+        # Aggregate measures in 64-bit: the store keeps them downcast (e.g. int16)
+        df = df[self.dimensions].join(df[self.measures].apply(_widen))
+        if self.dimensions:
+            return (df.groupby(self.dimensions, observed=True, dropna=False)[self.measures].sum()
+                    .join(df.groupby(self.dimensions, observed=True, dropna=False).size().rename('count'))
+                    .reset_index())
+        return pd.DataFrame([{**{m: df[m].sum() for m in self.measures}, 'count': len(df)}])
+
+    def _set_base(self, base):
+        """(Re)derives every rollup level from the finest-grain table `base`."""
+        self._frames = {}
+        self._lookup = {}
+        values = self.measures + ['count']
+        for size in range(len(self.dimensions) + 1):
+            for subset in itertools.combinations(self.dimensions, size):
+                if subset:
+                    table = base.groupby(list(subset), observed=True, dropna=False)[values].sum().reset_index()
+                    keys = zip(*(table[d].tolist() for d in subset))
+                else:
+                    table = base[values].sum().to_frame().T
+                    keys = [()]
+                self._frames[subset] = table
+                self._lookup[subset] = dict(zip(keys, table[values].to_numpy()))
+
+    def appended(self, delta: pd.DataFrame):
+        """
+        Returns a new cube for this cube's data plus the rows of `delta` (same columns). Only
+        `delta` is aggregated; it is merged into the existing finest-grain table and the
+        rollup levels are re-derived from that, so the old rows are never read again.
+        """
+        cube = RollupCube.__new__(RollupCube)
+        cube.dimensions, cube.measures = self.dimensions, self.measures
+        cube.row_count = self.row_count + len(delta)
+        values = self.measures + ['count']
+        base = concat_frames([self.base(), cube._aggregate(delta)])
+        if self.dimensions:
+            base = base.groupby(self.dimensions, observed=True, dropna=False)[values].sum().reset_index()
+        else:
+            base = base[values].sum().to_frame().T
+        cube._set_base(base)
+        return cube
+
+    def _subset(self, dims):
+        unknown = [d for d in dims if d not in self.dimensions]
+        if unknown:
+            raise KeyError(f"Unknown dimension(s): {', '.join(unknown)}")
+        return tuple(d for d in self.dimensions if d in dims)
+
+    def query(self, **filters):
+        """
+        Returns {'Sales': ..., 'Profit': ..., 'count': ...} for the slice fixed by `filters`,
+        e.g. cube.query(Product='Smartphone', Market='North'). Empty slices return zeros.
+        """
+        subset = self._subset(filters)
+        key = tuple(filters[d] for d in subset)
+        row = self._lookup[subset].get(key)
+        values = self.measures + ['count']
+        if row is None:
+            return {v: 0 for v in values}
+        return {v: row[i].item() for i, v in enumerate(values)}
+
+    def frame(self, by=(), **filters):
+        """Returns the table aggregated by `by`, optionally restricted to the slice in `filters`."""
+        subset = self._subset(list(by) + list(filters))
+        table = self._frames[subset]
+        if filters:
+            # Rows are already at the (by + filters) grain, so fixing the filter values
+            # leaves exactly one row per `by` key
+            mask = np.ones(len(table), dtype=bool)
+            for dim, value in filters.items():
+                mask &= (table[dim] == value).to_numpy()
+            table = table[mask]
+        return table[list(by) + self.measures + ['count']].reset_index(drop=True)
+
+    def drill_down(self, dimension, **filters):
+        """Breaks the slice given by `filters` down by one more `dimension`."""
+        return self.frame([dimension], **filters)
+
+    def base(self):
+        """The finest-grain table (one row per observed combination of all dimensions)."""
+        return self._frames[tuple(self.dimensions)]
+
+
+_cubes = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_cube(df: pd.DataFrame, dataset_version):
+    """Returns the cube for `dataset_version`, building it from `df` on first use in this worker."""
+    with _lock:
+        if dataset_version in _cubes:
+            _cubes.move_to_end(dataset_version)
+            return _cubes[dataset_version]
+    with span('rollup.build'):
+        cube = RollupCube(df)
+    return put_cube(dataset_version, cube)
+
+
+def put_cube(dataset_version, cube):
+    """Caches an already built cube (e.g. from `RollupCube.appended`) for `dataset_version`."""
+    with _lock:
+        _cubes[dataset_version] = cube
+        _cubes.move_to_end(dataset_version)
+        while len(_cubes) > ROLLUP_CACHE_SIZE:
+            _cubes.popitem(last=False)
+    return cube
+
+
+def _keyed(cube, by):
+    table = cube.frame(by)
+    if by:
+        # Plain values as keys, so two versions with different category sets still align
+        table = table.astype({d: object for d in by}).set_index(by)
+    return table
+
+
+def cube_diff(old, new, by=()):
+    """
+    Per-segment changes from cube `old` to cube `new`, aggregated by `by`: for each measure
+    (and the row count) its value before, after and the change. Unchanged segments are left out.
+    """
+    by = list(new._subset(by))
+    old._subset(by)
+    before, after = _keyed(old, by).align(_keyed(new, by), join='outer', fill_value=0)
+    values = new.measures + ['count']
+    diff = pd.DataFrame(index=after.index)
+    for value in values:
+        diff[f"{value} Before"] = before[value]
+        diff[f"{value} After"] = after[value]
+        diff[f"{value} Change"] = after[value] - before[value]
+    diff = diff[(before[values] != after[values]).any(axis=1)]
+    return diff.reset_index() if by else diff.reset_index(drop=True)
@@ -0,0 +1,149 @@
+# row_index.py
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from config import ROW_INDEX_CACHE_SIZE, ROW_SELECTION_CACHE_SIZE
+from rollup import DIMENSIONS, MEASURES
+from tracing import span
+
+# Paging support for browsing a stored dataset without rendering it. Per dataset version,
+# RowIndex keeps categorical codes for the filter dimensions and argsort permutations of
+# the columns rows can be sorted by. A (filters, sort) selection is resolved once with a
+# vectorized pass over the codes and kept in a small LRU; every page after that is a slice
+# of the selection plus an iloc of `limit` rows.
+#
+# The index holds only those arrays, never the frame: callers pass the frame they fetched
+# from the dataset store for the same version, so a cached index does not keep a dataset
+# the store has already evicted or spilled alive in memory.
+
+MAX_PAGE_SIZE = 1000
+
+
+class RowIndex:
+    """Filter codes, sort orders and cached selections for one dataset version."""
+
+    def __init__(self, df: pd.DataFrame, filter_columns=DIMENSIONS, sort_columns=DIMENSIONS + MEASURES):
+        self.columns = list(df.columns)
+        self.size = len(df)
+        self.filter_columns = [c for c in filter_columns if c in df.columns]
+        self._codes = {}
+        self._values = {}
+        for col in self.filter_columns:
+            codes, uniques = pd.factorize(df[col], sort=True)
+            self._codes[col] = codes
+            self._values[col] = list(uniques)
+        self._orders = {}
+        self._selections = OrderedDict()
+        self._lock = threading.Lock()
+        for col in sort_columns:
+            if col in df.columns:
+                self.order(df, col)
+
+    def facets(self):
+        """{column: [{'value', 'count'}]} for the filter columns, in sorted value order."""
+        facets = {}
+        for col in self.filter_columns:
+            counts = np.bincount(self._codes[col][self._codes[col] >= 0], minlength=len(self._values[col]))
+            facets[col] = [{'value': _plain(v), 'count': int(n)} for v, n in zip(self._values[col], counts)]
+        return facets
+
+    def _check(self, df):
+        if len(df) != self.size or list(df.columns) != self.columns:
+            raise ValueError("The frame does not match the dataset version this index was built from.")
+
+    def order(self, df, column, descending=False):
+        """
+        Row positions of `df` sorted by `column` (missing values last), computed once per
+        column and direction.
+        """
+        key = (column, descending)
+        with self._lock:
+            if key in self._orders:
+                return self._orders[key]
+        self._check(df)
+        series = df[column].reset_index(drop=True)
+        order = series.sort_values(ascending=not descending, kind='stable', na_position='last').index.to_numpy()
+        with self._lock:
+            self._orders[key] = order
+        return order
+
+    def _mask(self, filters):
+        mask = None
+        for col, wanted in filters.items():
+            lookup = {str(v): i for i, v in enumerate(self._values[col])}
+            allowed = np.zeros(len(self._values[col]) + 1, dtype=bool)  # last slot is for missing (-1)
+            allowed[[lookup[w] for w in wanted if w in lookup]] = True
+            column_mask = allowed[self._codes[col]]
+            mask = column_mask if mask is None else mask & column_mask
+        return mask
+
+    def selection(self, df, filters=None, sort=None, descending=False):
+        """
+        Row positions of `df` matching `filters` ({column: [value as string, ...]}, values OR-ed
+        within a column, columns AND-ed) in `sort` order; original order when `sort` is None.
+        """
+        filters = {col: sorted(set(values)) for col, values in (filters or {}).items() if values}
+        unknown = [c for c in filters if c not in self.filter_columns]
+        if unknown:
+            raise KeyError(f"Cannot filter on: {', '.join(unknown)}")
+        if sort is not None and sort not in self.columns:
+            raise KeyError(f"Unknown sort column: {sort}")
+        key = (tuple(sorted((c, tuple(v)) for c, v in filters.items())), sort, descending)
+        with self._lock:
+            if key in self._selections:
+                self._selections.move_to_end(key)
+                return self._selections[key]
+        order = self.order(df, sort, descending) if sort is not None else np.arange(self.size)
+        mask = self._mask(filters)
+        selected = order if mask is None else order[mask[order]]
+        with self._lock:
+            self._selections[key] = selected
+            while len(self._selections) > ROW_SELECTION_CACHE_SIZE:
+                self._selections.popitem(last=False)
+        return selected
+
+    def page(self, df, offset=0, limit=100, filters=None, sort=None, descending=False):
+        """
+        Returns {'total', 'offset', 'columns', 'rows'} with at most `limit` rows of `df` (the
+        frame of this index's dataset version) as lists of plain values.
+        """
+        self._check(df)
+        limit = max(0, min(int(limit), MAX_PAGE_SIZE))
+        offset = max(0, int(offset))
+        selected = self.selection(df, filters, sort, descending)
+        rows = df.iloc[selected[offset:offset + limit]]
+        return {'total': int(len(selected)), 'offset': offset, 'columns': [str(c) for c in self.columns],
+                'rows': [[_plain(v) for v in row] for row in rows.astype(object).values.tolist()]}
+
+
+def _plain(value):
+    """JSON-friendly form of a cell value."""
+    if value is None or (isinstance(value, float) and np.isnan(value)) or value is pd.NaT:
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.isoformat()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+
+def get_row_index(df: pd.DataFrame, dataset_version):
+    """Returns the RowIndex for `dataset_version`, building it from `df` on first use in this worker."""
+    with _lock:
+        if dataset_version in _indexes:
+            _indexes.move_to_end(dataset_version)
+            return _indexes[dataset_version]
+    with span('row_index.build'):
+        index = RowIndex(df)
+    with _lock:
+        _indexes[dataset_version] = index
+        while len(_indexes) > ROW_INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
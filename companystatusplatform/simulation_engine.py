@@ -0,0 +1,206 @@
+# simulation_engine.py
+import json
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from config import SIMULATION_DEFAULT_ELASTICITY
+
+# A scenario is a plain dict:
+#   price_change  {product or '*': fraction}   e.g. {'Smartphone': 0.10}
+#   elasticity    {market or '*': elasticity}  e.g. {'North': -0.5, 'South': -0.8}
+#   volume_shock  {product or '*': fraction}   e.g. {'Laptop': -0.05}
+#   cost_change   fraction applied to unit cost (Sales - Profit)
+# Units respond linearly to price: volume = (1 + elasticity * price_change) * (1 + volume_shock).
+
+SEGMENT_COLUMNS = ['Product', 'Market']
+
+_PERCENT = re.compile(r'([+-]?\d+(?:\.\d+)?)\s*%')
+_NUMBER = r'([+-]?\d*\.?\d+)'
+_DOWN_WORDS = ('decrease', 'down', 'cut', 'lower', 'drop', 'fall', 'reduce', 'decline', 'shrink')
+
+
+def empty_scenario():
+    return {'price_change': {}, 'elasticity': {}, 'volume_shock': {}, 'cost_change': 0.0}
+
+
+def is_empty(scenario):
+    return not (scenario['price_change'] or scenario['volume_shock'] or scenario['cost_change'])
+
+
+def _mentions(clause, names):
+    return [n for n in names if re.search(rf'\b{re.escape(str(n).lower())}\b', clause)]
+
+
+def _signed_percent(clause):
+    """Returns the clause's percentage as a signed fraction, using direction words if unsigned."""
+    match = _PERCENT.search(clause)
+    if not match:
+        return None
+    text = match.group(1)
+    value = float(text) / 100
+    if text[0] in '+-':
+        return value
+    words = re.findall(r'[a-z]+', clause)
+    if any(w.startswith(_DOWN_WORDS) for w in words):
+        return -value
+    return value
+
+
+def _json_number(value, what):
+    """`value` as a finite float; raises ValueError naming `what` for anything else."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not np.isfinite(value):
+        raise ValueError(f"{what} must be a number, not {json.dumps(value)}")
+    return float(value)
+
+
+def _json_mapping(data, key):
+    mapping = data.get(key)
+    if mapping is None:
+        return {}
+    if not isinstance(mapping, dict):
+        raise ValueError(f"'{key}' must map names to numbers, e.g. {{\"Laptop\": 0.1}}")
+    return {str(k): _json_number(v, f"'{key}' of '{k}'") for k, v in mapping.items()}
+
+
+def parse_scenario(text, products=(), markets=()):
+    """
+    Parses a scenario from JSON (same shape as `empty_scenario()`) or from short clauses
+    separated by ';' or new lines, for example:
+
+        Smartphone price +10%; elasticity North -0.5 South -0.8; Laptop volume -5%; cost up 3%
+
+    Raises ValueError for malformed JSON or values that are not numbers.
+    """
+    scenario = empty_scenario()
+    text = (text or '').strip()
+    if text.startswith('{'):
+        data = json.loads(text)
+        if not isinstance(data, dict):
+            raise ValueError("A JSON scenario must be an object")
+        for key in ('price_change', 'elasticity', 'volume_shock'):
+            scenario[key] = _json_mapping(data, key)
+        cost_change = data.get('cost_change')
+        scenario['cost_change'] = 0.0 if cost_change is None else _json_number(cost_change, "'cost_change'")
+        return scenario
+
+    for clause in re.split(r'[;\n]+', text.lower()):
+        clause = clause.strip()
+        if not clause:
+            continue
+        if 'elasticity' in clause:
+            named = _mentions(clause, markets)
+            for market in named:
+                match = re.search(rf'\b{re.escape(str(market).lower())}\b\s*[=:]?\s*{_NUMBER}', clause)
+                if match:
+                    scenario['elasticity'][str(market)] = float(match.group(1))
+            if not named:
+                match = re.search(rf'elasticity\s*(?:of)?\s*[=:]?\s*{_NUMBER}', clause)
+                if match:
+                    scenario['elasticity']['*'] = float(match.group(1))
+            continue
+        change = _signed_percent(clause)
+        if change is None:
+            continue
+        targets = [str(p) for p in _mentions(clause, products)] or ['*']
+        if 'cost' in clause:
+            scenario['cost_change'] = change
+        elif any(w in clause for w in ('volume', 'demand', 'units', 'quantity')):
+            scenario['volume_shock'].update({t: change for t in targets})
+        elif 'price' in clause:
+            scenario['price_change'].update({t: change for t in targets})
+    return scenario
+
+
+def _per_row(labels, mapping, default):
+    """Maps a (categorical) label column to floats in one vectorized pass."""
+    values = pd.Series(labels).astype(object).map({k: v for k, v in mapping.items() if k != '*'})
+    return values.fillna(mapping.get('*', default)).to_numpy(dtype='float64')
+
+
+def apply_scenario(frame: pd.DataFrame, scenario):
+    """
+    Applies `scenario` to every row of `frame` (raw rows or the cube's base cells) and
+    returns a copy with 'New Sales' and 'New Profit' columns.
+    """
+    sales = frame['Sales'].to_numpy(dtype='float64')
+    profit = frame['Profit'].to_numpy(dtype='float64')
+    cost = sales - profit
+
+    price = _per_row(frame['Product'], scenario['price_change'], 0.0)
+    elasticity = _per_row(frame['Market'], scenario['elasticity'], SIMULATION_DEFAULT_ELASTICITY)
+    shock = _per_row(frame['Product'], scenario['volume_shock'], 0.0)
+
+    volume = np.clip(1 + elasticity * price, 0, None) * (1 + shock)
+    new_sales = sales * (1 + price) * volume
+    new_cost = cost * volume * (1 + scenario['cost_change'])
+
+    out = frame.copy()
+    out['New Sales'] = new_sales
+    out['New Profit'] = new_sales - new_cost
+    return out
+
+
+def simulate(frame: pd.DataFrame, scenario, by=SEGMENT_COLUMNS):
+    """
+    Runs `scenario` and returns {'segments': DataFrame, 'totals': dict, 'elapsed_ms': float}
+    with per-segment Sales/Profit before and after plus absolute and % deltas.
+
+    Every factor depends only on Product and Market, so passing the rollup cube's base
+    table gives the same totals as the raw rows at a fraction of the cost.
+    """
+    started = time.perf_counter()
+    applied = apply_scenario(frame, scenario)
+    by = [c for c in by if c in applied.columns]
+    columns = ['Sales', 'New Sales', 'Profit', 'New Profit']
+    segments = applied.groupby(by, observed=True)[columns].sum().reset_index()
+    segments = _with_deltas(segments)
+    totals = _with_deltas(segments[columns].sum().to_frame().T).iloc[0].to_dict()
+    return {'segments': segments, 'totals': totals, 'elapsed_ms': (time.perf_counter() - started) * 1000}
+
+
+def _with_deltas(table):
+    for measure in ('Sales', 'Profit'):
+        delta = table[f'New {measure}'] - table[measure]
+        table[f'{measure} Change'] = delta
+        base = table[measure].where(table[measure] != 0)
+        table[f'{measure} Change %'] = (delta / base.abs() * 100).fillna(0.0)
+    return table
+
+
+def run_scenario_text(cube, scenario_text):
+    """
+    Parses `scenario_text` against the cube's Product/Market values and simulates it on
+    the cube's base cells. Returns None if the text contains no recognizable change.
+    """
+    if not all(c in cube.base().columns for c in SEGMENT_COLUMNS + ['Sales', 'Profit']):
+        return None
+    products = cube.frame(['Product'])['Product'].tolist()
+    markets = cube.frame(['Market'])['Market'].tolist()
+    scenario = parse_scenario(scenario_text, products, markets)
+    if is_empty(scenario):
+        return None
+    result = simulate(cube.base(), scenario)
+    result['scenario'] = scenario
+    return result
+
+
+def format_result(result, scenario_text, timing=True):
+    """Renders a simulation result as markdown for the dashboard and reports."""
+    lines = [f"**Scenario Simulated:** *{scenario_text}*", "", "**Result:**", "",
+             "| Segment | Sales | Sales Change | Profit | Profit Change |",
+             "|---|---|---|---|---|"]
+    for row in result['segments'].to_dict('records'):
+        segment = ' / '.join(str(row[c]) for c in SEGMENT_COLUMNS if c in row)
+        lines.append(_format_row(segment, row))
+    lines.append(_format_row('**Total**', result['totals']))
+    if timing:
+        lines += ["", f"*Computed in {result['elapsed_ms']:.1f} ms.*"]
+    return "\n".join(lines)
+
+
+def _format_row(label, row):
+    return (f"| {label} | {row['New Sales']:,.0f} | {row['Sales Change']:+,.0f} ({row['Sales Change %']:+.2f}%) "
+            f"| {row['New Profit']:,.0f} | {row['Profit Change']:+,.0f} ({row['Profit Change %']:+.2f}%) |")
@@ -0,0 +1,110 @@
+# startup.py
+import multiprocessing
+import threading
+import time
+
+from flask import jsonify
+
+from config import STARTUP_WARM_UP
+from tracing import set_gauge
+
+# Worker boot timing and background warm-up. The app modules import plotly, openai,
+# chromadb, markdown and BeautifulSoup on first use rather than at import, so a worker can
+# serve requests as soon as Flask and the data layer are loaded. `mark(phase)` records the
+# boot phases (seconds since this module was imported, i.e. the start of the app's
+# imports); `warm_up(name, fn)` queues work that would otherwise land on the first request
+# (plotly templates, the sample workbook, the LLM client) for a background thread.
+#
+# The report is printed once the warm-up has finished, served at /debug/startup and
+# exported as the companystatus_startup_seconds gauge on /metrics.
+
+_started = time.perf_counter()
+_lock = threading.Lock()
+_phases = []     # [(phase, seconds since start)]
+_tasks = []      # [{'name', 'fn', 'done' (Event), 'seconds', 'error'}]
+_thread = None
+
+
+def mark(phase):
+    """Records that boot phase `phase` ended now."""
+    elapsed = time.perf_counter() - _started
+    with _lock:
+        _phases.append((phase, elapsed))
+    set_gauge('startup_seconds', elapsed, phase=phase)
+
+
+def warm_up(name, fn):
+    """Queues `fn()` to run on the warm-up thread (or inline when STARTUP_WARM_UP is off)."""
+    task = {'name': name, 'fn': fn, 'done': threading.Event(), 'seconds': None, 'error': None}
+    with _lock:
+        _tasks.append(task)
+    if not STARTUP_WARM_UP:
+        _run(task)
+
+
+def _run(task):
+    started = time.perf_counter()
+    try:
+        task['fn']()
+    except Exception as e:  # warm-up is an optimization; the first real use retries
+        task['error'] = str(e)
+        print(f"Warm-up of {task['name']} failed: {e}")
+    finally:
+        task['seconds'] = time.perf_counter() - started
+        task['done'].set()
+        set_gauge('warm_up_seconds', task['seconds'], task=task['name'])
+
+
+def _warm_all():
+    for task in list(_tasks):
+        if not task['done'].is_set():
+            _run(task)
+    mark('warm')
+    print(format_report())
+
+
+def start():
+    """Starts the warm-up thread; call once the app is created (see mark('app'))."""
+    global _thread
+    if multiprocessing.parent_process() is not None:
+        return  # a process-pool child re-importing the app module serves no requests
+    with _lock:
+        if _thread is not None:
+            return
+        _thread = threading.Thread(target=_warm_all, name='warm-up', daemon=True)
+    _thread.start()
+
+
+def wait(name, timeout=None):
+    """Blocks until warm-up task `name` has run; returns False if it is still running after `timeout`."""
+    with _lock:
+        tasks = [t for t in _tasks if t['name'] == name]
+    return all(t['done'].wait(timeout) for t in tasks)
+
+
+def report():
+    """Boot phases and warm-up tasks of this worker, in seconds."""
+    with _lock:
+        phases = list(_phases)
+        tasks = list(_tasks)
+    return {'phases': [{'phase': phase, 'seconds': round(seconds, 4)} for phase, seconds in phases],
+            'warm_up': [{'task': t['name'], 'done': t['done'].is_set(),
+                         'seconds': None if t['seconds'] is None else round(t['seconds'], 4),
+                         'error': t['error']} for t in tasks]}
+
+
+def format_report():
+    data = report()
+    phases = ', '.join(f"{p['phase']} {p['seconds']:.2f}s" for p in data['phases'])
+    tasks = ', '.join(f"{t['task']} {t['seconds']:.2f}s" + (' (failed)' if t['error'] else '')
+                      for t in data['warm_up'] if t['done'])
+    return f"Startup: {phases}" + (f"; warm-up: {tasks}" if tasks else '')
+
+
+def startup_view():
+    return jsonify(report())
+
+
+def init_app(app):
+    """Serves the startup report at /debug/startup."""
+    app.add_url_rule('/debug/startup', 'debug_startup', startup_view)
@@ -0,0 +1,80 @@
+# static_assets.py
+import hashlib
+import os
+import threading
+
+import pandas as pd
+from flask import current_app, request, url_for
+
+from config import ASSET_MAX_AGE
+from dataset_store import atomic_write
+
+# Static files are referenced through `asset_url(filename)` in templates, which appends a
+# short content hash (?v=...) to the URL. Responses for such versioned URLs are marked
+# cacheable for ASSET_MAX_AGE and immutable, so browsers fetch plotly.js and friends once
+# per release instead of revalidating them on every page; a changed file gets a new URL.
+# Generated assets (the sample workbook) are written once at startup, and only when their
+# content actually differs from what is on disk.
+
+_fingerprints = {}
+_lock = threading.Lock()
+
+
+def fingerprint(path):
+    """Short content hash of the file at `path`, recomputed only when its size or mtime changes."""
+    stat = os.stat(path)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _fingerprints.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    version = digest.hexdigest()[:12]
+    with _lock:
+        _fingerprints[path] = (stamp, version)
+    return version
+
+
+def asset_url(filename):
+    """URL of static/`filename` with its content fingerprint; the plain URL if the file is missing."""
+    try:
+        version = fingerprint(os.path.join(current_app.static_folder, filename))
+    except OSError:
+        return url_for('static', filename=filename)
+    return url_for('static', filename=filename, v=version)
+
+
+def _cache_versioned(response):
+    if request.endpoint == 'static' and 'v' in request.args and response.status_code in (200, 304):
+        response.cache_control.public = True
+        response.cache_control.max_age = ASSET_MAX_AGE
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
+    return response
+
+
+def init_app(app):
+    """Registers `asset_url` for templates and long-lived caching of fingerprinted static URLs."""
+    app.add_template_global(asset_url)
+    app.after_request(_cache_versioned)
+
+
+def ensure_excel(path, df: pd.DataFrame):
+    """Writes `df` to the xlsx at `path` unless the file already holds the same data."""
+    if os.path.exists(path):
+        try:
+            if pd.read_excel(path).equals(df):
+                return path
+        except Exception:  # unreadable or partial file: rewrite it
+            pass
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def write(tmp_path):
+        with open(tmp_path, 'wb') as f:  # a file object, since the temp name has no .xlsx extension
+            df.to_excel(f, index=False, engine='openpyxl')
+
+    atomic_write(path, write)
+    return path
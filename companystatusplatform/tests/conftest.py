@@ -0,0 +1,36 @@
+# conftest.py
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# The app modules import flat (e.g. `from config import ...`) from the app directory, and
+# config.py reads DATA_DIR at import, so point it at a scratch directory before any test
+# module imports the app
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_DIR)
+_data_dir = tempfile.mkdtemp(prefix='companystatus_tests_')
+os.environ.setdefault('DATA_DIR', _data_dir)
+os.environ.setdefault('CHROMA_DB_PATH', os.path.join(_data_dir, 'chroma_db'))
+
+
+def make_frame(rows=500, seed=0):
+    """Synthetic dataset with the app's columns, some missing values and a downcast measure."""
+    rng = np.random.default_rng(seed)
+    sales = rng.integers(500, 20000, rows)
+    df = pd.DataFrame({'Product': rng.choice(['Laptop', 'Smartphone', 'Tablet'], rows),
+                       'Market': rng.choice(['North', 'South', 'East', 'West'], rows),
+                       'Zone': rng.choice(['Zone A', 'Zone B'], rows),
+                       'Sales': sales,
+                       'Profit': (sales * rng.uniform(0.05, 0.3, rows)).round(2),
+                       'Year': rng.choice([2022, 2023, 2024], rows)})
+    df.loc[df.index % 17 == 0, 'Profit'] = np.nan
+    return df
+
+
+@pytest.fixture
+def frame():
+    return make_frame()
@@ -0,0 +1,114 @@
+import json
+
+import numpy as np
+import pytest
+
+import batch_simulation
+from batch_simulation import (PERCENTILES, draw_monte_carlo, expand_grid, parse_batch_spec, percentile_bands,
+                              run_batch)
+from rollup import RollupCube
+from simulation_engine import simulate
+
+
+def test_expand_grid_is_the_cartesian_product():
+    columns, n_scenarios = expand_grid({'price_change.*': [0.0, 0.1, 0.2], 'cost_change': [-0.01, 0.01]})
+    assert n_scenarios == 6
+    pairs = list(zip(columns['price_change.*'], columns['cost_change']))
+    assert pairs == [(p, c) for p in (0.0, 0.1, 0.2) for c in (-0.01, 0.01)]
+
+
+@pytest.mark.parametrize('grid', [{'cost_change': []}, {'cost_change': [[0.1, 0.2]]}, ['cost_change']])
+def test_expand_grid_rejects_bad_axes(grid):
+    with pytest.raises(ValueError):
+        expand_grid(grid)
+
+
+def test_expand_grid_enforces_the_scenario_cap(monkeypatch):
+    monkeypatch.setattr(batch_simulation, 'BATCH_MAX_SCENARIOS', 10)
+    with pytest.raises(ValueError):
+        expand_grid({'cost_change': list(range(4)), 'price_change.*': list(range(3))})
+
+
+def test_monte_carlo_draws_are_seeded():
+    spec = {'draws': 2000, 'seed': 7, 'distributions': {
+        'price_change.*': {'dist': 'normal', 'mean': 0.05, 'sd': 0.01},
+        'cost_change': {'dist': 'uniform', 'low': -0.02, 'high': 0.02},
+        'elasticity.North': {'dist': 'triangular', 'low': -1.0, 'mode': -0.5, 'high': -0.2}}}
+    columns, draws = draw_monte_carlo(spec)
+    again, _ = draw_monte_carlo(spec)
+    assert draws == 2000 and all(len(values) == draws for values in columns.values())
+    for path in columns:
+        np.testing.assert_array_equal(columns[path], again[path])
+    assert abs(columns['price_change.*'].mean() - 0.05) < 0.002
+    assert -0.02 <= columns['cost_change'].min() and columns['cost_change'].max() <= 0.02
+    assert -1.0 <= columns['elasticity.North'].min() and columns['elasticity.North'].max() <= -0.2
+
+
+@pytest.mark.parametrize('spec', [{'draws': 0}, {'distributions': {'cost_change': {'dist': 'poisson'}}}])
+def test_monte_carlo_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        draw_monte_carlo(spec)
+
+
+def test_parse_batch_spec_rejects_unknown_parameters(frame):
+    cells = batch_simulation.cells_from_cube(RollupCube(frame))
+    with pytest.raises(ValueError):
+        parse_batch_spec({'grid': {'price_change.Toaster': [0.1]}}, cells)
+    with pytest.raises(ValueError):
+        parse_batch_spec({}, cells)
+
+
+def test_percentile_bands_match_numpy():
+    rng = np.random.default_rng(1)
+    values = rng.normal(100, 10, (1000, 3))
+    baseline = np.array([100.0, 90.0, 110.0])
+    bands = percentile_bands(values, baseline)
+    for p in PERCENTILES:
+        expected = np.percentile(values, p, axis=0)
+        np.testing.assert_allclose(bands['value'][f'p{p}'], np.round(expected, 2))
+        np.testing.assert_allclose(bands['change'][f'p{p}'], np.round(expected - baseline, 2))
+
+
+def test_grid_scenarios_match_the_single_scenario_engine(frame):
+    cube = RollupCube(frame)
+    grid = {'price_change.Laptop': [0.0, 0.1], 'elasticity.North': [-0.5, -1.0], 'cost_change': [0.02]}
+    lines = [json.loads(line) for line in run_batch(cube, {'grid': grid})]
+    assert lines[0]['type'] == 'start' and lines[-1]['type'] == 'summary'
+    scenarios = [s for line in lines if line['type'] == 'chunk' for s in line['scenarios']]
+    assert len(scenarios) == 4
+    for s in scenarios:
+        single = simulate(cube.base(), {'price_change': {'Laptop': s['price_change.Laptop']},
+                                        'elasticity': {'North': s['elasticity.North']},
+                                        'volume_shock': {}, 'cost_change': s['cost_change']})
+        assert s['sales'] == pytest.approx(single['totals']['New Sales'], abs=0.01)
+        assert s['profit'] == pytest.approx(single['totals']['New Profit'], abs=0.01)
+
+
+@pytest.mark.parametrize('spec', [
+    [1],
+    {'base': [1], 'grid': {'cost_change': [0.1]}},
+    {'base': {'price_change': 0.1}, 'grid': {'cost_change': [0.1]}},
+    {'grid': 5},
+    {'monte_carlo': [1]},
+    {'monte_carlo': {'distributions': [1]}},
+    {'monte_carlo': {'distributions': {'cost_change': 5}}},
+])
+def test_malformed_specs_raise_value_error(frame, spec):
+    cells = batch_simulation.cells_from_cube(RollupCube(frame))
+    with pytest.raises(ValueError):
+        parse_batch_spec(spec, cells)
+
+
+def test_batch_route_answers_malformed_specs_with_400(frame):
+    import app1
+    from dataset_store import store
+    store.put('batch-route', frame)
+    client = app1.app.test_client()
+    with client.session_transaction() as session:
+        session['dataset_id'] = 'batch-route'
+    for spec in ({'base': [1], 'grid': {'cost_change': [0.1]}}, {'monte_carlo': {'distributions': {'cost_change': 5}}}):
+        response = client.post('/simulate/batch', json=spec)
+        assert response.status_code == 400 and 'must be an object' in response.get_json()['error']
+    response = client.post('/simulate/batch', json={'grid': {'cost_change': [0.0, 0.1]}})
+    assert response.status_code == 200
+    assert json.loads(response.get_data(as_text=True).splitlines()[-1])['type'] == 'summary'
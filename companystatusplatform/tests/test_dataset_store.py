@@ -0,0 +1,73 @@
+import multiprocessing
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from dataset_store import DatasetStore, compact_frame, concat_frames
+
+
+@pytest.fixture
+def store(tmp_path):
+    return DatasetStore(str(tmp_path / 'datasets'), memory_budget_bytes=10 ** 9, max_age_seconds=3600)
+
+
+def test_frames_round_trip_through_the_spill(tmp_path, store, frame):
+    store.put('a', frame)
+    reloaded = DatasetStore(store.spill_dir).get('a')  # another worker: nothing in memory
+    pd.testing.assert_frame_equal(reloaded, compact_frame(frame), check_categorical=False)
+    assert store.get('missing') is None and store.get(None) is None
+
+
+def test_memory_budget_evicts_least_recently_used(tmp_path, frame):
+    store = DatasetStore(str(tmp_path / 'datasets'), memory_budget_bytes=1)
+    store.put('a', frame)
+    store.put('b', frame)
+    assert store.memory_usage()[0] == 1
+    assert store.get('a') is not None  # reloaded from disk
+
+
+def test_drop_removes_frame_and_state(store, frame):
+    store.put('a', frame)
+    store.update_state('a', insights='x')
+    store.drop('a')
+    assert store.get('a') is None and store.get_state('a') == {}
+    assert os.listdir(store.spill_dir) == []
+
+
+def test_prune_drops_datasets_nobody_opened(store, frame):
+    store.put('old', frame)
+    store.update_state('old', insights='x')
+    past = time.time() - 7200
+    for name in os.listdir(store.spill_dir):
+        os.utime(os.path.join(store.spill_dir, name), (past, past))
+    store._touched.clear()
+    store.put('new', frame)
+    assert store.get('old') is None and store.get_state('old') == {}
+    assert store.get('new') is not None
+
+
+def test_concat_frames_keeps_categoricals():
+    a = compact_frame(pd.DataFrame({'Product': ['Laptop'] * 4, 'Sales': [1, 2, 3, 4]}))
+    b = compact_frame(pd.DataFrame({'Product': ['Tablet'] * 4, 'Sales': [5, 6, 7, 8]}))
+    combined = concat_frames([a, b])
+    assert isinstance(combined['Product'].dtype, pd.CategoricalDtype)
+    assert list(combined['Product']) == ['Laptop'] * 4 + ['Tablet'] * 4
+
+
+def _update_fields(spill_dir, worker, count):
+    store = DatasetStore(spill_dir)
+    for i in range(count):
+        store.update_state('shared', **{f"{worker}_{i}": i})
+
+
+def test_state_updates_from_several_processes_are_not_lost(store):
+    context = multiprocessing.get_context('spawn')
+    workers = [context.Process(target=_update_fields, args=(store.spill_dir, worker, 25)) for worker in range(3)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+    assert [process.exitcode for process in workers] == [0, 0, 0]
+    assert len(store.get_state('shared')) == 75
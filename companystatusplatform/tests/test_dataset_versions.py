@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+from conftest import make_frame
+from dataset_store import store
+from dataset_versions import append_version, diff_versions, validate_delta, version_entry
+from rollup import RollupCube, get_cube
+
+
+def _sorted(table, by):
+    return table.sort_values(by).reset_index(drop=True) if by else table.reset_index(drop=True)
+
+
+@pytest.mark.parametrize('by', [[], ['Product'], ['Market', 'Year'], ['Product', 'Market', 'Zone', 'Year']])
+def test_appended_cube_matches_a_full_rebuild(by):
+    old, delta = make_frame(400, seed=1), make_frame(150, seed=2)
+    # The delta brings a product and a year the old rows never had
+    delta.loc[:9, 'Product'] = 'Monitor'
+    delta.loc[10:19, 'Year'] = 2025
+    appended = RollupCube(old).appended(delta)
+    rebuilt = RollupCube(pd.concat([old, delta], ignore_index=True))
+
+    assert appended.row_count == rebuilt.row_count == 550
+    pd.testing.assert_frame_equal(_sorted(appended.frame(by), by), _sorted(rebuilt.frame(by), by),
+                                  check_dtype=False, check_categorical=False)
+    for filters in ({}, {'Product': 'Monitor'}, {'Market': 'North', 'Year': 2025}):
+        got, expected = appended.query(**filters), rebuilt.query(**filters)
+        assert got == pytest.approx(expected)
+
+
+def test_validate_delta_rejects_other_columns_and_types(frame):
+    with pytest.raises(ValueError, match='missing columns: Zone'):
+        validate_delta(frame, frame.drop(columns=['Zone']))
+    with pytest.raises(ValueError, match='Sales'):
+        validate_delta(frame, frame.assign(Sales='many'))
+    reordered = validate_delta(frame, frame[list(reversed(frame.columns))])
+    assert list(reordered.columns) == list(frame.columns)
+
+
+def test_append_version_stores_rows_cube_and_lineage():
+    parent, delta = make_frame(200, seed=6), make_frame(50, seed=7)
+    store.put('parent', parent)
+    store.update_state('parent', content_hash='v1', versions=[version_entry(1, 'parent', 'v1', 200, 200, 'a.csv')])
+
+    combined = append_version('parent', 'child', delta, 'delta-digest', 'b.csv')
+    state = store.get_state('child')
+    assert len(combined) == 250 and len(store.get('child')) == 250
+    assert [v['version'] for v in state['versions']] == [1, 2]
+    assert get_cube(combined, state['content_hash']).query()['count'] == 250
+
+    diff = diff_versions(state['versions'], 1, 2, by=['Product'])
+    assert diff['rows_added'] == 50
+    with pytest.raises(KeyError):
+        diff_versions(state['versions'], 1, 3)
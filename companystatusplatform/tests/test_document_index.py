@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip('chromadb')
+
+import document_index  # noqa: E402
+
+ACME_NEWS = [{'source': 'News', 'url': 'https://example.com/acme',
+              'text': "Acme laptop sales grew 12% in the North market.\n\nAcme cut prices on tablets."}]
+GLOBEX_NEWS = [{'source': 'News', 'url': 'https://example.com/globex',
+                'text': "Globex smartphone revenue fell as competitors launched cheaper models."}]
+QUESTIONS = ['How are sales and revenue trending?', 'What are competitors doing on price?']
+
+
+def texts(passages):
+    return {passage['text'] for passage in passages}
+
+
+def test_companies_sharing_a_name_do_not_share_passages():
+    document_index.index_documents('Default Company', '1111', ACME_NEWS)
+    document_index.index_documents('Default Company', '2222', GLOBEX_NEWS)
+    acme = document_index.retrieve('Default Company', '1111', QUESTIONS)
+    globex = document_index.retrieve('Default Company', '2222', QUESTIONS)
+    assert texts(acme) == set(ACME_NEWS[0]['text'].split('\n\n'))
+    assert texts(globex) == {GLOBEX_NEWS[0]['text']}
+    assert all(passage['url'] == 'https://example.com/acme' for passage in acme)
+    assert document_index.retrieve('Default Company', '3333', QUESTIONS) == []
+
+
+def test_reindexing_only_adds_new_chunks():
+    assert document_index.index_documents('Initech', '4444', ACME_NEWS) == (2, 0)
+    assert document_index.index_documents('Initech', '4444', ACME_NEWS + GLOBEX_NEWS) == (1, 2)
+    assert document_index.index_documents('Initech', '5555', ACME_NEWS) == (2, 0)
+
+
+def test_passages_are_ordered_by_relevance():
+    document_index.index_documents('Umbrella', '6666', ACME_NEWS)
+    passages = document_index.retrieve('Umbrella', '6666', ['Did Acme cut prices on tablets?'])
+    assert passages[0]['text'] == 'Acme cut prices on tablets.'
+    assert [p['distance'] for p in passages] == sorted(p['distance'] for p in passages)
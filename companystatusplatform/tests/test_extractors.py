@@ -0,0 +1,60 @@
+import pytest
+
+from extractors import EXTRACTORS, get_extractor, prices_to_numbers
+
+LISTING = """<html><body><ol>
+<li><article class="product_pod"><h3><a href="a.html" title="A Light in the Attic">A Light...</a></h3>
+  <div class="product_price"><p class="price_color">£51.77</p></div></article></li>
+<li><article class="product_pod featured"><h3><a href="b.html" title="Tipping the Velvet">Tipping...</a></h3>
+  <div class="product_price"><p class="price_color"> £53.74 </p></div></article></li>
+<li><article class="product_pod"><h3><a href="c.html">No title attribute</a></h3></article></li>
+</ol>
+<ul class="pager"><li class="current">Page 2 of 50</li><li class="next"><a href="page-3.html">next</a></li></ul>
+</body></html>"""
+
+LAST_PAGE = """<html><body><article class="product_pod"><h3><a title="Only">Only</a></h3>
+<p class="price_color">£10.00</p></article><ul class="pager"><li class="current">Page 50 of 50</li></ul></body></html>"""
+
+PRODUCT = """<html><body><div class="product_main"><h1> Sharp Objects </h1>
+<p class="price_color">£47.82</p><p class="price_color">£1.00</p></div></body></html>"""
+
+
+@pytest.fixture(params=sorted(EXTRACTORS))
+def extractor(request):
+    return get_extractor(request.param)
+
+
+def test_listing(extractor):
+    rows, (next_href, position) = extractor['listing'](LISTING.encode('utf-8'))
+    assert rows == [{'Name': 'A Light in the Attic', 'Price': '£51.77'},
+                    {'Name': 'Tipping the Velvet', 'Price': '£53.74'},
+                    {'Name': 'N/A', 'Price': 'N/A'}]
+    assert (next_href, position) == ('page-3.html', (2, 50))
+
+
+def test_last_listing_page_has_no_next_link(extractor):
+    rows, (next_href, position) = extractor['listing'](LAST_PAGE)
+    assert rows == [{'Name': 'Only', 'Price': '£10.00'}]
+    assert (next_href, position) == (None, (50, 50))
+
+
+def test_product(extractor):
+    assert extractor['product'](PRODUCT.encode('utf-8')) == ('Sharp Objects', '£47.82')
+    assert extractor['product']('<html><body></body></html>') == ('N/A', 'N/A')
+
+
+def test_backends_agree():
+    if len(EXTRACTORS) < 2:
+        pytest.skip("only one HTML backend is installed")
+    results = {name: backend['listing'](LISTING) for name, backend in EXTRACTORS.items()}
+    assert len({repr(result) for result in results.values()}) == 1
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        get_extractor('html5lib')
+
+
+def test_prices_to_numbers():
+    assert prices_to_numbers(['£51.77', ' $1,200 ', 'N/A', '']) == [51.77, 1200.0, None, None]
+    assert prices_to_numbers(['£1.2.3', '£2.50']) == [None, 2.5]
@@ -0,0 +1,86 @@
+import asyncio
+import os
+
+import pytest
+
+import http_cache
+from http_cache import cached_get
+
+
+class FakeResponse:
+    def __init__(self, status_code, content=b'', url='', headers=None):
+        self.status_code, self.content, self.url, self.headers = status_code, content, url, headers or {}
+
+
+class FakeServer:
+    """A page with an ETag; answers 304 to a matching If-None-Match."""
+
+    def __init__(self, body=b'<h1>Widget</h1>', etag='"v1"'):
+        self.body, self.etag, self.requests, self.down = body, etag, [], False
+
+    async def fetch(self, url, headers=None):
+        self.requests.append(dict(headers or {}))
+        if self.down:
+            return None, 'connection refused'
+        if (headers or {}).get('If-None-Match') == self.etag:
+            return FakeResponse(304, url=url), None
+        return FakeResponse(200, self.body, url, {'ETag': self.etag}), None
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, 'SCRAPE_CACHE_DIR', str(tmp_path))
+
+
+def _get(server, kind='title', url='https://shop.example/widget'):
+    return asyncio.run(cached_get(url, kind, lambda content, final_url: content.decode('utf-8').upper(),
+                                  server.fetch))
+
+
+def _expire(url='https://shop.example/widget'):
+    entry = http_cache.load(url)
+    entry['fetched_at'] = 0
+    http_cache._save_meta(url, entry)
+
+
+def test_fresh_entries_skip_the_network():
+    server = FakeServer()
+    assert _get(server)[0] == '<H1>WIDGET</H1>'
+    assert _get(server)[0] == '<H1>WIDGET</H1>'
+    assert len(server.requests) == 1
+
+
+def test_stale_entries_are_revalidated_with_the_etag():
+    server = FakeServer()
+    _get(server)
+    _expire()
+    assert _get(server)[0] == '<H1>WIDGET</H1>'
+    assert server.requests[-1] == {'If-None-Match': '"v1"'}
+    assert http_cache.is_fresh(http_cache.load('https://shop.example/widget'))
+
+
+def test_a_304_parses_a_new_kind_from_the_stored_body():
+    server = FakeServer()
+    _get(server)
+    _expire()
+    assert _get(server, kind='other')[0] == '<H1>WIDGET</H1>'
+    assert server.requests[-1] == {'If-None-Match': '"v1"'}
+
+
+def test_a_304_without_a_stored_body_refetches_in_full():
+    server = FakeServer()
+    _get(server)
+    _expire()
+    os.remove(http_cache._body_path('https://shop.example/widget'))
+    assert _get(server, kind='other')[0] == '<H1>WIDGET</H1>'
+    assert server.requests[-1] == {}
+    assert os.path.exists(http_cache._body_path('https://shop.example/widget'))
+
+
+def test_stale_results_are_served_when_the_source_is_down():
+    server = FakeServer()
+    _get(server)
+    _expire()
+    server.down = True
+    assert _get(server) == ('<H1>WIDGET</H1>', 'https://shop.example/widget', None)
+    assert _get(server, kind='other') == (None, 'https://shop.example/widget', 'connection refused')
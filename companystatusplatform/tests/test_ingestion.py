@@ -0,0 +1,55 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+import ingestion
+from ingestion import ingest_bytes, is_supported_file
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingestion, 'INGEST_CACHE_DIR', str(tmp_path / 'ingest'))
+    return tmp_path / 'ingest'
+
+
+def _xlsx_bytes(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False)
+    return buffer.getvalue()
+
+
+def test_supported_files():
+    assert is_supported_file('Data.XLSX') and is_supported_file('data.csv')
+    assert not is_supported_file('data.txt') and not is_supported_file('')
+
+
+def test_workbook_and_csv_ingest_to_the_same_compact_frame(frame):
+    frame = frame.dropna()
+    _, from_xlsx, _ = ingest_bytes(_xlsx_bytes(frame), 'data.xlsx')
+    _, from_csv, _ = ingest_bytes(frame.to_csv(index=False).encode('utf-8'), 'data.csv')
+    pd.testing.assert_frame_equal(from_xlsx, from_csv)
+    assert isinstance(from_csv['Product'].dtype, pd.CategoricalDtype)
+    assert from_csv['Year'].dtype.itemsize <= 2
+    assert from_csv['Sales'].tolist() == frame['Sales'].tolist()
+
+
+def test_identical_uploads_are_served_from_the_cache(frame, monkeypatch):
+    data = frame.to_csv(index=False).encode('utf-8')
+    digest, first, path = ingest_bytes(data, 'data.csv')
+    assert os.path.exists(path)
+
+    def parse(*args):
+        raise AssertionError("a cached upload must not be parsed again")
+
+    monkeypatch.setattr(ingestion, '_parse', parse)
+    again_digest, again, again_path = ingest_bytes(data, 'renamed.csv')
+    assert (again_digest, again_path) == (digest, path)
+    pd.testing.assert_frame_equal(again, first)
+
+
+def test_cache_is_kept_under_its_size_budget(frame, cache_dir, monkeypatch):
+    monkeypatch.setattr(ingestion, 'INGEST_CACHE_MAX_MB', 0)
+    ingest_bytes(frame.to_csv(index=False).encode('utf-8'), 'a.csv')
+    assert os.listdir(cache_dir) == []
@@ -0,0 +1,96 @@
+import io
+import time
+
+import pytest
+
+import jobs
+
+
+class InlineExecutor:
+    """Runs submitted jobs in the calling thread, so a test sees their effects at once."""
+
+    def submit(self, fn, *args):
+        fn(*args)
+
+
+@pytest.fixture
+def inline_jobs(monkeypatch):
+    jobs._init()
+    monkeypatch.setattr(jobs, '_executor', InlineExecutor())
+
+
+def _register(name, stages, finished=None):
+    jobs.register_pipeline(name, stages, on_finish=finished.append if finished is not None else None)
+
+
+def test_stages_run_in_order_and_share_the_payload(inline_jobs):
+    seen, finished = [], []
+    _register('t_order', [('one', lambda p: seen.append(('one', dict(p))) or {'x': 1}),
+                          ('two', lambda p: seen.append(('two', dict(p))))], finished)
+    job_id = jobs.submit('t_order', {'name': 'acme'})
+    job = jobs.get(job_id)
+    assert job['status'] == jobs.DONE and job['stage'] is None
+    assert [stage['status'] for stage in job['stages'].values()] == [jobs.DONE, jobs.DONE]
+    assert seen == [('one', {'name': 'acme'}), ('two', {'name': 'acme', 'x': 1})]
+    assert finished == [{'name': 'acme', 'x': 1}]
+
+
+def test_a_failed_stage_skips_the_rest(inline_jobs):
+    finished = []
+
+    def fail(payload):
+        raise RuntimeError('no data')
+
+    _register('t_fail', [('parse', fail), ('scrape', lambda p: None)], finished)
+    job = jobs.get(jobs.submit('t_fail', {}))
+    assert job['status'] == jobs.FAILED and job['error'] == 'parse: no data'
+    assert job['stages']['scrape']['status'] == jobs.SKIPPED
+    assert len(finished) == 1
+
+
+def test_cancelling_a_queued_job_releases_it(monkeypatch):
+    jobs._init()
+    monkeypatch.setattr(jobs, '_executor', type('Idle', (), {'submit': lambda self, *args: None})())
+    finished = []
+    _register('t_cancel', [('parse', lambda p: None)], finished)
+    job_id = jobs.submit('t_cancel', {'upload': 'a.csv'})
+    jobs.cancel(job_id)
+    assert jobs.get(job_id)['status'] == jobs.CANCELLED
+    assert finished == [{'upload': 'a.csv'}]
+
+
+def test_resume_restarts_stale_jobs_at_their_first_unfinished_stage(inline_jobs, monkeypatch):
+    runs = []
+    _register('t_resume', [('parse', lambda p: runs.append('parse')), ('scrape', lambda p: runs.append('scrape'))])
+    job_id = jobs.submit('t_resume', {})
+    # Pretend a worker exited in the middle of the scrape stage long ago
+    jobs._update(job_id, status=jobs.RUNNING, stage='scrape',
+                 stages={'parse': {'status': jobs.DONE}, 'scrape': {'status': jobs.RUNNING}})
+    with jobs._connect() as conn:
+        conn.execute("UPDATE jobs SET updated_at = 0 WHERE id = ?", (job_id,))
+    runs.clear()
+    jobs.resume_pending()
+    assert runs == ['scrape'] and jobs.get(job_id)['status'] == jobs.DONE
+
+
+def test_old_finished_jobs_are_pruned(inline_jobs):
+    _register('t_prune', [('parse', lambda p: None)])
+    old, recent = jobs.submit('t_prune', {}), jobs.submit('t_prune', {})
+    with jobs._connect() as conn:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (time.time() - 30 * 24 * 3600, old))
+    jobs.resume_pending()
+    assert jobs.get(old) is None and jobs.get(recent) is not None
+
+
+def test_upload_results_are_not_blanked_by_the_route(inline_jobs, monkeypatch, frame):
+    import app1
+    monkeypatch.setattr(app1, 'scrape_everything', lambda name, cik: f"scraped {name}")
+    client = app1.app.test_client()
+    response = client.post('/upload', data={'file': (io.BytesIO(frame.to_csv(index=False).encode('utf-8')), 'acme.csv'),
+                                            'company_name': 'Acme'})
+    assert response.status_code == 302
+    with client.session_transaction() as session:
+        dataset_id = session['dataset_id']
+    state = app1.store.get_state(dataset_id)
+    assert jobs.get(state['job_id'])['status'] == jobs.DONE
+    assert state['scraped_data_text'] == 'scraped Acme' and state['insights']
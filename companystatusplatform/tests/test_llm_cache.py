@@ -0,0 +1,90 @@
+import pytest
+
+import llm_cache
+from embeddings import HAS_CHROMA
+from llm_cache import cached_completion, cached_stream, dataset_fingerprint
+
+
+@pytest.fixture(autouse=True)
+def cache_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, 'LLM_CACHE_PATH', str(tmp_path / 'llm_cache.sqlite3'))
+    monkeypatch.setattr(llm_cache, '_initialized', False)
+
+
+class Model:
+    def __init__(self, answer='narrative'):
+        self.answer, self.calls = answer, 0
+
+    def create(self):
+        self.calls += 1
+        return self.answer
+
+    def create_stream(self):
+        self.calls += 1
+        yield from self.answer.split(' ')
+
+
+def test_completions_are_cached_by_model_prompt_and_fingerprint():
+    model = Model()
+    assert cached_completion('m', 'prompt', model.create, fingerprint='v1') == 'narrative'
+    assert cached_completion('m', 'prompt', model.create, fingerprint='v1') == 'narrative'
+    assert model.calls == 1
+    cached_completion('m', 'prompt', model.create, fingerprint='v2')
+    cached_completion('other-model', 'prompt', model.create, fingerprint='v1')
+    cached_completion('m', 'other prompt', model.create, fingerprint='v1')
+    assert model.calls == 4
+
+
+def test_failures_are_not_cached():
+    def fail():
+        raise RuntimeError('rate limited')
+
+    with pytest.raises(RuntimeError):
+        cached_completion('m', 'prompt', fail)
+    model = Model()
+    assert cached_completion('m', 'prompt', model.create) == 'narrative' and model.calls == 1
+
+
+def test_streams_are_stored_only_when_read_to_the_end():
+    model = Model('a b c')
+    partial = cached_stream('m', 'prompt', model.create_stream)
+    next(partial)
+    partial.close()
+    assert ''.join(cached_stream('m', 'prompt', model.create_stream)) == 'abc'
+    assert list(cached_stream('m', 'prompt', model.create_stream)) == ['abc']
+    assert model.calls == 2
+
+
+def test_entries_expire_after_the_ttl():
+    llm_cache.put('key', 'm', 'old answer')
+    assert llm_cache.get('key') == 'old answer'
+    assert llm_cache.get('key', ttl=0) is None
+
+
+def test_size_budget_evicts_least_recently_used(monkeypatch):
+    monkeypatch.setattr(llm_cache, 'LLM_CACHE_MAX_MB', 0)
+    llm_cache.put('first', 'm', 'one')
+    llm_cache.put('second', 'm', 'two')
+    assert llm_cache.get('first') is None and llm_cache.get('second') == 'two'
+
+
+def test_dataset_fingerprint_follows_the_data(frame):
+    assert dataset_fingerprint(frame) == dataset_fingerprint(frame.copy())
+    changed = frame.copy()
+    changed.loc[3, 'Sales'] += 1
+    assert dataset_fingerprint(changed) != dataset_fingerprint(frame)
+    assert dataset_fingerprint(frame.astype({'Year': 'int16'})) != dataset_fingerprint(frame)
+
+
+@pytest.mark.skipif(not HAS_CHROMA, reason="chromadb is not installed")
+def test_near_duplicate_scenarios_share_a_narrative():
+    model = Model()
+    options = {'fingerprint': 'v1', 'guard': 'same-numbers'}
+    cached_completion('m', 'prompt 1', model.create, semantic_text='Laptop price +10% in all markets', **options)
+    assert cached_completion('m', 'prompt 2', model.create, semantic_text='Laptop price +10% in all markets!',
+                             **options) == 'narrative'
+    assert model.calls == 1
+    # Results that differ (another guard) are never shared, however similar the wording
+    cached_completion('m', 'prompt 3', model.create, semantic_text='Laptop price +10% in all markets',
+                      fingerprint='v1', guard='other-numbers')
+    assert model.calls == 2
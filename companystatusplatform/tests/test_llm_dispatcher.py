@@ -0,0 +1,99 @@
+import asyncio
+import os
+import queue
+import sys
+import threading
+
+import pytest
+
+from conftest import APP_DIR
+
+sys.path.insert(0, os.path.join(APP_DIR, 'benchmarks'))
+
+import llm_dispatcher  # noqa: E402
+from stub_servers import STUB_REPLY, StubOpenAIServer  # noqa: E402
+
+MODEL = 'stub-model'
+
+
+@pytest.fixture(scope='module')
+def server():
+    with StubOpenAIServer(first_token_delay=0.3, token_delay=0.0) as stub:
+        # The dispatcher builds its client once per process, from config at import time
+        patch = pytest.MonkeyPatch()
+        patch.setattr(llm_dispatcher, 'OPENAI_BASE_URL', stub.url)
+        patch.setattr(llm_dispatcher, 'OPENAI_API_KEY', 'test-key')
+        patch.setattr(llm_dispatcher, '_loop', None)
+        yield stub
+        patch.undo()
+
+
+def on_loop(coroutine):
+    return asyncio.run_coroutine_threadsafe(coroutine, llm_dispatcher._start_loop()).result()
+
+
+def concurrently(count, call):
+    results = [None] * count
+
+    def run(i):
+        results[i] = call()
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_completions_share_one_request(server):
+    before = server.requests
+    answers = concurrently(5, lambda: llm_dispatcher.complete(MODEL, 'Summarise sales by market.'))
+    assert answers == [STUB_REPLY] * 5
+    assert server.requests - before == 1
+
+
+def test_identical_streams_share_one_request(server):
+    before = server.requests
+    answers = concurrently(3, lambda: ''.join(llm_dispatcher.stream(MODEL, 'Stream a summary of profit.')))
+    assert answers == [STUB_REPLY] * 3
+    assert server.requests - before == 1
+
+
+def test_rate_limited_call_is_retried(server):
+    before = server.requests
+    server.fail_next(1, status=429, retry_after=0)
+    assert llm_dispatcher.complete(MODEL, 'Summarise the top products.') == STUB_REPLY
+    assert server.requests - before == 2
+
+
+def test_caller_arriving_as_a_stream_is_cancelled_gets_a_new_one(server):
+    prompt = 'Stream the risks, then stop reading.'
+    first, second = queue.Queue(), queue.Queue()
+    flight = on_loop(llm_dispatcher._join_stream(MODEL, prompt, first))
+
+    async def leave_and_rejoin():
+        # The last reader leaves and another caller asks for the same prompt before the
+        # cancelled task has had a chance to unwind
+        llm_dispatcher._leave_stream(flight, first)
+        return await llm_dispatcher._join_stream(MODEL, prompt, second)
+
+    rejoined = on_loop(leave_and_rejoin())
+    assert rejoined is not flight
+    chunks = []
+    while (item := second.get(timeout=10)) is not llm_dispatcher._END:
+        chunks.append(item)
+    assert ''.join(chunks) == STUB_REPLY
+
+
+def test_readers_of_a_cancelled_stream_get_an_error(server):
+    reader = queue.Queue()
+    flight = on_loop(llm_dispatcher._join_stream(MODEL, 'Stream the outlook.', reader))
+    llm_dispatcher._loop.call_soon_threadsafe(flight.task.cancel)
+    assert isinstance(reader.get(timeout=10), RuntimeError)
+
+
+def test_stream_times_out_when_the_model_is_silent(server, monkeypatch):
+    monkeypatch.setattr(llm_dispatcher, '_FIRST_CHUNK_TIMEOUT', 0.1)
+    chunks = llm_dispatcher.stream(MODEL, 'Stream a slow answer.')
+    with pytest.raises(TimeoutError):
+        next(chunks)
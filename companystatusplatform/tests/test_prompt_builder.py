@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import make_frame
+from prompt_builder import (build_profile, chunk_text, count_tokens, extend_profile, fit_text, insights_context,
+                            render_profile, simulation_table)
+from rollup import RollupCube
+from simulation_engine import simulate
+
+FILLER = "The weather was pleasant and the office moved to a new building downtown."
+RELEVANT = "Laptop revenue growth slowed as competitors cut prices; profit margin fell in the North market."
+
+
+def test_profile_totals_match_the_frame(frame):
+    profile = build_profile(frame, 'profile-totals')
+    assert profile['rows'] == len(frame)
+    assert profile['totals']['Sales'] == frame['Sales'].sum()
+    assert profile['totals']['Profit'] == pytest.approx(np.nansum(frame['Profit']))
+    assert [entry['Year'] for entry in profile['trend']] == sorted(frame['Year'].unique())
+    top_product = frame.groupby('Product')['Sales'].sum().idxmax()
+    assert profile['segments']['Product'][0]['Product'] == top_product
+
+
+def test_extended_profile_matches_a_rebuilt_one():
+    old, delta = make_frame(300, seed=8).assign(Discount=0.1), make_frame(100, seed=9).assign(Discount=0.3)
+    combined = pd.concat([old, delta], ignore_index=True)
+    extended = extend_profile(build_profile(old, 'profile-old'), delta, RollupCube(combined), 'profile-new')
+    rebuilt = build_profile(combined, 'profile-rebuilt')
+    assert extended['totals'] == pytest.approx(rebuilt['totals'])
+    for section in ('rows', 'segments', 'trend', 'top_movers'):
+        assert extended[section] == rebuilt[section]
+    assert extended['other_numeric']['Discount']['mean'] == pytest.approx(0.15)
+
+
+def test_rendered_profile_fits_its_budget(frame):
+    profile = build_profile(frame, 'profile-render')
+    for budget in (10, 40, 400):
+        assert count_tokens(render_profile(profile, budget)) <= budget
+
+
+def test_chunk_text_drops_repeated_paragraphs():
+    chunks = chunk_text(f"{RELEVANT}\n\n{FILLER}\n\n{RELEVANT.upper()}", chunk_tokens=200)
+    assert chunks == [RELEVANT, FILLER]
+
+
+def test_fit_text_keeps_the_relevant_passages_in_order():
+    paragraphs = [f"{FILLER} ({i})" for i in range(40)]
+    paragraphs[25] = RELEVANT
+    paragraphs[5] = "Sales guidance for the next quarter was raised."
+    excerpt = fit_text("\n\n".join(paragraphs), budget=60, terms={'laptop', 'north'})
+    assert count_tokens(excerpt) <= 60
+    assert excerpt.index("Sales guidance") < excerpt.index(RELEVANT)
+
+
+def test_insights_context_fits_the_budget_whatever_the_scrape_size(frame):
+    scraped = "\n\n".join(f"{FILLER} Paragraph {i}. {RELEVANT}" for i in range(2000))
+    summary, excerpt = insights_context(frame, 'profile-context', scraped, budget=800)
+    assert count_tokens(summary) + count_tokens(excerpt) <= 800
+    assert summary and excerpt
+
+
+def test_simulation_table_keeps_the_largest_changes_within_budget():
+    rng = np.random.default_rng(3)
+    products = [f"Product {i}" for i in range(60)]
+    frame = pd.DataFrame({'Product': np.repeat(products, 2), 'Market': ['North', 'South'] * 60,
+                          'Sales': rng.uniform(1000, 5000, 120), 'Profit': rng.uniform(100, 500, 120)})
+    scenario = {'price_change': {products[7]: 0.5}, 'elasticity': {}, 'volume_shock': {}, 'cost_change': 0.0}
+    table = simulation_table(simulate(frame, scenario), 'Product 7 price +50%', budget=300)
+    assert count_tokens(table) <= 300
+    assert 'Product 7' in table and 'smaller segments omitted' in table
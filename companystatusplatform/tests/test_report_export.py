@@ -0,0 +1,54 @@
+import os
+
+import pandas as pd
+import pytest
+
+import report_export
+
+
+@pytest.fixture(autouse=True)
+def report_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(report_export, 'REPORT_CACHE_DIR', str(tmp_path))
+    return tmp_path
+
+
+def test_excel_report_round_trips_every_sheet(frame):
+    insights = pd.DataFrame({'Insight': ['Sales grew', 'Margins fell']})
+    path = report_export.excel_report('v-excel', frame, [('AI Insights', insights, {'A:A': 80})])
+    sheets = pd.read_excel(path, sheet_name=None)
+    assert list(sheets) == ['Raw Data', 'AI Insights']
+    pd.testing.assert_frame_equal(sheets['Raw Data'], frame, check_dtype=False)
+    pd.testing.assert_frame_equal(sheets['AI Insights'], insights)
+
+
+def test_reports_are_cached_per_version_and_extra_sheets(frame):
+    insights = pd.DataFrame({'Insight': ['Sales grew']})
+    path = report_export.excel_report('v-cache', frame, [('AI Insights', insights, None)])
+    built_at = os.stat(path).st_mtime_ns
+    assert report_export.excel_report('v-cache', frame.head(0), [('AI Insights', insights, None)]) == path
+    assert os.stat(path).st_mtime_ns >= built_at
+    other = report_export.excel_report('v-cache', frame, [('AI Insights', insights.assign(Insight='Sales fell'), None)])
+    assert other != path
+    assert report_export.excel_report('v-other', frame) not in (path, other)
+
+
+def test_parquet_and_csv_exports_round_trip(frame, tmp_path):
+    pd.testing.assert_frame_equal(pd.read_parquet(report_export.parquet_export('v-parquet', frame)), frame)
+    chunks = list(report_export.csv_chunks(frame, chunk_rows=64))
+    assert len(chunks) == 1 + -(-len(frame) // 64)
+    csv_path = tmp_path / 'export.csv'
+    csv_path.write_text(''.join(chunks))
+    pd.testing.assert_frame_equal(pd.read_csv(csv_path), frame)
+
+
+def test_cache_keeps_only_the_most_recent_reports(frame, report_dir, monkeypatch):
+    monkeypatch.setattr(report_export, 'REPORT_CACHE_MAX_FILES', 2)
+    paths = [report_export.parquet_export(f"v-prune-{i}", frame) for i in range(4)]
+    assert sorted(os.listdir(report_dir)) == sorted(os.path.basename(p) for p in paths[-2:])
+
+
+def test_failed_build_leaves_no_temp_files(report_dir, monkeypatch):
+    monkeypatch.setattr(report_export, 'EXCEL_MAX_ROWS', 10)
+    with pytest.raises(ValueError, match='Excel allows at most'):
+        report_export.excel_report('v-too-big', pd.DataFrame({'a': range(20)}))
+    assert os.listdir(report_dir) == []
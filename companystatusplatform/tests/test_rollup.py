@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from rollup import RollupCube
+
+
+def test_query_matches_pandas(frame):
+    cube = RollupCube(frame)
+    rows = frame[(frame['Product'] == 'Tablet') & (frame['Market'] == 'East')]
+    result = cube.query(Product='Tablet', Market='East')
+    assert result['count'] == len(rows)
+    assert result['Sales'] == rows['Sales'].sum()
+    assert result['Profit'] == pytest.approx(np.nansum(rows['Profit']))
+
+
+def test_empty_slices_are_zero(frame):
+    assert RollupCube(frame).query(Product='Toaster') == {'Sales': 0, 'Profit': 0, 'count': 0}
+
+
+@pytest.mark.parametrize('by', [['Product'], ['Market', 'Year'], ['Product', 'Market', 'Zone', 'Year']])
+def test_frame_matches_a_pandas_groupby(frame, by):
+    table = RollupCube(frame).frame(by).sort_values(by).reset_index(drop=True)
+    expected = (frame.groupby(by)[['Sales', 'Profit']].sum().join(frame.groupby(by).size().rename('count'))
+                .reset_index().sort_values(by).reset_index(drop=True))
+    np.testing.assert_array_equal(table['count'], expected['count'])
+    np.testing.assert_array_equal(table['Sales'], expected['Sales'])
+    np.testing.assert_allclose(table['Profit'], expected['Profit'])
+
+
+def test_drill_down_restricts_to_the_slice(frame):
+    table = RollupCube(frame).drill_down('Market', Product='Laptop')
+    rows = frame[frame['Product'] == 'Laptop']
+    assert sorted(table['Market']) == sorted(rows['Market'].unique())
+    assert table['count'].sum() == len(rows)
+
+
+def test_unknown_dimensions_raise_key_error(frame):
+    with pytest.raises(KeyError):
+        RollupCube(frame).query(Colour='Red')
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from conftest import make_frame
+from row_index import MAX_PAGE_SIZE, RowIndex
+
+
+def _expected(df, filters, sort, descending, offset, limit):
+    mask = pd.Series(True, index=df.index)
+    for col, values in filters.items():
+        mask &= df[col].astype(str).isin(values)
+    rows = df[mask]
+    if sort is not None:
+        rows = rows.sort_values(sort, ascending=not descending, kind='stable', na_position='last')
+    page = rows.iloc[offset:offset + limit].astype(object)
+    return len(rows), page.where(page.notna(), None).values.tolist()
+
+
+@pytest.mark.parametrize('filters', [{}, {'Market': ['North']}, {'Market': ['North', 'South'], 'Product': ['Tablet']},
+                                     {'Year': ['2023']}, {'Product': ['Toaster']}])
+@pytest.mark.parametrize('sort, descending', [(None, False), ('Sales', False), ('Sales', True), ('Profit', False),
+                                              ('Profit', True), ('Product', True)])
+def test_page_matches_a_pandas_filter_and_sort(filters, sort, descending):
+    df = make_frame(800, seed=5)
+    index = RowIndex(df)
+    for offset, limit in ((0, 25), (40, 100), (790, 50)):
+        page = index.page(df, offset=offset, limit=limit, filters=filters, sort=sort, descending=descending)
+        total, rows = _expected(df, filters, sort, descending, offset, limit)
+        assert page['total'] == total
+        assert page['rows'] == rows
+        assert page['columns'] == list(df.columns)
+
+
+def test_facets_count_every_value(frame):
+    facets = RowIndex(frame).facets()
+    for col in ('Product', 'Market'):
+        counts = frame[col].value_counts()
+        assert {f['value']: f['count'] for f in facets[col]} == counts.to_dict()
+
+
+def test_page_size_is_capped(frame):
+    frame = make_frame(MAX_PAGE_SIZE + 200)
+    assert len(RowIndex(frame).page(frame, limit=MAX_PAGE_SIZE * 2)['rows']) == MAX_PAGE_SIZE
+
+
+def test_unknown_columns_raise_key_error(frame):
+    index = RowIndex(frame)
+    with pytest.raises(KeyError):
+        index.page(frame, filters={'Sales': ['1']})
+    with pytest.raises(KeyError):
+        index.page(frame, sort='Nope')
+
+
+def test_a_different_frame_is_rejected(frame):
+    index = RowIndex(frame)
+    with pytest.raises(ValueError):
+        index.page(frame.iloc[:10])
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from simulation_engine import empty_scenario, parse_scenario
+
+PRODUCTS = ['Laptop', 'Smartphone']
+MARKETS = ['North', 'South']
+
+
+def test_text_clauses():
+    scenario = parse_scenario("Smartphone price +10%; elasticity North -0.5 South -0.8; "
+                              "Laptop volume down 5%; cost up 3%", PRODUCTS, MARKETS)
+    assert scenario == {'price_change': {'Smartphone': pytest.approx(0.10)},
+                        'elasticity': {'North': -0.5, 'South': -0.8},
+                        'volume_shock': {'Laptop': pytest.approx(-0.05)},
+                        'cost_change': pytest.approx(0.03)}
+
+
+def test_unnamed_targets_apply_to_all():
+    scenario = parse_scenario("price cut 4%\nelasticity -1.2", PRODUCTS, MARKETS)
+    assert scenario['price_change'] == {'*': pytest.approx(-0.04)}
+    assert scenario['elasticity'] == {'*': -1.2}
+
+
+def test_unrecognized_text_is_empty():
+    assert parse_scenario("make everything better", PRODUCTS, MARKETS) == empty_scenario()
+    assert parse_scenario("", PRODUCTS, MARKETS) == empty_scenario()
+
+
+def test_json_scenario():
+    text = json.dumps({'price_change': {'Laptop': 0.1}, 'elasticity': {'*': -0.7}, 'cost_change': -0.02})
+    scenario = parse_scenario(text, PRODUCTS, MARKETS)
+    assert scenario == {'price_change': {'Laptop': 0.1}, 'elasticity': {'*': -0.7}, 'volume_shock': {},
+                        'cost_change': -0.02}
+
+
+@pytest.mark.parametrize('text', [
+    '{"price_change": ',                          # not JSON
+    '{"price_change": {}} and more',              # trailing text
+    '{"price_change": 0.1}',                      # not a mapping
+    '{"price_change": {"Laptop": "ten"}}',        # not a number
+    '{"elasticity": {"North": true}}',            # booleans are not numbers
+    '{"volume_shock": {"Laptop": NaN}}',          # not finite
+    '{"cost_change": "3%"}',
+])
+def test_malformed_json_raises_value_error(text):
+    with pytest.raises(ValueError):
+        parse_scenario(text, PRODUCTS, MARKETS)
@@ -0,0 +1,219 @@
+# tracing.py
+import contextvars
+import cProfile
+import functools
+import io
+import pstats
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import Response, g, jsonify, request
+
+from config import PROFILING_ENABLED, TRACE_HISTORY
+
+# Lightweight tracing for the hot paths. `span(name)` times a block of code and records it
+# in a per-process latency histogram; inside a Flask request it is also added to that
+# request's stage breakdown, which is returned in a Server-Timing header and kept for the
+# last TRACE_HISTORY requests (/debug/traces). Counters (LLM tokens, ...) and the hit/miss
+# counters of the registered caches are exported with the histograms in the Prometheus
+# text format at /metrics. Metrics are per worker process, like the caches they describe.
+#
+# With PROFILING_ENABLED, a request with ?profile=1 runs under cProfile and returns the
+# profile (top functions by cumulative time) instead of the page.
+
+PREFIX = 'companystatus'
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_histograms = {}   # (metric, labels) -> [bucket counts..., sum, count]
+_counters = {}     # (metric, labels) -> value
+_gauges = {}       # (metric, labels) -> value
+_cache_stats = {}  # cache name -> get_stats()
+_recent = deque(maxlen=TRACE_HISTORY)
+_trace = contextvars.ContextVar('trace', default=None)
+
+
+def _labels(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(metric, seconds, **labels):
+    """Adds one observation to the histogram `metric`."""
+    key = (metric, _labels(labels))
+    with _lock:
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [0] * len(BUCKETS) + [0.0, 0]
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                entry[i] += 1
+        entry[-2] += seconds
+        entry[-1] += 1
+
+
+def increment(metric, value=1, **labels):
+    """Adds `value` to the counter `metric`."""
+    key = (metric, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(metric, value, **labels):
+    """Sets the gauge `metric` to `value`."""
+    with _lock:
+        _gauges[(metric, _labels(labels))] = value
+
+
+@contextmanager
+def span(name, **labels):
+    """Times the block as stage `name` (histogram companystatus_span_seconds, request breakdown)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        observe('span_seconds', elapsed, span=name, **labels)
+        trace = _trace.get()
+        if trace is not None:
+            trace.append((name, elapsed))
+
+
+def traced(name):
+    """Decorator form of `span`."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def register_cache(name, get_stats):
+    """Exports a cache's counters; `get_stats()` returns a dict such as {'hits', 'misses', ...}."""
+    _cache_stats[name] = get_stats
+
+
+# --- Prometheus exposition ---
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+def render_metrics():
+    """All metrics of this worker in the Prometheus text exposition format."""
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    lines = []
+    for metric in sorted({m for m, _ in histograms}):
+        name = f"{PREFIX}_{metric}"
+        lines.append(f"# TYPE {name} histogram")
+        for (m, labels), entry in sorted(histograms.items()):
+            if m != metric:
+                continue
+            for bound, count in zip(BUCKETS, entry):
+                lines.append(f"{name}_bucket{_format_labels(labels, [('le', f'{bound:g}')])} {count}")
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {entry[-1]}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {entry[-2]:.6f}")
+            lines.append(f"{name}_count{_format_labels(labels)} {entry[-1]}")
+    for metric in sorted({m for m, _ in counters}):
+        name = f"{PREFIX}_{metric}"
+        lines.append(f"# TYPE {name} counter")
+        for (m, labels), value in sorted(counters.items()):
+            if m == metric:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+    for metric in sorted({m for m, _ in gauges}):
+        name = f"{PREFIX}_{metric}"
+        lines.append(f"# TYPE {name} gauge")
+        for (m, labels), value in sorted(gauges.items()):
+            if m == metric:
+                lines.append(f"{name}{_format_labels(labels)} {value:.6f}")
+    if _cache_stats:
+        lines.append(f"# TYPE {PREFIX}_cache_events_total counter")
+        ratios = []
+        for cache, get_stats in sorted(_cache_stats.items()):
+            for event, value in sorted(get_stats().items()):
+                if event == 'hit_ratio':
+                    ratios.append((cache, value))
+                elif isinstance(value, (int, float)):
+                    lines.append(f"{PREFIX}_cache_events_total{_format_labels([('cache', cache), ('event', event)])} {value}")
+        lines.append(f"# TYPE {PREFIX}_cache_hit_ratio gauge")
+        for cache, value in ratios:
+            lines.append(f"{PREFIX}_cache_hit_ratio{_format_labels([('cache', cache)])} {value}")
+    return "\n".join(lines) + "\n"
+
+
+# --- Flask integration ---
+
+def _start_request():
+    g.trace_token = _trace.set([])
+    g.trace_started = time.perf_counter()
+    if PROFILING_ENABLED and request.args.get('profile') == '1':
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+
+def _finish_request(response):
+    trace = _trace.get()
+    if trace is None or 'trace_started' not in g:
+        return response
+    elapsed = time.perf_counter() - g.trace_started
+    endpoint = request.endpoint or 'unmatched'
+    observe('request_seconds', elapsed, endpoint=endpoint)
+    increment('requests_total', endpoint=endpoint, status=response.status_code)
+
+    stages = {}
+    for name, seconds in trace:
+        stages[name] = stages.get(name, 0.0) + seconds
+    response.headers['Server-Timing'] = ', '.join(
+        [f"{name};dur={seconds * 1000:.1f}" for name, seconds in stages.items()] + [f"total;dur={elapsed * 1000:.1f}"])
+    with _lock:
+        _recent.append({'at': time.time(), 'method': request.method, 'path': request.path, 'endpoint': endpoint,
+                        'status': response.status_code, 'duration_ms': round(elapsed * 1000, 2),
+                        'spans': [{'name': name, 'ms': round(seconds * 1000, 2)} for name, seconds in trace]})
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(40)
+        return Response(output.getvalue(), mimetype='text/plain')
+    return response
+
+
+def _teardown(exc):
+    token = g.pop('trace_token', None)
+    if token is not None:
+        try:
+            _trace.reset(token)
+        except ValueError:  # torn down from another context (e.g. after a streamed response)
+            pass
+
+
+def metrics_view():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def traces_view():
+    with _lock:
+        return jsonify(list(_recent)[::-1])
+
+
+def init_app(app):
+    """Times every request, adds Server-Timing headers and serves /metrics and /debug/traces."""
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    app.teardown_request(_teardown)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    app.add_url_rule('/debug/traces', 'debug_traces', traces_view)
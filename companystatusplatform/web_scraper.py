@@ -0,0 +1,123 @@
+# web_scraper.py
+import asyncio
+from urllib.parse import urljoin
+
+from config import SCRAPE_MAX_PAGES
+from extractors import get_extractor, prices_to_numbers
+from fetcher import fetch, run
+from http_cache import cached_get
+
+# Scrapers for listing/product pages shaped like http://books.toscrape.com/. All network
+# access goes through the shared async client in fetcher.py, so batches of product URLs
+# and the pages of a category listing are fetched concurrently over pooled connections.
+# Responses and their parsed results are cached on disk by http_cache.py.
+
+
+# --- Parsers ---
+
+def parse_product_page(content, url):
+    """Extracts title and price from a product page."""
+    title, price = get_extractor()['product'](content)
+    return {'URL': url, 'Title': title, 'Price': price, 'Status': 'Success'}
+
+
+def parse_competitor_listing(content):
+    """Extracts (name, price) rows and the pager from a category listing page."""
+    return get_extractor()['listing'](content)
+
+
+def remaining_page_urls(page_url, pager, max_pages):
+    """
+    Lists the listing's remaining page URLs up front when the pager says 'Page X of N' and
+    the next link carries the page number (e.g. page-2.html), so they can be fetched in
+    parallel. Returns None when pages can only be discovered by following 'next'.
+    """
+    next_href, position = pager
+    if not next_href or not position:
+        return None
+    current, total = position
+    next_url = urljoin(page_url, next_href)
+    marker = str(current + 1)
+    cut = next_url.rfind(marker)
+    if cut < 0:
+        return None
+    last = min(total, current + max_pages - 1)
+    return [next_url[:cut] + str(n) + next_url[cut + len(marker):] for n in range(current + 1, last + 1)]
+
+
+# --- Async scrapers ---
+
+async def scrape_product_async(url):
+    product, _, error = await cached_get(url, 'product', lambda content, final_url: parse_product_page(content, url), fetch)
+    if error:
+        return {'URL': url, 'Title': 'Error', 'Price': 'Error', 'Status': f'Failed: {error}'}
+    return product
+
+
+def _parse_listing(content, final_url):
+    competitors, pager = parse_competitor_listing(content)
+    return {'competitors': competitors, 'pager': pager}
+
+
+async def _fetch_listing_page(url):
+    listing, final_url, error = await cached_get(url, 'listing', _parse_listing, fetch)
+    if error:
+        return None, error, None
+    return list(listing['competitors']), None, (final_url, listing['pager'])
+
+
+async def scrape_competitors_async(url, max_pages=1):
+    """Scrapes a listing and up to `max_pages - 1` following pages."""
+    competitors, error, page = await _fetch_listing_page(url)
+    if error:
+        return [{'Name': 'Error', 'Price': f'Failed: {error}', 'Status': 'Request Failed'}]
+
+    pages_left = max(0, min(max_pages, SCRAPE_MAX_PAGES) - 1)
+    page_url, pager = page
+    urls = remaining_page_urls(page_url, pager, pages_left + 1) if pages_left else []
+    if urls:
+        for rows, _, _ in await asyncio.gather(*(_fetch_listing_page(u) for u in urls)):
+            if rows:
+                competitors.extend(rows)
+    else:
+        # Pager without page numbers: follow 'next' links one at a time
+        while pages_left and pager[0]:
+            rows, page_error, page = await _fetch_listing_page(urljoin(page_url, pager[0]))
+            if page_error:
+                break
+            competitors.extend(rows)
+            page_url, pager = page
+            pages_left -= 1
+
+    return competitors if competitors else [{'Name': 'N/A', 'Price': 'N/A', 'Status': 'No matching elements found'}]
+
+
+# --- Blocking entry points for Flask routes ---
+
+def scrape_product_info(url):
+    """Scrapes a single product page from http://books.toscrape.com/ for basic info."""
+    return run(scrape_product_async(url))
+
+
+def scrape_products(urls):
+    """Scrapes many product pages concurrently; results keep the order of `urls`."""
+    async def scrape_all():
+        return await asyncio.gather(*(scrape_product_async(u) for u in urls))
+    return run(scrape_all())
+
+
+def scrape_competitors_list(url, max_pages=1):
+    """Scrapes a category listing page from http://books.toscrape.com/ for multiple items."""
+    return run(scrape_competitors_async(url, max_pages))
+
+
+def scrape_competitor_listings(urls, max_pages=1):
+    """
+    Scrapes several listings (and their pages) concurrently and concatenates the rows,
+    adding a numeric 'Price Value' converted for all rows at once.
+    """
+    async def scrape_all():
+        return await asyncio.gather(*(scrape_competitors_async(u, max_pages) for u in urls))
+    competitors = [row for rows in run(scrape_all()) for row in rows]
+    values = prices_to_numbers([row['Price'] for row in competitors])
+    return [{**row, 'Price Value': value} for row, value in zip(competitors, values)]